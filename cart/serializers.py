@@ -2,8 +2,7 @@ from rest_framework import serializers
 from .models import Cart, CartItem
 from products.models import Product
 from django.db.models import F, Sum
-from inventory.models import InventoryReservation, InventoryItem
-from django.utils import timezone
+from inventory.reservations import get_reservation_backend
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -37,20 +36,10 @@ class CartItemSerializer(serializers.ModelSerializer):
             product = data.get("product")
             requested_quantity = data.get("quantity")
 
-        physical_stock = InventoryItem.objects.filter(product=product).aggregate(
-            total=Sum("quantity")
-        )["total"] or 0
-
         cart, _ = Cart.objects.get_or_create(user=user)
 
-        other_reservations_query = InventoryReservation.objects.filter(
-            product=product, 
-            expires_at__gt=timezone.now()
-        ).exclude(cart=cart)
-        
-        other_reservations = other_reservations_query.aggregate(total=Sum("quantity"))["total"] or 0
-
-        available_to_user = physical_stock - other_reservations
+        # What's in other carts is taken; what's in this one stays ours.
+        available_to_user = get_reservation_backend().available(product.pk, cart.pk)
 
         if requested_quantity > available_to_user:
             raise serializers.ValidationError(
@@ -1,9 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import Cart
+from django.utils import timezone
+from .models import Cart, CartItem
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_cart(sender, instance, created, **kwargs):
     if created:
         Cart.objects.create(user=instance)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def touch_cart_on_item_change(sender, instance, **kwargs):
+    # Cart.updated_at is the cart's ETag / Last-Modified source.
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
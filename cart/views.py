@@ -5,9 +5,11 @@ from rest_framework.permissions import IsAuthenticated
 from .models import Cart, CartItem
 from .serializers import CartSerializer, CartItemSerializer
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Max
+from core.conditional import ConditionalGetMixin
 
 
-class CartViewSet(viewsets.ViewSet):
+class CartViewSet(ConditionalGetMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = CartSerializer
 
@@ -16,8 +18,29 @@ class CartViewSet(viewsets.ViewSet):
             "items__product"
         )
 
+    def get_version_stamp(self):
+        # Cart.updated_at is touched by every CartItem change (cart.signals);
+        # product edits show up through the items' product rows.
+        stamp = (
+            Cart.objects.filter(user=self.request.user)
+            .annotate(
+                products_changed=Max("items__product__updated_at"),
+                item_count=Count("items"),
+            )
+            .values_list("id", "updated_at", "products_changed", "item_count")
+            .first()
+        )
+        if stamp is None:
+            return None
+        cart_id, updated_at, products_changed, item_count = stamp
+        last_modified = max(filter(None, (updated_at, products_changed)))
+        return last_modified, cart_id, item_count
+
     @action(detail=False, methods=["get"])
     def my_cart(self, request):
+        not_modified = self.not_modified(request)
+        if not_modified is not None:
+            return not_modified
         cart, _ = Cart.objects.get_or_create(user=request.user)
         return Response(CartSerializer(cart).data)
 
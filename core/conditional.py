@@ -0,0 +1,45 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for read actions.
+
+    Views implement ``get_version_stamp()`` and return ``(last_modified, *parts)``
+    built from cheap aggregate queries, or None to skip. Actions call
+    ``not_modified(request)`` first and return its 304 before doing any
+    serialization; the validators are then added to the normal response.
+    """
+
+    def get_version_stamp(self):
+        return None
+
+    def not_modified(self, request):
+        stamp = self.get_version_stamp()
+        if stamp is None:
+            return None
+
+        last_modified, *parts = stamp
+        digest = hashlib.md5(repr((last_modified, parts)).encode("utf-8")).hexdigest()
+        self._etag = quote_etag(digest)
+        self._last_modified = (
+            timegm(last_modified.utctimetuple()) if last_modified else None
+        )
+        return get_conditional_response(
+            request, etag=self._etag, last_modified=self._last_modified
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "_etag", None)
+        if etag and response.status_code in (200, 304):
+            response.headers.setdefault("ETag", etag)
+            if self._last_modified:
+                response.headers.setdefault("Last-Modified", http_date(self._last_modified))
+            # Clients may keep the copy but must revalidate before reusing it.
+            patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import DATASETS, FORMATS, encode, parse_bound
+
+
+class Command(BaseCommand):
+    help = "Streams a dataset (products, inventory, orders, payments) as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=DATASETS)
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--since", help="ISO date/datetime, inclusive.")
+        parser.add_argument("--until", help="ISO date/datetime, exclusive.")
+        parser.add_argument("--status")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout).")
+
+    def handle(self, *args, dataset, format, since, until, status, output, **options):
+        export = DATASETS[dataset]
+        try:
+            rows = export.rows(
+                since=parse_bound(since, "since"),
+                until=parse_bound(until, "until"),
+                status=status,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        stream = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+        try:
+            count = 0
+            for line in encode(export, rows, format):
+                stream.write(line)
+                count += 1
+        finally:
+            if output:
+                stream.close()
+        if output:
+            rows_written = count - 1 if format == "csv" else count
+            self.stderr.write(self.style.SUCCESS(f"Wrote {rows_written} rows to {output}."))
@@ -0,0 +1,188 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    # Keep full precision: DjangoJSONEncoder truncates microseconds.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on a composite, unique sort key such as
+    ("-created_at", "-id"). The cursor holds the key of the boundary row, so
+    every page is one index range scan no matter how deep it is.
+
+    Views pick the key with ``cursor_ordering`` (or ``get_cursor_ordering()``);
+    the last column must be unique and none of them may be NULL.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "API_PAGE_SIZE", 20)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 100)
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.key = self.get_ordering(view)
+
+        values, backwards = self.decode_cursor(request)
+        ordering = self._reverse(self.key) if backwards else self.key
+
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(ordering, values))
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if backwards:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = values is not None, has_more
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, view):
+        if hasattr(view, "get_cursor_ordering"):
+            return tuple(view.get_cursor_ordering())
+        return tuple(getattr(view, "cursor_ordering", self.ordering))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], backwards=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], backwards=True)
+
+    def encode_cursor(self, row, backwards):
+        payload = {
+            "o": list(self.key),
+            "k": [_encode_value(self._key_value(row, field)) for field in self.key],
+            "r": backwards,
+        }
+        encoded = b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(b64decode(encoded.encode("ascii")).decode("utf-8"))
+            values, backwards = payload["k"], bool(payload["r"])
+            valid = payload["o"] == list(self.key) and len(values) == len(self.key)
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return values, backwards
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Number of results to return per page (max {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    @staticmethod
+    def _reverse(ordering):
+        return tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+
+    @staticmethod
+    def _key_value(row, field):
+        value = row
+        for attr in field.lstrip("-").split("__"):
+            value = getattr(value, attr)
+        return value
+
+    @staticmethod
+    def _seek(ordering, values):
+        # (a, b) after (x, y)  ==  a > x OR (a = x AND b > y), per sort direction.
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            term = Q(**{f"{name}__{lookup}": values[index]})
+            for previous, value in zip(ordering[:index], values):
+                term &= Q(**{previous.lstrip("-"): value})
+            condition |= term
+        # Redundant bound on the leading column so the planner can range-scan.
+        first = ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & condition
+
+
+class OffsetPagination(PageNumberPagination):
+    """
+    Page-number pagination for the few endpoints that opt in explicitly,
+    e.g. relevance-ranked search, which has no stable key to seek on.
+    """
+
+    page_size = getattr(settings, "API_PAGE_SIZE", 20)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 100)
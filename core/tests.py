@@ -1,3 +1,161 @@
+import csv
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from cart.models import Cart
+from inventory.models import InventoryItem, InventoryReservation
+from products.models import Category, Product
+
+
+class ConditionalGetTests(TestCase):
+    """ETag / Last-Modified revalidation of the product endpoints."""
+
+    def setUp(self):
+        patcher = mock.patch("products.documents.schedule_rebuild")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.product = Product.objects.create(
+            category=Category.objects.create(name="Tools"), name="Hammer", price=10
+        )
+        InventoryItem.objects.filter(product=self.product).update(quantity=5)
+        self.cart = Cart.objects.create()
+        self.list_url = "/api/products/?fields=id,available_stock"
+        self.detail_url = f"/api/products/{self.product.pk}/"
+
+    def hold(self, quantity, expires_at=None):
+        return InventoryReservation.objects.create(
+            cart=self.cart,
+            product=self.product,
+            quantity=quantity,
+            expires_at=expires_at or timezone.now() + timedelta(minutes=5),
+        )
+
+    def test_validators_and_304(self):
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("no-cache", response["Cache-Control"])
+            etag, last_modified = response["ETag"], response["Last-Modified"]
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale"')
+            self.assertEqual(response.status_code, 200)
+
+    def test_product_changes_move_the_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 12
+            self.product.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["price"], "12.00")
+
+    def test_reservations_move_the_list_etag(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.json()["results"][0]["available_stock"], 5)
+
+        # Reservation writes don't bump the cache generations.
+        hold = self.hold(2)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["available_stock"], 3)
+
+        hold.delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["available_stock"], 5)
+
+    def test_expiring_holds_move_the_list_etag(self):
+        self.hold(2, expires_at=timezone.now() + timedelta(seconds=1))
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.json()["results"][0]["available_stock"], 3)
+        time.sleep(1.1)
+        # No row changed, but the hold stopped counting.
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["available_stock"], 5)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("products.documents.schedule_rebuild")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", is_staff=True
+        )
+        self.client.force_login(admin)
+        category = Category.objects.create(name="Export")
+        self.active = Product.objects.create(category=category, name="Drill", price=10)
+        self.inactive = Product.objects.create(
+            category=category, name="Saw", price="12.50", is_active=False
+        )
+        # Created last week, so ?since= leaves it out.
+        self.old = Product.objects.create(category=category, name="Plane", price=3)
+        Product.objects.filter(pk=self.old.pk).update(
+            created_at=timezone.now() - timedelta(days=7)
+        )
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8"), response
+
+    def test_csv(self):
+        body, response = self.export("/api/exports/products.csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('attachment; filename="products-', response["Content-Disposition"])
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual([row["name"] for row in rows], ["Drill", "Saw", "Plane"])
+        self.assertEqual(rows[1]["price"], "12.50")
+        self.assertEqual(rows[1]["category"], "export")
+
+    def test_ndjson_with_filters(self):
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        body, _ = self.export("/api/exports/products.ndjson", since=since)
+        self.assertEqual(
+            [json.loads(line)["name"] for line in body.splitlines()], ["Drill", "Saw"]
+        )
+        body, _ = self.export("/api/exports/products.ndjson", status="inactive")
+        (row,) = map(json.loads, body.splitlines())
+        self.assertEqual((row["id"], row["is_active"]), (self.inactive.pk, False))
+
+    def test_rejections(self):
+        self.assertEqual(self.client.get("/api/exports/users.csv").status_code, 404)
+        self.assertEqual(self.client.get("/api/exports/products.xml").status_code, 404)
+        for params in ({"status": "archived"}, {"since": "last week"}):
+            response = self.client.get("/api/exports/products.csv", params)
+            self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/exports/products.csv").status_code, 403)
 
-# Create your tests here.
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "inventory.ndjson")
+            call_command(
+                "export_data", "inventory", format="ndjson", output=path, stderr=StringIO()
+            )
+            with open(path, encoding="utf-8") as stream:
+                rows = [json.loads(line) for line in stream]
+        self.assertEqual(
+            [row["product_id"] for row in rows],
+            [self.active.pk, self.inactive.pk, self.old.pk],
+        )
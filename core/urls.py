@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import ExportView
+
+urlpatterns = [
+    path("exports/<str:dataset>.<str:fmt>", ExportView.as_view(), name="export"),
+]
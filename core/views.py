@@ -1,3 +1,39 @@
-from django.shortcuts import render
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.views import APIView
 
-# Create your views here.
+from .exports import DATASETS, FORMATS, encode, parse_bound
+
+
+class ExportView(APIView):
+    """
+    GET /api/exports/<dataset>.<csv|ndjson>?since=&until=&status=
+
+    Streams the whole (filtered) table; nothing is paginated or buffered.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, dataset, fmt):
+        export = DATASETS.get(dataset)
+        if export is None or fmt not in FORMATS:
+            raise NotFound("Unknown export.")
+
+        params = request.query_params
+        try:
+            rows = export.rows(
+                since=parse_bound(params.get("since"), "since"),
+                until=parse_bound(params.get("until"), "until"),
+                status=params.get("status"),
+            )
+        except ValueError as exc:
+            raise ValidationError({"detail": str(exc)})
+
+        response = StreamingHttpResponse(
+            encode(export, rows, fmt), content_type=FORMATS[fmt]
+        )
+        filename = f"{dataset}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
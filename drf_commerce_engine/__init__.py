@@ -0,0 +1,5 @@
+# Load the Celery app with Django so shared tasks queued from web requests
+# use the project's broker settings.
+from .celery import app as celery_app
+
+__all__ = ("celery_app",)
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from accounts.views import SecureAdminSetupView
@@ -32,14 +34,19 @@ urlpatterns = [
         name="redoc",
     ),
     path("api/cart/", include("cart.urls"), name="cart"),
+    path("api/inventory/", include("inventory.urls")),
     path("api/auth/init-admin/", SecureAdminSetupView.as_view(), name="init-admin"),
     path("api/orders/", include("orders.urls"), name="orders"),
     path("api/reviews/", include("reviews.urls"), name="reviews"),
     path("api/wishlist/", include("wishlist.urls"), name="wishlist"),
     path("api/payments/", include("payments.urls")),
+    path("api/", include("core.urls")),
     path(
         "password-reset/confirm/<uidb64>/<token>/",
         lambda r, uidb64, token: HttpResponse("Post the new password to /api/auth/password/reset/confirm/"),
         name="password_reset_confirm",
     ), #crude fix because we don't have a frontend
 ]
+
+# Uploaded originals and image variants; served by the web server in production.
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,111 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from cart.models import Cart
+from inventory.models import InventoryItem, InventoryReservation
+from inventory.reservations import DatabaseReservationBackend, RedisReservationBackend
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Flash-sale check: many carts reserve the same product at once from "
+        "several threads, per reservation backend. Reports throughput and "
+        "fails if more units were held than were on hand. The rows it "
+        "creates are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--carts", type=int, default=500, help="Carts reserving.")
+        parser.add_argument("--units", type=int, default=100, help="Units on hand.")
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--quantity", type=int, default=1, help="Units per cart.")
+        parser.add_argument(
+            "--redis-url",
+            default=settings.INVENTORY_RESERVATION_REDIS_URL,
+            help="Redis for the Redis backend; skipped when unset.",
+        )
+
+    def handle(self, *args, carts, units, threads, quantity, redis_url, **options):
+        tag = uuid.uuid4().hex[:8]
+        backends = {"database": DatabaseReservationBackend()}
+        if redis_url:
+            backends["redis"] = RedisReservationBackend(
+                url=redis_url, key_prefix=f"reservation-benchmark:{tag}:"
+            )
+        else:
+            self.stdout.write("No Redis URL: skipping the Redis backend.")
+
+        self.stdout.write(
+            f"{'backend':<9} {'carts':>6} {'held':>6} {'oversold':>8} "
+            f"{'seconds':>8} {'reserves/s':>10}"
+        )
+        oversold = False
+        for name, backend in backends.items():
+            category = Category.objects.create(name=f"Reservation benchmark {tag} {name}")
+            product = Product.objects.create(
+                category=category, name=f"Reservation benchmark {tag} {name}", price=10
+            )
+            InventoryItem.objects.create(product=product, quantity=units)
+            cart_ids = [
+                cart.pk for cart in Cart.objects.bulk_create(Cart() for _ in range(carts))
+            ]
+            try:
+                held, elapsed = self._race(
+                    backend, name, product.pk, cart_ids, quantity, threads
+                )
+                excess = max(held - units, 0)
+                oversold = oversold or excess > 0 or backend.available(product.pk) < 0
+                self.stdout.write(
+                    f"{name:<9} {carts:>6} {held:>6} {excess:>8} "
+                    f"{elapsed:>8.2f} {carts / elapsed:>10.0f}"
+                )
+            finally:
+                if name == "redis":
+                    backend.client.delete(
+                        *backend._keys(product.pk),
+                        *(backend._carts_key(pk) for pk in cart_ids),
+                    )
+                with transaction.atomic():
+                    InventoryReservation.objects.filter(product=product).delete()
+                    Cart.objects.filter(pk__in=cart_ids).delete()
+                    product.delete()
+                    category.delete()
+
+        if oversold:
+            raise CommandError("Oversold: more units were held than on hand.")
+        self.stdout.write(self.style.SUCCESS("No overselling."))
+
+    def _race(self, backend, name, product_id, cart_ids, quantity, threads):
+        """Total units held and the seconds it took."""
+        start = threading.Barrier(threads)
+
+        def reserve(chunk):
+            start.wait()
+            held = 0
+            try:
+                for cart_id in chunk:
+                    if name == "redis":
+                        # Rolled back so the write-behind copy isn't queued;
+                        # the hold in Redis is what's measured.
+                        with transaction.atomic():
+                            held += backend.reserve(cart_id, product_id, quantity)
+                            transaction.set_rollback(True)
+                    else:
+                        held += backend.reserve(cart_id, product_id, quantity)
+            finally:
+                connection.close()
+            return held
+
+        chunks = [cart_ids[i::threads] for i in range(threads)]
+        with ThreadPoolExecutor(threads) as pool:
+            started = time.perf_counter()
+            held = sum(pool.map(reserve, chunks))
+            elapsed = time.perf_counter() - started
+        return held, elapsed
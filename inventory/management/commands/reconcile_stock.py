@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services import reconcile_stock
+
+
+class Command(BaseCommand):
+    help = "Compares the per-product stock totals with the inventory and reservation rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rewrite the totals that drifted.",
+        )
+
+    def handle(self, *args, fix, **options):
+        drifted = reconcile_stock(fix=fix)
+        self.stdout.write(f"{len(drifted)} products out of date")
+        for pk in drifted[:20]:
+            self.stdout.write(f"  product {pk}: totals differ")
+        if fix and drifted:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} products."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventoryitem',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
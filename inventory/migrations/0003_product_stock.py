@@ -0,0 +1,160 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:32
+
+import django.db.models.deletion
+import django.db.models.expressions
+from django.db import migrations, models
+
+# Statement-level triggers: one upsert per product per statement, whatever
+# the number of rows, in product order so concurrent writers lock the
+# summary rows in the same order.
+FUNCTIONS = """
+CREATE FUNCTION inventory_apply_stock_deltas(deltas jsonb) RETURNS void AS $$
+BEGIN
+    INSERT INTO inventory_productstock (product_id, on_hand, reserved, updated_at)
+    SELECT d.product_id, SUM(d.on_hand), SUM(d.reserved), now()
+    FROM jsonb_to_recordset(deltas) AS d(product_id bigint, on_hand bigint, reserved bigint)
+    GROUP BY d.product_id
+    HAVING SUM(d.on_hand) <> 0 OR SUM(d.reserved) <> 0
+    ORDER BY d.product_id
+    ON CONFLICT (product_id) DO UPDATE
+    SET on_hand = inventory_productstock.on_hand + EXCLUDED.on_hand,
+        reserved = inventory_productstock.reserved + EXCLUDED.reserved,
+        updated_at = EXCLUDED.updated_at;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION inventory_item_stock_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM inventory_apply_stock_deltas(COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'product_id', product_id, 'on_hand', quantity, 'reserved', 0))
+            FROM new_rows), '[]'));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM inventory_apply_stock_deltas(COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'product_id', product_id, 'on_hand', -quantity, 'reserved', 0))
+            FROM old_rows), '[]'));
+    ELSE
+        PERFORM inventory_apply_stock_deltas(COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'product_id', product_id, 'on_hand', delta, 'reserved', 0))
+            FROM (
+                SELECT product_id, quantity AS delta FROM new_rows
+                UNION ALL
+                SELECT product_id, -quantity FROM old_rows
+            ) AS changes), '[]'));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION inventory_reservation_stock_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM inventory_apply_stock_deltas(COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'product_id', product_id, 'on_hand', 0, 'reserved', quantity))
+            FROM new_rows), '[]'));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM inventory_apply_stock_deltas(COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'product_id', product_id, 'on_hand', 0, 'reserved', -quantity))
+            FROM old_rows), '[]'));
+    ELSE
+        PERFORM inventory_apply_stock_deltas(COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'product_id', product_id, 'on_hand', 0, 'reserved', delta))
+            FROM (
+                SELECT product_id, quantity AS delta FROM new_rows
+                UNION ALL
+                SELECT product_id, -quantity FROM old_rows
+            ) AS changes), '[]'));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION inventory_product_delete_trigger() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM inventory_productstock WHERE product_id IN (SELECT id FROM old_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGERS = """
+CREATE TRIGGER inventory_item_stock_insert AFTER INSERT ON inventory_inventoryitem
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_item_stock_trigger();
+CREATE TRIGGER inventory_item_stock_update AFTER UPDATE ON inventory_inventoryitem
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_item_stock_trigger();
+CREATE TRIGGER inventory_item_stock_delete AFTER DELETE ON inventory_inventoryitem
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_item_stock_trigger();
+
+CREATE TRIGGER inventory_reservation_stock_insert AFTER INSERT ON inventory_inventoryreservation
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_reservation_stock_trigger();
+CREATE TRIGGER inventory_reservation_stock_update AFTER UPDATE ON inventory_inventoryreservation
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_reservation_stock_trigger();
+CREATE TRIGGER inventory_reservation_stock_delete AFTER DELETE ON inventory_inventoryreservation
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_reservation_stock_trigger();
+
+CREATE TRIGGER inventory_product_stock_delete AFTER DELETE ON products_product
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_product_delete_trigger();
+"""
+
+# Writers wait while the existing totals are copied in.
+BACKFILL = """
+LOCK TABLE inventory_inventoryitem, inventory_inventoryreservation IN SHARE MODE;
+INSERT INTO inventory_productstock (product_id, on_hand, reserved, updated_at)
+SELECT product_id, SUM(on_hand), SUM(reserved), now()
+FROM (
+    SELECT product_id, quantity AS on_hand, 0 AS reserved FROM inventory_inventoryitem
+    UNION ALL
+    SELECT product_id, 0, quantity FROM inventory_inventoryreservation
+) AS stock
+GROUP BY product_id;
+"""
+
+DROP = """
+DROP TRIGGER inventory_product_stock_delete ON products_product;
+DROP TRIGGER inventory_reservation_stock_delete ON inventory_inventoryreservation;
+DROP TRIGGER inventory_reservation_stock_update ON inventory_inventoryreservation;
+DROP TRIGGER inventory_reservation_stock_insert ON inventory_inventoryreservation;
+DROP TRIGGER inventory_item_stock_delete ON inventory_inventoryitem;
+DROP TRIGGER inventory_item_stock_update ON inventory_inventoryitem;
+DROP TRIGGER inventory_item_stock_insert ON inventory_inventoryitem;
+DROP FUNCTION inventory_product_delete_trigger();
+DROP FUNCTION inventory_reservation_stock_trigger();
+DROP FUNCTION inventory_item_stock_trigger();
+DROP FUNCTION inventory_apply_stock_deltas(jsonb);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_version_stamps'),
+        ('products', '0012_scheduled_price_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stock_summary', serialize=False, to='products.product')),
+                ('on_hand', models.BigIntegerField(default=0)),
+                ('reserved', models.BigIntegerField(default=0)),
+                ('available', models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('on_hand'), '-', models.F('reserved')), output_field=models.BigIntegerField())),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(FUNCTIONS + TRIGGERS, DROP),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
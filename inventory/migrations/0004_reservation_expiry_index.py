@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('inventory', '0003_product_stock'),
+        ('orders', '0003_order_completed_at'),
+        ('products', '0012_scheduled_price_changes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryreservation',
+            index=models.Index(fields=['expires_at', 'product'], name='reservation_expiry_idx'),
+        ),
+    ]
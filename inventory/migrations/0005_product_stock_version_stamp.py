@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:30
+
+from django.db import migrations, models
+
+# MAX(updated_at) feeds the product list version stamp, so the triggers
+# stamp the time of the write rather than the start of its transaction.
+APPLY_STOCK_DELTAS = """
+CREATE OR REPLACE FUNCTION inventory_apply_stock_deltas(deltas jsonb) RETURNS void AS $$
+BEGIN
+    INSERT INTO inventory_productstock (product_id, on_hand, reserved, updated_at)
+    SELECT d.product_id, SUM(d.on_hand), SUM(d.reserved), {timestamp}
+    FROM jsonb_to_recordset(deltas) AS d(product_id bigint, on_hand bigint, reserved bigint)
+    GROUP BY d.product_id
+    HAVING SUM(d.on_hand) <> 0 OR SUM(d.reserved) <> 0
+    ORDER BY d.product_id
+    ON CONFLICT (product_id) DO UPDATE
+    SET on_hand = inventory_productstock.on_hand + EXCLUDED.on_hand,
+        reserved = inventory_productstock.reserved + EXCLUDED.reserved,
+        updated_at = EXCLUDED.updated_at;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_reservation_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productstock',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunSQL(
+            APPLY_STOCK_DELTAS.format(timestamp="clock_timestamp()"),
+            APPLY_STOCK_DELTAS.format(timestamp="now()"),
+        ),
+    ]
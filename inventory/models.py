@@ -9,7 +9,8 @@ class InventoryItem(models.Model):
     )
     quantity = models.PositiveIntegerField(default=0)
     location = models.CharField(max_length=255, blank=True, null=True)  # optional
-    last_updated = models.DateTimeField(auto_now=True)
+    # Indexed: MAX(last_updated) is part of the product list version stamp.
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} left"
@@ -46,4 +47,43 @@ class InventoryReservation(models.Model):
                 name="only_one_origin_source",
             )
         ]
-        unique_together = ("cart", "product")
\ No newline at end of file
+        unique_together = ("cart", "product")
+        indexes = [
+            # release_expired_reservations() walks this in expiry order.
+            models.Index(fields=["expires_at", "product"], name="reservation_expiry_idx"),
+        ]
+
+class ProductStock(models.Model):
+    """
+    Stock totals of one product: units on hand (sum of its InventoryItem
+    rows) and units held by reservations (sum of its InventoryReservation
+    rows, until the expiry task deletes them).
+
+    Maintained by database triggers on both tables (migration
+    0003_product_stock), so every write path (ORM saves, queryset updates,
+    bulk inserts, raw SQL) updates the row in its own transaction.
+    Availability reads are one primary-key lookup. reconcile_stock() repairs
+    drift.
+    """
+
+    # DO_NOTHING: a trigger on the products table deletes the row after
+    # the inventory rows it sums, which Django deletes first.
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        related_name="stock_summary",
+    )
+    on_hand = models.BigIntegerField(default=0)
+    reserved = models.BigIntegerField(default=0)
+    available = models.GeneratedField(
+        expression=models.F("on_hand") - models.F("reserved"),
+        output_field=models.BigIntegerField(),
+        db_persist=True,
+    )
+    # Set by the triggers on every change. Indexed: MAX(updated_at) is
+    # part of the product list version stamp.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.on_hand} on hand, {self.reserved} reserved"
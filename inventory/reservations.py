@@ -0,0 +1,383 @@
+# inventory/reservations.py
+"""
+Cart stock holds.
+
+DatabaseReservationBackend keeps holds as InventoryReservation rows and
+serializes the holds of a product on its ProductStock row lock.
+
+RedisReservationBackend is for flash sales, where thousands of carts add
+the same product at once and that row lock becomes the queue. Every check
+and hold is one Lua script run against the product's keys, so Redis
+applies them one at a time and can't grant more than is on hand. Holds are
+copied to InventoryReservation by a Celery task after the fact (for the
+admin, exports and the ProductStock totals). Physical stock stays in
+Postgres: Redis caches each product's on-hand count for STOCK_TTL seconds,
+and inventory changes drop the cached count.
+
+settings.INVENTORY_RESERVATION_BACKEND picks the class.
+"""
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from inventory.models import InventoryReservation, ProductStock
+from products.models import Product
+from inventory.services import available_quantities, available_quantity
+
+logger = logging.getLogger(__name__)
+
+
+def hold_minutes():
+    return getattr(settings, "INVENTORY_RESERVATION_MINUTES", 15)
+
+
+class ReservationBackend(ABC):
+    """Interface of the reservation backends."""
+
+    @abstractmethod
+    def available(self, product_id, cart_id=None):
+        """Units that can still be held; ``cart_id``'s own hold counts as available."""
+
+    @abstractmethod
+    def available_many(self, product_ids, cart_id=None):
+        """``{product_id: units}`` like available(), for the products that exist."""
+
+    @abstractmethod
+    def reserve(self, cart_id, product_id, quantity):
+        """
+        Sets ``cart_id``'s hold on the product to ``quantity``, or to what's
+        left when that's less. Returns the quantity held.
+        """
+
+    @abstractmethod
+    def hold(self, cart_id, product_id):
+        """``(quantity, expires_at)`` of the cart's live hold, or None."""
+
+    @abstractmethod
+    def release_cart(self, cart_id):
+        """Drops every hold of ``cart_id`` (checkout)."""
+
+    def stock_changed(self, product_ids):
+        """Called after a commit that changed the on-hand stock of products."""
+
+
+class DatabaseReservationBackend(ReservationBackend):
+    def available(self, product_id, cart_id=None):
+        return available_quantity(product_id, cart_id)
+
+    def available_many(self, product_ids, cart_id=None):
+        return available_quantities(product_ids, cart_id)
+
+    def reserve(self, cart_id, product_id, quantity):
+        with transaction.atomic():
+            # Expired holds don't count, though clear_expired_reservations
+            # only deletes them every minute.
+            # Locks the product's ProductStock row: concurrent adds of the
+            # same product queue here instead of both taking the last units.
+            available = available_quantity(product_id, cart_id, lock=True)
+            held = max(min(quantity, available), 0)
+            if held > 0:
+                InventoryReservation.objects.update_or_create(
+                    cart_id=cart_id,
+                    product_id=product_id,
+                    defaults={
+                        "quantity": held,
+                        "expires_at": timezone.now() + timedelta(minutes=hold_minutes()),
+                    },
+                )
+            else:
+                # If 0 available, ensure we don't hold a reservation record with 0 qty
+                InventoryReservation.objects.filter(
+                    cart_id=cart_id, product_id=product_id
+                ).delete()
+        return held
+
+    def hold(self, cart_id, product_id):
+        return (
+            InventoryReservation.objects.filter(
+                cart_id=cart_id, product_id=product_id, expires_at__gt=timezone.now()
+            )
+            .values_list("quantity", "expires_at")
+            .first()
+        )
+
+    def release_cart(self, cart_id):
+        InventoryReservation.objects.filter(cart_id=cart_id).delete()
+
+
+# Lua shared by the scripts: drops up to ARGV[2] holds that expired before
+# ARGV[1] (unix seconds) and returns the reserved total after that.
+# KEYS: on_hand, reserved, holds (cart -> quantity), expiry (zset of carts).
+_PURGE = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, cart in ipairs(expired) do
+    local held = tonumber(redis.call('HGET', KEYS[3], cart) or '0')
+    redis.call('DECRBY', KEYS[2], held)
+    redis.call('HDEL', KEYS[3], cart)
+    redis.call('ZREM', KEYS[4], cart)
+end
+local reserved = tonumber(redis.call('GET', KEYS[2]) or '0')
+"""
+
+# ARGV: now, purge limit, cart, quantity wanted, expires at.
+# Returns {held, available afterwards}, or {-1, 0} when on_hand isn't loaded.
+_RESERVE = (
+    """
+local on_hand = redis.call('GET', KEYS[1])
+if not on_hand then return {-1, 0} end
+"""
+    + _PURGE
+    + """
+local current = tonumber(redis.call('HGET', KEYS[3], ARGV[3]) or '0')
+local available = tonumber(on_hand) - reserved + current
+local held = math.max(math.min(tonumber(ARGV[4]), available), 0)
+if held > 0 then
+    redis.call('HSET', KEYS[3], ARGV[3], held)
+    redis.call('ZADD', KEYS[4], ARGV[5], ARGV[3])
+else
+    redis.call('HDEL', KEYS[3], ARGV[3])
+    redis.call('ZREM', KEYS[4], ARGV[3])
+end
+redis.call('INCRBY', KEYS[2], held - current)
+return {held, available - held}
+"""
+)
+
+# ARGV: now, purge limit, cart (or ''). Returns the units available to the
+# cart, or -1 when on_hand isn't loaded.
+_AVAILABLE = (
+    """
+local on_hand = redis.call('GET', KEYS[1])
+if not on_hand then return -1 end
+"""
+    + _PURGE
+    + """
+local current = 0
+if ARGV[3] ~= '' then
+    current = tonumber(redis.call('HGET', KEYS[3], ARGV[3]) or '0')
+end
+return tonumber(on_hand) - reserved + current
+"""
+)
+
+# ARGV: cart. Returns the quantity released.
+_RELEASE = """
+local held = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+if held > 0 then
+    redis.call('DECRBY', KEYS[2], held)
+end
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+return held
+"""
+
+# Loads on_hand (ARGV[1], TTL ARGV[2]). When Redis has no state for the
+# product (first use, or its data was lost) the holds still live in
+# InventoryReservation are loaded too: ARGV[3..] = cart, quantity, expiry.
+# The reserved counter is never deleted, so it marks a loaded product.
+_LOAD = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    redis.call('DEL', KEYS[3], KEYS[4])
+    local reserved = 0
+    for i = 3, #ARGV, 3 do
+        redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 1])
+        redis.call('ZADD', KEYS[4], ARGV[i + 2], ARGV[i])
+        reserved = reserved + tonumber(ARGV[i + 1])
+    end
+    redis.call('SET', KEYS[2], reserved)
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+return 1
+"""
+
+
+class RedisReservationBackend(ReservationBackend):
+    """
+    Keys per product (under settings.INVENTORY_RESERVATION_KEY_PREFIX,
+    "reservations:" by default), hash-tagged so a cluster keeps them on one
+    slot:
+
+    - ``{<product>}:on_hand``: cached ProductStock.on_hand, expires after
+      STOCK_TTL seconds;
+    - ``{<product>}:reserved``: units held by all carts;
+    - ``{<product>}:holds``: hash of cart id -> units held;
+    - ``{<product>}:expiry``: sorted set of cart ids scored by when their
+      hold expires (unix seconds). Each script call drops the expired ones.
+    """
+
+    STOCK_TTL = 60
+    PURGE_LIMIT = 100
+
+    def __init__(self, url=None, key_prefix=None):
+        import redis
+
+        self.client = redis.Redis.from_url(
+            url or settings.INVENTORY_RESERVATION_REDIS_URL, decode_responses=True
+        )
+        self.key_prefix = key_prefix or getattr(
+            settings, "INVENTORY_RESERVATION_KEY_PREFIX", "reservations:"
+        )
+        self._reserve = self.client.register_script(_RESERVE)
+        self._available = self.client.register_script(_AVAILABLE)
+        self._release = self.client.register_script(_RELEASE)
+        self._load = self.client.register_script(_LOAD)
+
+    def _keys(self, product_id):
+        base = f"{self.key_prefix}{{{product_id}}}"
+        return [f"{base}:on_hand", f"{base}:reserved", f"{base}:holds", f"{base}:expiry"]
+
+    def _carts_key(self, cart_id):
+        # Products the cart holds, for release_cart().
+        return f"{self.key_prefix}cart:{cart_id}"
+
+    def _run(self, script, product_id, args):
+        keys = self._keys(product_id)
+        result = script(keys=keys, args=args)
+        if result == -1 or (isinstance(result, list) and result[0] == -1):
+            self._load_product(product_id, keys)
+            result = script(keys=keys, args=args)
+        return result
+
+    def _load_product(self, product_id, keys):
+        on_hand = (
+            ProductStock.objects.filter(product_id=product_id)
+            .values_list("on_hand", flat=True)
+            .first()
+            or 0
+        )
+        args = [on_hand, self.STOCK_TTL]
+        holds = InventoryReservation.objects.filter(
+            product_id=product_id, cart__isnull=False, expires_at__gt=timezone.now()
+        ).values_list("cart_id", "quantity", "expires_at")
+        for cart_id, quantity, expires_at in holds:
+            args += [cart_id, quantity, int(expires_at.timestamp())]
+        self._load(keys=keys, args=args)
+
+    def _now(self):
+        return int(timezone.now().timestamp())
+
+    def available(self, product_id, cart_id=None):
+        args = [self._now(), self.PURGE_LIMIT, "" if cart_id is None else cart_id]
+        return self._run(self._available, product_id, args)
+
+    def available_many(self, product_ids, cart_id=None):
+        product_ids = list(
+            Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+        )
+        args = [self._now(), self.PURGE_LIMIT, "" if cart_id is None else cart_id]
+        # One round trip for all of them; products not loaded yet come back
+        # as -1 and are loaded one by one.
+        pipe = self.client.pipeline(transaction=False)
+        for pk in product_ids:
+            self._available(keys=self._keys(pk), args=args, client=pipe)
+        units = dict(zip(product_ids, pipe.execute()))
+        for pk, value in units.items():
+            if value == -1:
+                units[pk] = self._run(self._available, pk, args)
+        return units
+
+    def reserve(self, cart_id, product_id, quantity):
+        now = self._now()
+        expires_at = now + hold_minutes() * 60
+        held, _ = self._run(
+            self._reserve,
+            product_id,
+            [now, self.PURGE_LIMIT, cart_id, quantity, expires_at],
+        )
+        carts_key = self._carts_key(cart_id)
+        pipe = self.client.pipeline(transaction=False)
+        if held:
+            pipe.sadd(carts_key, product_id)
+            pipe.expire(carts_key, hold_minutes() * 60)
+        else:
+            pipe.srem(carts_key, product_id)
+        pipe.execute()
+        # Once the cart change is committed, so the task can see the cart.
+        transaction.on_commit(lambda: _sync_later(cart_id, product_id))
+        return held
+
+    def hold(self, cart_id, product_id):
+        _, _, holds, expiry = self._keys(product_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(holds, cart_id)
+        pipe.zscore(expiry, cart_id)
+        quantity, expires_at = pipe.execute()
+        if not quantity or expires_at is None or expires_at <= self._now():
+            return None
+        return int(quantity), datetime.fromtimestamp(expires_at, tz=dt_timezone.utc)
+
+    def release_cart(self, cart_id):
+        reservations = InventoryReservation.objects.filter(cart_id=cart_id)
+        product_ids = list(reservations.values_list("product_id", flat=True))
+        reservations.delete()
+        # After the commit, so a checkout that rolls back keeps its holds.
+        transaction.on_commit(lambda: self._release_cart(cart_id, product_ids))
+
+    def _release_cart(self, cart_id, product_ids=()):
+        try:
+            carts_key = self._carts_key(cart_id)
+            products = self.client.smembers(carts_key) | {str(pk) for pk in product_ids}
+            for product_id in products:
+                self._release(keys=self._keys(product_id), args=[cart_id])
+            self.client.delete(carts_key)
+        except Exception:
+            # The holds expire on their own.
+            logger.warning("Couldn't release the holds of cart %s", cart_id, exc_info=True)
+
+    def stock_changed(self, product_ids):
+        # The next call reloads on_hand from ProductStock.
+        keys = [self._keys(pk)[0] for pk in product_ids]
+        if keys:
+            self.client.delete(*keys)
+
+
+def _sync_later(cart_id, product_id):
+    from inventory.tasks import sync_reservation
+
+    try:
+        sync_reservation.delay(cart_id, product_id)
+    except Exception:
+        # The hold in Redis is what counts; the row catches up on the next add.
+        logger.warning(
+            "Couldn't queue the reservation sync for cart %s", cart_id, exc_info=True
+        )
+
+
+def notify_stock_changed(product_ids):
+    """Tells the backend the on-hand stock of ``product_ids`` changed."""
+    try:
+        get_reservation_backend().stock_changed(product_ids)
+    except Exception:
+        # Redis is down; its cached on-hand count expires on its own.
+        logger.warning("Couldn't refresh reservation stock %s", product_ids, exc_info=True)
+
+
+def sync_reservation(cart_id, product_id):
+    """Copies the cart's Redis hold on the product to InventoryReservation."""
+    from cart.models import Cart
+
+    hold = get_reservation_backend().hold(cart_id, product_id)
+    with transaction.atomic():
+        if hold is None or not Cart.objects.filter(pk=cart_id).exists():
+            InventoryReservation.objects.filter(
+                cart_id=cart_id, product_id=product_id
+            ).delete()
+            return 0
+        quantity, expires_at = hold
+        InventoryReservation.objects.update_or_create(
+            cart_id=cart_id,
+            product_id=product_id,
+            defaults={"quantity": quantity, "expires_at": expires_at},
+        )
+    return quantity
+
+
+@lru_cache(maxsize=None)
+def get_reservation_backend():
+    return import_string(settings.INVENTORY_RESERVATION_BACKEND)()
@@ -1,7 +1,6 @@
 from rest_framework import serializers
 from .models import InventoryReservation, InventoryItem
-from django.utils import timezone
-from django.db.models import Sum
+from django.core.exceptions import ObjectDoesNotExist
 
 
 class InventoryReservationSerializer(serializers.ModelSerializer):
@@ -22,19 +21,13 @@ class InventoryReservationSerializer(serializers.ModelSerializer):
         ]
 
     def get_available_quantity(self, obj):
-        total_stock = obj.product.total_quantity
-        active_reservations = (
-            InventoryReservation.objects.filter(
-                product=obj.product, expires_at__gt=timezone.now()
-            )
-            .exclude(
-                id=obj.id
-            )  # you shouldn't count your own "hold" as a "taken" item.
-            .aggregate(total=Sum("quantity"))
-        )
-
-        reserved = active_reservations["total"] or 0
-        return total_stock - reserved
+        # From inventory.ProductStock; you shouldn't count your own "hold"
+        # as a "taken" item.
+        try:
+            available = obj.product.stock_summary.available
+        except ObjectDoesNotExist:
+            available = 0
+        return available + obj.quantity
 
 
 class InventoryItemSerializer(serializers.ModelSerializer):
@@ -50,3 +43,13 @@ class InventoryItemSerializer(serializers.ModelSerializer):
             "location",
             "last_updated",
         ]
+
+
+class StockCheckItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class StockCheckSerializer(serializers.Serializer):
+    # A cart page's worth; bigger lists should be split.
+    items = StockCheckItemSerializer(many=True, allow_empty=False, max_length=100)
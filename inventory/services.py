@@ -1,7 +1,17 @@
 # inventory/services.py
-from django.db import transaction
-from django.db.models import F, Sum
-from inventory.models import InventoryItem
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+from inventory.models import InventoryItem, InventoryReservation, ProductStock
+from products import cache as catalog_cache
+from products.documents import mark_stale
+from products.models import Product
+from products.services import live_reserved
 
 @transaction.atomic
 def deduct_stock(product, quantity):
@@ -33,6 +43,71 @@ def deduct_stock(product, quantity):
             item.save(update_fields=['quantity'])
             remaining_to_deduct -= deducted
 
+class InsufficientStockError(ValueError):
+    """
+    Raised by deduct_stock_batch() with every short product at once:
+    ``shortfalls`` maps product ids to ``(requested, on_hand)``.
+    """
+
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__(
+            "Not enough stock. "
+            + "; ".join(
+                f"Product {pk}: available {on_hand}, requested {requested}"
+                for pk, (requested, on_hand) in shortfalls.items()
+            )
+        )
+
+
+def deduct_stock_batch(quantities):
+    """
+    deduct_stock() for ``{product_id: units}`` at once: every inventory row
+    of those products is locked in one id-ordered query, the units are
+    taken from each product's rows in id order, and the new quantities are
+    written with one UPDATE. Raises InsufficientStockError, before writing
+    anything, naming every product that's short.
+    """
+    quantities = {pk: units for pk, units in quantities.items() if units > 0}
+    if not quantities:
+        return
+    table = connection.ops.quote_name(InventoryItem._meta.db_table)
+    with transaction.atomic():
+        rows = list(
+            InventoryItem.objects.filter(product_id__in=quantities)
+            .select_for_update()
+            .order_by("id")  # Deadlock prevention
+            .values_list("id", "product_id", "quantity")
+        )
+        on_hand = Counter()
+        for _, product_id, quantity in rows:
+            on_hand[product_id] += quantity
+        shortfalls = {
+            pk: (units, on_hand[pk])
+            for pk, units in quantities.items()
+            if on_hand[pk] < units
+        }
+        if shortfalls:
+            raise InsufficientStockError(shortfalls)
+
+        remaining = dict(quantities)
+        ids, new_quantities = [], []
+        for pk, product_id, quantity in rows:
+            taken = min(quantity, remaining[product_id])
+            if taken:
+                remaining[product_id] -= taken
+                ids.append(pk)
+                new_quantities.append(quantity - taken)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET quantity = v.quantity, last_updated = %s "
+                f"FROM unnest(%s::bigint[], %s::bigint[]) AS v(id, quantity) "
+                f"WHERE {table}.id = v.id",
+                [timezone.now(), ids, new_quantities],
+            )
+        _stock_written(list(quantities))
+
+
 @transaction.atomic
 def restore_stock(product, quantity):
     """
@@ -49,4 +124,213 @@ def restore_stock(product, quantity):
         inventory_item.save(update_fields=['quantity'])
     else:
         # Fallback: If no inventory record exists at all, create one in a default location
-        InventoryItem.objects.create(product=product, quantity=quantity)
\ No newline at end of file
+        InventoryItem.objects.create(product=product, quantity=quantity)
+
+
+def restore_stock_batch(quantities, location=None):
+    """
+    Set-based restore_stock() for ``{product_id: units}``: the units go back
+    to each product's first inventory row in one UPDATE, and products with
+    no row get one at ``location``. Queryset writes skip the InventoryItem signals, so the
+    caches and documents are invalidated here. Returns the product ids.
+    """
+    quantities = {pk: units for pk, units in quantities.items() if units > 0}
+    if not quantities:
+        return []
+    table = connection.ops.quote_name(InventoryItem._meta.db_table)
+    with transaction.atomic():
+        # Every row of these products is locked in id order, as
+        # deduct_stock_batch() does, so concurrent restores and checkouts
+        # queue instead of deadlocking, and the first row picked below
+        # can't be deleted before the UPDATE reaches it.
+        first_rows = {}
+        for pk, product_id in (
+            InventoryItem.objects.filter(product_id__in=quantities)
+            .order_by("id")
+            .select_for_update()
+            .values_list("id", "product_id")
+        ):
+            first_rows.setdefault(product_id, pk)
+        restocked = list(first_rows)
+        if restocked:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET quantity = {table}.quantity + v.quantity, "
+                    f"last_updated = %s "
+                    f"FROM unnest(%s::bigint[], %s::bigint[]) AS v(id, quantity) "
+                    f"WHERE {table}.id = v.id",
+                    [
+                        timezone.now(),
+                        [first_rows[pk] for pk in restocked],
+                        [quantities[pk] for pk in restocked],
+                    ],
+                )
+        InventoryItem.objects.bulk_create(
+            InventoryItem(product_id=pk, quantity=units, location=location)
+            for pk, units in quantities.items()
+            if pk not in first_rows
+        )
+        product_ids = list(quantities)
+        _stock_written(product_ids)
+    return product_ids
+
+
+def _stock_written(product_ids):
+    # What the InventoryItem signals do for one row, for writes that
+    # bypass them.
+    from inventory.reservations import notify_stock_changed
+
+    catalog_cache.invalidate_products(product_ids)
+    mark_stale(product_ids=product_ids)
+    transaction.on_commit(lambda: notify_stock_changed(product_ids))
+
+
+def _held_by(cart_id, product_ref):
+    """The cart's live hold on the product ``product_ref`` points at, or 0."""
+    if cart_id is None:
+        return Value(0)
+    return Coalesce(
+        Subquery(
+            InventoryReservation.objects.filter(
+                cart_id=cart_id, product_id=OuterRef(product_ref), expires_at__gt=Now()
+            ).values("quantity")[:1]
+        ),
+        0,
+    )
+
+
+def available_quantity(product_id, cart_id=None, lock=False):
+    """
+    Units of a product that can still be reserved, from its ProductStock row.
+    Units already held by ``cart_id`` count as available to that cart;
+    expired holds don't count even before they're deleted.
+    ``lock`` takes the row lock, serializing reservations of the product
+    until the transaction ends.
+    """
+    stock = ProductStock.objects.filter(product_id=product_id)
+    if lock:
+        stock = stock.select_for_update()
+    units = (
+        stock.annotate(
+            units=F("on_hand")
+            - live_reserved("product_id", "reserved")
+            + _held_by(cart_id, "product_id")
+        )
+        .values_list("units", flat=True)
+        .first()
+    )
+    return units or 0
+
+
+def available_quantities(product_ids, cart_id=None):
+    """
+    ``{product_id: units}`` as available_quantity() counts them, for the
+    products of ``product_ids`` that exist, in one query.
+    """
+    return dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(
+            units=Coalesce(F("stock_summary__on_hand"), 0)
+            - live_reserved()
+            + _held_by(cart_id, "pk")
+        )
+        .values_list("pk", "units")
+    )
+
+
+def _stock_drift(product_ids=None):
+    """``[(product_id, on_hand, reserved)]`` where ProductStock is wrong."""
+    stock = connection.ops.quote_name(ProductStock._meta.db_table)
+    items = connection.ops.quote_name(InventoryItem._meta.db_table)
+    reservations = connection.ops.quote_name(InventoryReservation._meta.db_table)
+    scope, params = "", []
+    if product_ids is not None:
+        scope, params = "WHERE product_id = ANY(%s)", [list(product_ids)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT product_id, COALESCE(a.on_hand, 0), COALESCE(a.reserved, 0)
+            FROM (
+                SELECT product_id, SUM(on_hand) AS on_hand, SUM(reserved) AS reserved
+                FROM (
+                    SELECT product_id, quantity AS on_hand, 0 AS reserved FROM {items}
+                    UNION ALL
+                    SELECT product_id, 0, quantity FROM {reservations}
+                ) AS rows
+                {scope}
+                GROUP BY product_id
+            ) AS a
+            FULL JOIN (SELECT * FROM {stock} {scope}) AS s USING (product_id)
+            WHERE COALESCE(a.on_hand, 0) <> COALESCE(s.on_hand, 0)
+               OR COALESCE(a.reserved, 0) <> COALESCE(s.reserved, 0)
+            ORDER BY product_id
+            """,
+            params * 2,
+        )
+        return cursor.fetchall()
+
+
+def reconcile_stock(fix=True):
+    """
+    Compares every ProductStock row with the inventory and reservation rows
+    it sums, and with ``fix`` rewrites the ones that drifted. Returns the
+    drifted product ids.
+    """
+    drifted = [row[0] for row in _stock_drift()]
+    if not fix or not drifted:
+        return drifted
+    with transaction.atomic():
+        ProductStock.objects.bulk_create(
+            [ProductStock(product_id=pk) for pk in drifted], ignore_conflicts=True
+        )
+        # Writers of these products wait on the row locks, so the totals
+        # recomputed below can't miss a concurrent change.
+        list(
+            ProductStock.objects.filter(product_id__in=drifted)
+            .order_by("product_id")
+            .select_for_update()
+            .values_list("product_id", flat=True)
+        )
+        for pk, on_hand, reserved in _stock_drift(drifted):
+            ProductStock.objects.filter(product_id=pk).update(
+                on_hand=on_hand, reserved=reserved, updated_at=timezone.now()
+            )
+    return drifted
+
+
+def release_expired_reservations(batch_size=None, pause=None, now=None):
+    """
+    Deletes the reservations that expired by ``now``, oldest first, in
+    batches of ``batch_size`` rows (one short transaction each, walking the
+    (expires_at, product) index), sleeping ``pause`` seconds between them.
+    Rows locked by a running checkout are skipped until the next run.
+    Returns ``{product_id: units released}``.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "INVENTORY_EXPIRY_BATCH_SIZE", 1000)
+    if pause is None:
+        pause = getattr(settings, "INVENTORY_EXPIRY_PAUSE", 0.05)
+    now = now or timezone.now()
+    table = connection.ops.quote_name(InventoryReservation._meta.db_table)
+    released = Counter()
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN ("
+                f"SELECT id FROM {table} WHERE expires_at <= %s "
+                f"ORDER BY expires_at LIMIT %s FOR UPDATE SKIP LOCKED"
+                f") RETURNING product_id, quantity",
+                [now, batch_size],
+            )
+            rows = cursor.fetchall()
+            batch = Counter()
+            for product_id, quantity in rows:
+                batch[product_id] += quantity
+            if batch:
+                # Available stock is part of the cached product payloads.
+                catalog_cache.invalidate_products(list(batch))
+        released.update(batch)
+        if len(rows) < batch_size:
+            return dict(released)
+        if pause:
+            time.sleep(pause)
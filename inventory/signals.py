@@ -1,49 +1,32 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from datetime import timedelta
 from cart.models import CartItem
-from .models import InventoryReservation, InventoryItem
+from .models import InventoryItem
 from products.models import Product
+from products import cache as catalog_cache
+from products.documents import mark_stale
 from django.db import transaction
-from django.db.models import Sum
+from .reservations import get_reservation_backend, notify_stock_changed
 
-@receiver(post_save, sender=CartItem)
-def reserve_stock_on_add_to_cart(sender, instance, created, **kwargs):
-    with transaction.atomic():
-        # Remove expired reservations for this product first
-        InventoryReservation.objects.filter(
-            product=instance.product,
-            expires_at__lte=timezone.now()
-        ).delete()
-
-        physical_stock = InventoryItem.objects.filter(
-            product=instance.product
-        ).aggregate(total=Sum('quantity'))['total'] or 0
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_delete, sender=InventoryItem)
+def invalidate_product_stock_cache(sender, instance, **kwargs):
+    # Stock totals are part of the cached product payloads.
+    catalog_cache.invalidate_products([instance.product_id])
+    # Inventory rows are embedded in the product document.
+    mark_stale(product_ids=[instance.product_id])
+    transaction.on_commit(lambda: notify_stock_changed([instance.product_id]))
 
-        # Calculate Active Reservations (excluding this cart)
-        active_reservations = InventoryReservation.objects.filter(
-            product=instance.product, 
-            expires_at__gt=timezone.now()
-        ).exclude(cart=instance.cart).aggregate(total=Sum('quantity'))['total'] or 0
 
-        available = physical_stock - active_reservations
+@receiver(post_delete, sender=InventoryItem)
+def touch_product_on_inventory_delete(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
 
-        # Validation Logic
-        if instance.quantity > available:
-            reservation_qty = available
-        else:
-            reservation_qty = instance.quantity
 
-        if reservation_qty > 0:
-            InventoryReservation.objects.update_or_create(
-                cart=instance.cart,
-                product=instance.product,
-                defaults={
-                    'quantity': reservation_qty,
-                    'expires_at': timezone.now() + timedelta(minutes=15)
-                }
-            )
-        else:
-            # If 0 available, ensure we don't hold a reservation record with 0 qty
-            InventoryReservation.objects.filter(cart=instance.cart, product=instance.product).delete()
\ No newline at end of file
+@receiver(post_save, sender=CartItem)
+def reserve_stock_on_add_to_cart(sender, instance, created, **kwargs):
+    # Holds what's left when the cart asks for more than that.
+    get_reservation_backend().reserve(
+        instance.cart_id, instance.product_id, instance.quantity
+    )
@@ -1,11 +1,12 @@
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
 from datetime import timedelta
 import logging
 
-from .models import InventoryReservation, InventoryItem
-from orders.models import Order, OrderStatus
+from .reservations import sync_reservation as _sync_reservation
+from .services import reconcile_stock, release_expired_reservations
+from orders.services import cancel_stale_orders
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +16,13 @@ def clear_expired_reservations():
     Deletes InventoryReservation records that have passed their expiration time.
     (Handles items currently in carts but not ordered)
     """
-    now = timezone.now()
-    expired_reservations = InventoryReservation.objects.filter(expires_at__lte=now)
-
-    count = expired_reservations.count()
-
-    if count > 0:
-        expired_reservations.delete()
-        logger.info(f"Released {count} expired inventory reservations.")
-    
-    return f"Cleared {count} reservations"
+    released = release_expired_reservations()
+    if released:
+        logger.info(
+            f"Released {sum(released.values())} units from expired reservations "
+            f"on {len(released)} products."
+        )
+    return f"Released reservations on {len(released)} products"
 
 
 @shared_task
@@ -34,43 +32,33 @@ def cancel_unpaid_orders():
     and returns the stock to inventory.
     (Handles items where Order was created -> Stock Deducted -> User abandoned payment)
     """
-    # Define timeout 
-    timeout_threshold = timezone.now() - timedelta(minutes=30)
-    
-    # Find stale orders
-    stale_orders = Order.objects.filter(
-        status=OrderStatus.PENDING_PAYMENT,
-        created_at__lte=timeout_threshold
-    )
-    
-    count = 0
-    for order in stale_orders:
-        with transaction.atomic():
-            # Refill Inventory
-            for order_item in order.items.all():
-                # Add back to the first available inventory pile for this product
-                # In a complex warehouse, you might have a specific 'Returns' location
-                inventory_item = InventoryItem.objects.filter(
-                    product=order_item.product
-                ).first()
-                
-                if inventory_item:
-                    inventory_item.quantity += order_item.quantity
-                    inventory_item.save()
-                else:
-                    # If no inventory row exists (rare), create one or log warning
-                    InventoryItem.objects.create(
-                        product=order_item.product,
-                        quantity=order_item.quantity,
-                        location="Restocked from Cancelled Order"
-                    )
+    timeout = getattr(settings, "ORDER_PAYMENT_TIMEOUT_MINUTES", 30)
+    stats = cancel_stale_orders(timezone.now() - timedelta(minutes=timeout))
+    if stats["orders"]:
+        logger.info(
+            f"Cancelled {stats['orders']} unpaid orders and restored {stats['units']} "
+            f"units in {stats['batches']} batches, {stats['seconds']:.2f}s "
+            f"({stats['orders'] / max(stats['seconds'], 1e-6):.0f} orders/s)."
+        )
+    return f"Cancelled {stats['orders']} orders"
+
+
+@shared_task
+def sync_reservation(cart_id, product_id):
+    """Writes a Redis-backend hold through to InventoryReservation."""
+    quantity = _sync_reservation(cart_id, product_id)
+    return f"Cart {cart_id} holds {quantity} of product {product_id}"
 
-            # Mark Order Cancelled
-            order.status = OrderStatus.CANCELLED
-            order.save()
-            count += 1
-            
-    if count > 0:
-        logger.info(f"Cancelled {count} unpaid orders and restored stock.")
-    
-    return f"Cancelled {count} orders"
\ No newline at end of file
+
+@shared_task
+def reconcile_product_stock():
+    """
+    Repairs ProductStock rows that drifted from the inventory and
+    reservation rows they sum (e.g. after manual SQL with triggers disabled).
+    """
+    drifted = reconcile_stock()
+    if drifted:
+        logger.warning(
+            f"Repaired stock totals of {len(drifted)} products: {drifted[:20]}"
+        )
+    return f"Repaired {len(drifted)} stock summaries"
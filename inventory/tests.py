@@ -1,3 +1,452 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Address
+from cart.models import Cart, CartItem
+from inventory.models import InventoryItem, InventoryReservation, ProductStock
+from inventory.reservations import (
+    DatabaseReservationBackend,
+    RedisReservationBackend,
+    ReservationBackend,
+    sync_reservation,
+)
+from inventory.services import (
+    InsufficientStockError,
+    available_quantities,
+    available_quantity,
+    deduct_stock_batch,
+    reconcile_stock,
+)
+from orders.models import Order
+from orders.services import create_order_from_cart
+from products.models import Category, Product
+
+
+def redis_backend():
+    """A RedisReservationBackend on an empty in-process Redis (Lua via lupa)."""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    client.flushall()
+    with mock.patch("redis.Redis.from_url", return_value=client):
+        return RedisReservationBackend(url="redis://reservations")
+
+
+def stocked_product(category, name, quantity):
+    product = Product.objects.create(category=category, name=name, price=10)
+    InventoryItem.objects.create(product=product, quantity=quantity, location="A")
+    return product
+
+
+class ProductStockTests(TestCase):
+    """The triggers keep ProductStock equal to the rows it sums."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Stock")
+        self.product = Product.objects.create(category=category, name="Lamp", price=10)
+        self.other = Product.objects.create(category=category, name="Shade", price=5)
+        self.cart = Cart.objects.create()
+
+    def assertStock(self, product, on_hand, reserved):
+        stock = ProductStock.objects.get(product=product)
+        self.assertEqual(
+            (stock.on_hand, stock.reserved, stock.available),
+            (on_hand, reserved, on_hand - reserved),
+        )
+
+    def test_inventory_row_writes(self):
+        item = InventoryItem.objects.create(product=self.product, quantity=5, location="A")
+        self.assertStock(self.product, 5, 0)
+        item.quantity = 3
+        item.save()
+        self.assertStock(self.product, 3, 0)
+        # Moving a row to another product moves its units.
+        item.product = self.other
+        item.save()
+        self.assertStock(self.product, 0, 0)
+        self.assertStock(self.other, 3, 0)
+        item.delete()
+        self.assertStock(self.other, 0, 0)
+
+    def test_reservation_row_writes(self):
+        InventoryItem.objects.create(product=self.product, quantity=5, location="A")
+        hold = InventoryReservation.objects.create(
+            cart=self.cart, product=self.product, quantity=2,
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertStock(self.product, 5, 2)
+        hold.quantity = 4
+        hold.save()
+        self.assertStock(self.product, 5, 4)
+        hold.delete()
+        self.assertStock(self.product, 5, 0)
+
+    def test_queryset_writes(self):
+        InventoryItem.objects.bulk_create(
+            [
+                InventoryItem(product=self.product, quantity=2, location="A"),
+                InventoryItem(product=self.product, quantity=3, location="B"),
+                InventoryItem(product=self.other, quantity=7, location="A"),
+            ]
+        )
+        self.assertStock(self.product, 5, 0)
+        self.assertStock(self.other, 7, 0)
+        InventoryItem.objects.filter(location="A").update(quantity=F("quantity") + 10)
+        self.assertStock(self.product, 15, 0)
+        self.assertStock(self.other, 17, 0)
+
+        expires_at = timezone.now() + timedelta(minutes=5)
+        InventoryReservation.objects.bulk_create(
+            InventoryReservation(
+                cart=self.cart, product=product, quantity=1, expires_at=expires_at
+            )
+            for product in (self.product, self.other)
+        )
+        InventoryReservation.objects.update(quantity=F("quantity") + 1)
+        self.assertStock(self.product, 15, 2)
+        self.assertStock(self.other, 17, 2)
+        InventoryReservation.objects.filter(product=self.other).delete()
+        InventoryItem.objects.filter(product=self.product, location="B").delete()
+        self.assertStock(self.product, 12, 2)
+        self.assertStock(self.other, 17, 0)
+
+    def test_row_goes_with_the_product(self):
+        InventoryItem.objects.create(product=self.product, quantity=5, location="A")
+        pk = self.product.pk
+        self.product.delete()
+        self.assertFalse(ProductStock.objects.filter(product_id=pk).exists())
+        self.assertEqual(reconcile_stock(fix=False), [])
+
+    def test_reconcile_repairs_drift(self):
+        InventoryItem.objects.create(product=self.product, quantity=5, location="A")
+        InventoryItem.objects.create(product=self.other, quantity=2, location="A")
+        InventoryReservation.objects.create(
+            cart=self.cart, product=self.other, quantity=1,
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(reconcile_stock(fix=False), [])
+        ProductStock.objects.filter(product=self.product).update(on_hand=999)
+        ProductStock.objects.filter(product=self.other).delete()
+
+        self.assertEqual(
+            sorted(reconcile_stock(fix=False)), sorted([self.product.pk, self.other.pk])
+        )
+        self.assertEqual(ProductStock.objects.get(product=self.product).on_hand, 999)
+        self.assertEqual(
+            sorted(reconcile_stock()), sorted([self.product.pk, self.other.pk])
+        )
+        self.assertStock(self.product, 5, 0)
+        self.assertStock(self.other, 2, 1)
+        self.assertEqual(reconcile_stock(fix=False), [])
+
+
+class DeductStockBatchTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Checkout")
+        self.product = Product.objects.create(category=category, name="Kettle", price=10)
+        for quantity, location in [(2, "A"), (3, "B"), (4, "C")]:
+            InventoryItem.objects.create(
+                product=self.product, quantity=quantity, location=location
+            )
+        self.other = stocked_product(category, "Toaster", 1)
+
+    def quantities(self, product):
+        # The first row is the empty one created with the product.
+        return list(
+            InventoryItem.objects.filter(product=product)
+            .order_by("id")
+            .values_list("quantity", flat=True)
+        )
+
+    def test_takes_units_from_rows_in_id_order(self):
+        deduct_stock_batch({self.product.pk: 4, self.other.pk: 1})
+        self.assertEqual(self.quantities(self.product), [0, 0, 1, 4])
+        self.assertEqual(self.quantities(self.other), [0, 0])
+        self.assertEqual(ProductStock.objects.get(product=self.product).on_hand, 5)
+        self.assertEqual(reconcile_stock(fix=False), [])
+
+    def test_reports_every_shortfall_and_writes_nothing(self):
+        with self.assertRaises(InsufficientStockError) as raised:
+            deduct_stock_batch({self.product.pk: 10, self.other.pk: 2})
+        self.assertEqual(
+            raised.exception.shortfalls,
+            {self.product.pk: (10, 9), self.other.pk: (2, 1)},
+        )
+        with self.assertRaises(InsufficientStockError) as raised:
+            deduct_stock_batch({self.product.pk: 9, self.other.pk: 2})
+        self.assertEqual(raised.exception.shortfalls, {self.other.pk: (2, 1)})
+        self.assertEqual(self.quantities(self.product), [0, 2, 3, 4])
+        self.assertEqual(self.quantities(self.other), [0, 1])
+        self.assertEqual(reconcile_stock(fix=False), [])
+
+    def test_checkout_deducts_every_line(self):
+        user = get_user_model().objects.create_user(email="buyer@example.com")
+        Address.objects.create(
+            user=user, address_line_1="1 Main St", city="Addis Ababa",
+            region="AA", country="ET", is_default=True,
+        )
+        cart = Cart.objects.get(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=6)
+        CartItem.objects.create(cart=cart, product=self.other, quantity=1)
+
+        order = create_order_from_cart(user)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.total_amount, 70)
+        self.assertEqual(self.quantities(self.product), [0, 0, 0, 3])
+        self.assertEqual(self.quantities(self.other), [0, 0])
+        self.assertFalse(cart.items.exists())
+        self.assertEqual(reconcile_stock(fix=False), [])
+
+        # A short line fails the whole checkout with every shortfall named.
+        CartItem.objects.create(cart=cart, product=self.product, quantity=5)
+        CartItem.objects.create(cart=cart, product=self.other, quantity=1)
+        with self.assertRaises(ValidationError) as raised:
+            create_order_from_cart(user)
+        self.assertEqual(len(raised.exception.messages), 2)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.quantities(self.product), [0, 0, 0, 3])
+
+
+class StockCheckBatchTests(TestCase):
+    url = "/api/inventory/reservations/check-stock-batch/"
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(email="shopper@example.com")
+        self.client.force_login(user)
+        self.cart = Cart.objects.get(user=user)
+        category = Category.objects.create(name="Batch")
+        self.products = [stocked_product(category, f"Item {i}", 5) for i in range(30)]
+
+    def check(self, *items):
+        return self.client.post(
+            self.url,
+            {"items": [{"product_id": pk, "quantity": q} for pk, q in items]},
+            content_type="application/json",
+        )
+
+    def test_query_count_does_not_grow_with_items(self):
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(self.check((self.products[0].pk, 1)).status_code, 200)
+        with self.assertNumQueries(len(one)):
+            response = self.check(*((product.pk, 1) for product in self.products))
+        self.assertEqual(len(response.json()["items"]), 30)
+        self.assertTrue(response.json()["available"])
+
+    def test_own_cart_hold_counts_as_available(self):
+        product = self.products[0]
+        expires_at = timezone.now() + timedelta(minutes=5)
+        InventoryReservation.objects.create(
+            cart=self.cart, product=product, quantity=3, expires_at=expires_at
+        )
+        InventoryReservation.objects.create(
+            cart=Cart.objects.create(), product=product, quantity=2, expires_at=expires_at
+        )
+        missing = self.products[-1].pk + 1000
+        response = self.check((product.pk, 3), (product.pk, 4), (missing, 1)).json()
+        self.assertFalse(response["available"])
+        self.assertEqual(
+            [(row["found"], row["stock_left"], row["available"]) for row in response["items"]],
+            [(True, 3, True), (True, 3, False), (False, 0, False)],
+        )
+
+
+class DatabaseAvailabilityTests(TestCase):
+    """Expired holds stop counting before the cleanup task deletes them."""
+
+    def setUp(self):
+        self.product = stocked_product(Category.objects.create(name="Drops"), "Sneaker", 5)
+        self.expired, self.live, self.other = (Cart.objects.create() for _ in range(3))
+        now = timezone.now()
+        for cart, quantity, expires_at in [
+            (self.expired, 3, now - timedelta(minutes=1)),
+            (self.live, 1, now + timedelta(minutes=5)),
+        ]:
+            InventoryReservation.objects.create(
+                cart=cart, product=self.product, quantity=quantity, expires_at=expires_at
+            )
+
+    def test_reads_skip_expired_holds(self):
+        pk = self.product.pk
+        self.assertEqual(available_quantity(pk), 4)
+        self.assertEqual(available_quantities([pk]), {pk: 4})
+        # A cart's own hold is added back only while it's live.
+        self.assertEqual(available_quantity(pk, self.live.pk), 5)
+        self.assertEqual(available_quantity(pk, self.expired.pk), 4)
+        self.assertEqual(available_quantities([pk], self.live.pk), {pk: 5})
+
+    def test_reserve_can_take_expired_units(self):
+        backend = DatabaseReservationBackend()
+        self.assertEqual(backend.reserve(self.other.pk, self.product.pk, 10), 4)
+        self.assertEqual(backend.available(self.product.pk), 0)
+        # The expired hold's units went to the other cart.
+        self.assertEqual(backend.reserve(self.expired.pk, self.product.pk, 2), 0)
+
+    def test_hold_and_sync(self):
+        backend = DatabaseReservationBackend()
+        quantity, expires_at = backend.hold(self.live.pk, self.product.pk)
+        self.assertEqual(quantity, 1)
+        self.assertGreater(expires_at, timezone.now())
+        self.assertIsNone(backend.hold(self.expired.pk, self.product.pk))
+        self.assertIsNone(backend.hold(self.other.pk, self.product.pk))
+        with mock.patch(
+            "inventory.reservations.get_reservation_backend", return_value=backend
+        ):
+            self.assertEqual(sync_reservation(self.live.pk, self.product.pk), 1)
+            self.assertEqual(sync_reservation(self.expired.pk, self.product.pk), 0)
+        self.assertEqual(
+            list(InventoryReservation.objects.values_list("cart_id", flat=True)),
+            [self.live.pk],
+        )
+
+    def test_the_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ReservationBackend()
+
+    def test_listing_reports_live_availability(self):
+        response = self.client.get("/api/products/?fields=id,available_stock")
+        self.assertEqual(response.json()["results"][0]["available_stock"], 4)
+
+
+class RedisReservationBackendTests(TestCase):
+    def setUp(self):
+        self.backend = redis_backend()
+        category = Category.objects.create(name="Flash sale")
+        self.product = stocked_product(category, "Console", 5)
+        self.other = stocked_product(category, "Controller", 2)
+        self.first, self.second = Cart.objects.create(), Cart.objects.create()
+
+    def test_reserve_holds_at_most_what_is_left(self):
+        self.assertEqual(self.backend.reserve(self.first.pk, self.product.pk, 3), 3)
+        self.assertEqual(self.backend.reserve(self.second.pk, self.product.pk, 4), 2)
+        self.assertEqual(self.backend.available(self.product.pk), 0)
+        # A cart's own hold counts as available to it.
+        self.assertEqual(self.backend.available(self.product.pk, self.first.pk), 3)
+
+        self.assertEqual(self.backend.reserve(self.first.pk, self.product.pk, 1), 1)
+        self.assertEqual(self.backend.available(self.product.pk), 2)
+        self.assertEqual(self.backend.reserve(self.first.pk, self.product.pk, 0), 0)
+        self.assertEqual(self.backend.available(self.product.pk), 3)
+
+    def test_available_many(self):
+        self.backend.reserve(self.first.pk, self.product.pk, 2)
+        self.assertEqual(
+            self.backend.available_many([self.product.pk, self.other.pk, 0]),
+            {self.product.pk: 3, self.other.pk: 2},
+        )
+        self.assertEqual(
+            self.backend.available_many([self.product.pk], self.first.pk),
+            {self.product.pk: 5},
+        )
+
+    def test_expired_holds_are_dropped(self):
+        with mock.patch("inventory.reservations.hold_minutes", return_value=-1):
+            self.backend.reserve(self.first.pk, self.product.pk, 5)
+        self.assertEqual(self.backend.available(self.product.pk), 5)
+        self.assertIsNone(self.backend.hold(self.first.pk, self.product.pk))
+
+    def test_release_cart(self):
+        self.backend.reserve(self.first.pk, self.product.pk, 2)
+        self.backend.reserve(self.first.pk, self.other.pk, 2)
+        self.backend.reserve(self.second.pk, self.product.pk, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backend.release_cart(self.first.pk)
+        self.assertEqual(
+            self.backend.available_many([self.product.pk, self.other.pk]),
+            {self.product.pk: 4, self.other.pk: 2},
+        )
+
+    def test_state_is_reloaded_after_redis_loses_it(self):
+        now = timezone.now()
+        InventoryReservation.objects.create(
+            cart=self.first, product=self.product, quantity=2,
+            expires_at=now + timedelta(minutes=5),
+        )
+        InventoryReservation.objects.create(
+            cart=self.second, product=self.product, quantity=3,
+            expires_at=now - timedelta(minutes=1),
+        )
+        self.backend.client.flushall()
+
+        # Only the live hold is loaded back.
+        self.assertEqual(self.backend.available(self.product.pk), 3)
+        self.assertEqual(self.backend.reserve(self.second.pk, self.product.pk, 5), 3)
+        self.assertEqual(self.backend.hold(self.first.pk, self.product.pk)[0], 2)
+
+    def test_stock_changes_reload_on_hand(self):
+        self.assertEqual(self.backend.available(self.product.pk), 5)
+        InventoryItem.objects.create(product=self.product, quantity=4, location="B")
+        self.assertEqual(self.backend.available(self.product.pk), 5)  # cached
+        self.backend.stock_changed([self.product.pk])
+        self.assertEqual(self.backend.available(self.product.pk), 9)
+
+    def test_sync_reservation(self):
+        with mock.patch(
+            "inventory.reservations.get_reservation_backend", return_value=self.backend
+        ):
+            self.backend.reserve(self.first.pk, self.product.pk, 4)
+            self.assertEqual(sync_reservation(self.first.pk, self.product.pk), 4)
+            row = InventoryReservation.objects.get(cart=self.first, product=self.product)
+            self.assertEqual(row.quantity, 4)
+            self.assertGreater(row.expires_at, timezone.now())
+
+            self.backend._release_cart(self.first.pk, [self.product.pk])
+            self.assertEqual(sync_reservation(self.first.pk, self.product.pk), 0)
+            self.assertFalse(InventoryReservation.objects.exists())
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Carts racing for the last units never hold more than is on hand."""
+
+    def setUp(self):
+        # Rows are committed here; don't queue document rebuilds to a broker.
+        patcher = mock.patch("products.documents.schedule_rebuild")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.product = stocked_product(Category.objects.create(name="Drops"), "Sneaker", 10)
+        self.carts = [Cart.objects.create().pk for _ in range(25)]
+
+    def race(self, backend):
+        held, errors = [], []
+        barrier = threading.Barrier(len(self.carts))
+
+        def reserve(cart_id):
+            try:
+                barrier.wait()
+                held.append(backend.reserve(cart_id, self.product.pk, 1))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve, args=(pk,)) for pk in self.carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return sum(held)
+
+    def test_database_backend(self):
+        backend = DatabaseReservationBackend()
+        self.assertEqual(self.race(backend), 10)
+        self.assertEqual(backend.available(self.product.pk), 0)
+        self.assertEqual(
+            sum(InventoryReservation.objects.values_list("quantity", flat=True)), 10
+        )
+
+    @mock.patch("inventory.reservations._sync_later")
+    def test_redis_backend(self, sync_later):
+        backend = redis_backend()
+        self.assertEqual(self.race(backend), 10)
+        self.assertEqual(backend.available(self.product.pk), 0)
+        _, reserved, holds, _ = backend._keys(self.product.pk)
+        self.assertEqual(int(backend.client.get(reserved)), 10)
+        self.assertEqual(sum(map(int, backend.client.hvals(holds))), 10)
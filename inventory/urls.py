@@ -1,7 +1,10 @@
-from rest_framework.routers import DefaultRouter
-from .views import InventoryViewSet
+from rest_framework.routers import SimpleRouter
+from .views import InventoryReservationViewSet, InventoryViewSet
 
-router = DefaultRouter()
+# SimpleRouter: DefaultRouter's API root view would shadow the list at ''.
+router = SimpleRouter()
+# Before the '' prefix, whose detail route would match "reservations/".
+router.register(r'reservations', InventoryReservationViewSet, basename='inventory-reservation')
 router.register(r'', InventoryViewSet, basename='inventory')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = router.urls
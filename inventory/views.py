@@ -1,10 +1,16 @@
-from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from .models import InventoryReservation, InventoryItem
-from .serializers import InventoryReservationSerializer, InventoryItemSerializer
+from .serializers import (
+    InventoryItemSerializer,
+    InventoryReservationSerializer,
+    StockCheckSerializer,
+)
+from .reservations import get_reservation_backend
 from products.models import Product
+from cart.models import Cart
+from core.pagination import KeysetPagination
 
 
 class InventoryReservationViewSet(viewsets.ModelViewSet):
@@ -12,7 +18,7 @@ class InventoryReservationViewSet(viewsets.ModelViewSet):
     Handles viewing reservations.
     """
 
-    queryset = InventoryReservation.objects.all()
+    queryset = InventoryReservation.objects.select_related("product__stock_summary")
     serializer_class = InventoryReservationSerializer
     permission_classes = [permissions.IsAdminUser]
 
@@ -27,40 +33,66 @@ class InventoryReservationViewSet(viewsets.ModelViewSet):
         product_id = request.data.get("product_id")
         quantity = int(request.data.get("quantity", 1))
 
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        if not Product.objects.filter(id=product_id).exists():
             return Response(
                 {"detail": "Product not found"}, status=status.HTTP_404_NOT_FOUND
             )
-        try:
-            inventory = InventoryItem.objects.get(product=product)
-            actual_stock = inventory.quantity
-        except InventoryItem.DoesNotExist:
-            actual_stock = 0
-
-        active_reservations = InventoryReservation.objects.filter(
-            product=product, expires_at__gt=timezone.now()
-        )
 
         # We exclude the current user's cart reservations from this check so they don't block themselves
-        current_cart_id = request.data.get("cart_id")
-        if current_cart_id:
-            active_reservations = active_reservations.exclude(cart_id=current_cart_id)
-
-        reserved_quantity = sum(r.quantity for r in active_reservations)
-        available_quantity = actual_stock - reserved_quantity
+        stock_left = get_reservation_backend().available(
+            product_id, request.data.get("cart_id")
+        )
 
-        if available_quantity >= quantity:
-            return Response({"available": True, "stock_left": available_quantity})
+        if stock_left >= quantity:
+            return Response({"available": True, "stock_left": stock_left})
         else:
             return Response(
-                {"available": False, "stock_left": available_quantity},
+                {"available": False, "stock_left": stock_left},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="check-stock-batch",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def check_stock_batch(self, request):
+        """
+        Availability of many products at once: ``items`` is a list of
+        ``{"product_id", "quantity"}``. What the caller's own cart holds
+        counts as available to them. Costs the same few queries for any
+        number of items.
+        """
+        serializer = StockCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["items"]
+
+        cart_id = (
+            Cart.objects.filter(user=request.user).values_list("pk", flat=True).first()
+        )
+        available = get_reservation_backend().available_many(
+            {item["product_id"] for item in items}, cart_id
+        )
+        results = [
+            {
+                "product_id": item["product_id"],
+                "quantity": item["quantity"],
+                "found": item["product_id"] in available,
+                "stock_left": available.get(item["product_id"], 0),
+                "available": available.get(item["product_id"], 0) >= item["quantity"],
+            }
+            for item in items
+        ]
+        return Response(
+            {"available": all(row["available"] for row in results), "items": results}
+        )
+
+
 class InventoryViewSet(viewsets.ModelViewSet):
-    queryset = InventoryItem.objects.all()
+    queryset = InventoryItem.objects.select_related("product").order_by("id")
     serializer_class = InventoryItemSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("id",)
@@ -0,0 +1,101 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Address, User
+from cart.models import Cart, CartItem
+from inventory.models import InventoryItem
+from inventory.services import deduct_stock, deduct_stock_batch
+from orders.services import create_order_from_cart
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Times stock deduction per cart line against deduct_stock_batch(), and "
+        "the whole checkout, for several cart sizes. Everything it writes is "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1, 5, 10, 20, 40], help="Cart lines."
+        )
+        parser.add_argument("--runs", type=int, default=20, help="Runs per measurement.")
+        parser.add_argument(
+            "--rows", type=int, default=3, help="Inventory rows per product."
+        )
+
+    def handle(self, *args, sizes, runs, rows, **options):
+        with transaction.atomic():
+            user, products = self._fixture(max(sizes), rows)
+            self.stdout.write(
+                f"{'lines':>5}  {'per-line ms':>11} {'queries':>7}  "
+                f"{'batch ms':>8} {'queries':>7}  {'checkout ms':>11} {'queries':>7}"
+            )
+            for size in sizes:
+                lines = products[:size]
+                cart = Cart.objects.get(user=user)
+                cart.items.all().delete()
+                CartItem.objects.bulk_create(
+                    CartItem(cart=cart, product=product, quantity=2) for product in lines
+                )
+                per_line = self._measure(
+                    runs, lambda: [deduct_stock(product, 2) for product in lines]
+                )
+                batch = self._measure(
+                    runs, lambda: deduct_stock_batch({product.pk: 2 for product in lines})
+                )
+                checkout = self._measure(runs, lambda: create_order_from_cart(user))
+                self.stdout.write(
+                    f"{size:>5}  {per_line[0]:>11.2f} {per_line[1]:>7}  "
+                    f"{batch[0]:>8.2f} {batch[1]:>7}  {checkout[0]:>11.2f} {checkout[1]:>7}"
+                )
+            transaction.set_rollback(True)
+
+    def _fixture(self, size, rows):
+        tag = uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=f"Checkout benchmark {tag}")
+        products = Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"Benchmark product {tag} {i}",
+                slug=f"benchmark-{tag}-{i}",
+                price=10,
+            )
+            for i in range(size)
+        )
+        # One unit in every row but the last, so a deduction of two spans rows.
+        InventoryItem.objects.bulk_create(
+            InventoryItem(product=product, quantity=1 if row < rows - 1 else 1000)
+            for product in products
+            for row in range(rows)
+        )
+        user = User.objects.create_user(email=f"checkout-benchmark-{tag}@example.com")
+        Address.objects.create(
+            user=user,
+            address_line_1="1 Benchmark Street",
+            city="Addis Ababa",
+            region="Addis Ababa",
+            country="Ethiopia",
+            is_default=True,
+        )
+        Cart.objects.get_or_create(user=user)
+        return user, products
+
+    def _measure(self, runs, fn):
+        """Median milliseconds and query count of ``fn``, each run rolled back."""
+        timings, queries = [], 0
+        for _ in range(runs):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    fn()
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = len(captured)
+                transaction.set_rollback(True)
+        return statistics.median(timings), queries
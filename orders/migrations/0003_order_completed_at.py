@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_completed_at(apps, schema_editor):
+    # Best guess for orders completed before the column existed.
+    Order = apps.get_model("orders", "Order")
+    Order.objects.filter(status="completed").update(completed_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('completed_at__isnull', False)), fields=['completed_at', 'id'], name='order_completed_id_idx'),
+        ),
+    ]
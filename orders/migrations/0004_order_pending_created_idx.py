@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_completed_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'pending_payment')), fields=['created_at', 'id'], name='order_pending_created_idx'),
+        ),
+    ]
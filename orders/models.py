@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from accounts.models import User
 from products.models import Product
 
@@ -21,10 +22,41 @@ class Order(models.Model):
     shipping_address_snapshot = models.JSONField() 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the order first reaches COMPLETED; the co-purchase job reads
+    # orders completed since its last run.
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination keys for staff and per-user order history.
+            models.Index(fields=["created_at", "id"], name="order_created_id_idx"),
+            models.Index(
+                fields=["user", "created_at", "id"], name="order_user_created_id_idx"
+            ),
+            models.Index(
+                fields=["completed_at", "id"],
+                name="order_completed_id_idx",
+                condition=models.Q(completed_at__isnull=False),
+            ),
+            # cancel_stale_orders() walks the unpaid orders oldest first.
+            models.Index(
+                fields=["created_at", "id"],
+                name="order_pending_created_idx",
+                condition=models.Q(status=OrderStatus.PENDING_PAYMENT),
+            ),
+        ]
 
     def __str__(self):
         return self.order_number
 
+    def save(self, *args, **kwargs):
+        if self.status == OrderStatus.COMPLETED and self.completed_at is None:
+            self.completed_at = timezone.now()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "completed_at"}
+        super().save(*args, **kwargs)
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
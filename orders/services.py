@@ -1,12 +1,22 @@
+import time
 import uuid
+from collections import Counter
+
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 from orders.models import Order, OrderItem, OrderStatus
 from cart.models import Cart
 from accounts.models import Address
-from inventory.services import deduct_stock, restore_stock
-from inventory.models import InventoryReservation
+from inventory.services import (
+    InsufficientStockError,
+    deduct_stock_batch,
+    restore_stock,
+    restore_stock_batch,
+)
+from inventory.reservations import get_reservation_backend
 from payments.models import Payment
 
 
@@ -21,7 +31,7 @@ def create_order_from_cart(user, address_id=None):
     1. Validates Cart
     2. Validates/Selects Address
     3. Creates Order & OrderItems
-    4. Deducts Physical Stock (Inventory)
+    4. Deducts Physical Stock (Inventory), all lines in one batch
     5. Clears Cart & Reservations
     """
 
@@ -58,35 +68,41 @@ def create_order_from_cart(user, address_id=None):
         status="pending_payment",  # Enum value
     )
 
-    # Process Items & Deduct Stock
-    order_items = []
-
+    # Deduct Physical Stock for every line at once
+    # Since we are in @transaction.atomic, the whole order rolls back if this fails
+    quantities = Counter()
     for item in cart_items:
-        # DEDUCT STOCK (The Service Call)
-        # This will raise ValueError if stock is insufficient
-        # Since we are in @transaction.atomic, the whole order rolls back if this fails
-        try:
-            deduct_stock(product=item.product, quantity=item.quantity)
-        except ValueError as e:
-            raise ValidationError(str(e))
-
-        # Create Order Item
-        order_items.append(
-            OrderItem(
-                order=order,
-                product=item.product,
-                product_name=item.product.name,
-                quantity=item.quantity,
-                unit_price=item.product.price,
-                total_price=item.quantity * item.product.price,
-            )
+        quantities[item.product_id] += item.quantity
+    try:
+        deduct_stock_batch(quantities)
+    except InsufficientStockError as e:
+        names = {item.product_id: item.product.name for item in cart_items}
+        raise ValidationError(
+            [
+                f"Not enough stock for {names[pk]}. "
+                f"Available: {on_hand}, Requested: {requested}"
+                for pk, (requested, on_hand) in e.shortfalls.items()
+            ]
         )
 
+    # Create Order Items
+    order_items = [
+        OrderItem(
+            order=order,
+            product=item.product,
+            product_name=item.product.name,
+            quantity=item.quantity,
+            unit_price=item.product.price,
+            total_price=item.quantity * item.product.price,
+        )
+        for item in cart_items
+    ]
+
     OrderItem.objects.bulk_create(order_items)
 
     # Cleanup
     # Explicitly delete reservations first (safer than relying on signals)
-    InventoryReservation.objects.filter(cart=cart).delete()
+    get_reservation_backend().release_cart(cart.pk)
 
     # Delete cart items
     cart.items.all().delete()
@@ -128,4 +144,56 @@ def cancel_order(order, user_initiated=False):
         status=Payment.PaymentStatus.PENDING
     ).update(status=Payment.PaymentStatus.CANCELLED)
 
-    return order
\ No newline at end of file
+    return order
+
+
+def cancel_stale_orders(older_than, batch_size=None):
+    """
+    Cancels the orders still pending payment that were created before
+    ``older_than``, oldest first, one transaction per batch of
+    ``batch_size``: the batch is locked with SKIP LOCKED (so several
+    workers split the backlog, and an order a payment callback holds is
+    left for the next run), its stock restored with restore_stock_batch()
+    and its orders and pending payments cancelled with one UPDATE each.
+    Returns ``{"orders", "units", "batches", "seconds"}``.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "ORDER_CANCEL_BATCH_SIZE", 500)
+    stale = Order.objects.filter(
+        status=OrderStatus.PENDING_PAYMENT, created_at__lte=older_than
+    ).order_by("created_at", "id")
+    started = time.monotonic()
+    orders = units = batches = 0
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                stale.select_for_update(skip_locked=True).values_list("pk", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not order_ids:
+                break
+            quantities = Counter()
+            for product_id, quantity in OrderItem.objects.filter(
+                order_id__in=order_ids
+            ).values_list("product_id", "quantity"):
+                quantities[product_id] += quantity
+            restore_stock_batch(quantities, location="Restocked from Cancelled Order")
+            now = timezone.now()
+            Order.objects.filter(pk__in=order_ids).update(
+                status=OrderStatus.CANCELLED, updated_at=now
+            )
+            Payment.objects.filter(
+                order_id__in=order_ids, status=Payment.PaymentStatus.PENDING
+            ).update(status=Payment.PaymentStatus.CANCELLED, updated_at=now)
+        orders += len(order_ids)
+        units += sum(quantities.values())
+        batches += 1
+        if len(order_ids) < batch_size:
+            break
+    return {
+        "orders": orders,
+        "units": units,
+        "batches": batches,
+        "seconds": time.monotonic() - started,
+    }
@@ -1,3 +1,125 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from inventory.models import InventoryItem, ProductStock
+from inventory.services import reconcile_stock
+from orders.models import Order, OrderItem, OrderStatus
+from orders.services import cancel_stale_orders
+from payments.models import Payment
+from products.models import Category, Product
+
+
+class StaleOrderMixin:
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="buyer@example.com")
+        category = Category.objects.create(name="Stale")
+        self.product = Product.objects.create(category=category, name="Kettle", price=10)
+        InventoryItem.objects.filter(product=self.product).update(quantity=1)
+        self.old = timezone.now() - timedelta(hours=2)
+
+    def order(self, quantity, created_at, status=OrderStatus.PENDING_PAYMENT):
+        order = Order.objects.create(
+            user=self.user,
+            order_number=f"ORD-{Order.objects.count()}",
+            total_amount=quantity * 10,
+            shipping_address_snapshot={},
+            status=status,
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        OrderItem.objects.create(
+            order=order,
+            product=self.product,
+            product_name=self.product.name,
+            quantity=quantity,
+            unit_price=10,
+            total_price=quantity * 10,
+        )
+        Payment.objects.create(order=order, amount=quantity * 10)
+        return order
+
+    def assertStatus(self, order, status, payment_status):
+        order.refresh_from_db()
+        self.assertEqual(order.status, status)
+        self.assertEqual(order.payments.get().status, payment_status)
+
+    def on_hand(self):
+        return ProductStock.objects.get(product=self.product).on_hand
+
+
+class CancelStaleOrdersTests(StaleOrderMixin, TestCase):
+    def test_cancels_stale_orders_and_restores_stock(self):
+        stale = [self.order(2, self.old), self.order(3, self.old)]
+        fresh = self.order(4, timezone.now())
+        paid = self.order(5, self.old, status=OrderStatus.PROCESSING)
+
+        result = cancel_stale_orders(timezone.now() - timedelta(hours=1), batch_size=1)
+        self.assertEqual(
+            {key: result[key] for key in ("orders", "units", "batches")},
+            {"orders": 2, "units": 5, "batches": 2},
+        )
+        for order in stale:
+            self.assertStatus(order, OrderStatus.CANCELLED, Payment.PaymentStatus.CANCELLED)
+        self.assertStatus(fresh, OrderStatus.PENDING_PAYMENT, Payment.PaymentStatus.PENDING)
+        self.assertStatus(paid, OrderStatus.PROCESSING, Payment.PaymentStatus.PENDING)
+        # The units went back to the product's first inventory row.
+        rows = InventoryItem.objects.filter(product=self.product)
+        self.assertEqual(list(rows.values_list("quantity", flat=True)), [6])
+        self.assertEqual(self.on_hand(), 6)
+        self.assertEqual(reconcile_stock(fix=False), [])
+
+    def test_product_without_inventory_gets_a_row(self):
+        order = self.order(2, self.old)
+        InventoryItem.objects.filter(product=self.product).delete()
+        cancel_stale_orders(timezone.now())
+        self.assertStatus(order, OrderStatus.CANCELLED, Payment.PaymentStatus.CANCELLED)
+        row = InventoryItem.objects.get(product=self.product)
+        self.assertEqual((row.quantity, row.location), (2, "Restocked from Cancelled Order"))
+
+
+class LockedStaleOrderTests(StaleOrderMixin, TransactionTestCase):
+    """An order another transaction holds is left for the next run."""
+
+    def setUp(self):
+        # Rows are committed here; don't queue document rebuilds to a broker.
+        patcher = mock.patch("products.documents.schedule_rebuild")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_locked_order_is_skipped(self):
+        locked, free = self.order(2, self.old), self.order(3, self.old)
+        held, done = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Order.objects.select_for_update().get(pk=locked.pk)
+                    held.set()
+                    done.wait(timeout=30)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(held.wait(timeout=30))
+            result = cancel_stale_orders(timezone.now())
+        finally:
+            done.set()
+            thread.join()
+
+        self.assertEqual((result["orders"], result["units"]), (1, 3))
+        self.assertStatus(free, OrderStatus.CANCELLED, Payment.PaymentStatus.CANCELLED)
+        self.assertStatus(locked, OrderStatus.PENDING_PAYMENT, Payment.PaymentStatus.PENDING)
+        self.assertEqual(self.on_hand(), 4)
+
+        # Once released, the next run picks it up.
+        self.assertEqual(cancel_stale_orders(timezone.now())["orders"], 1)
+        self.assertStatus(locked, OrderStatus.CANCELLED, Payment.PaymentStatus.CANCELLED)
+        self.assertEqual(self.on_hand(), 6)
@@ -6,6 +6,7 @@ from rest_framework.decorators import action
 from .models import Order
 from .serializers import OrderSerializer, OrderStatusUpdateSerializer
 from .services import create_order_from_cart, cancel_order
+from core.pagination import KeysetPagination
 
 class IsAdminOrOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -15,11 +16,14 @@ class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
     serializer_class = OrderSerializer
     http_method_names = ["get", "post", "patch", "head", "options"]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-created_at", "-id")
 
     def get_queryset(self):
+        qs = Order.objects.prefetch_related("items").order_by("-created_at", "-id")
         if self.request.user.is_staff:
-            return Order.objects.all().order_by("-created_at")
-        return Order.objects.filter(user=self.request.user).order_by("-created_at")
+            return qs
+        return qs.filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action in ["partial_update", "update"]:
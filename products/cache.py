@@ -0,0 +1,195 @@
+# products/cache.py
+"""
+Read-through cache for catalog GET responses.
+
+Keys embed generation counters instead of being deleted one by one: a product
+change bumps that product's version and the product-list generation, a
+category change bumps the category generation, which every catalog key
+includes (products embed their category tree, categories show product
+counts). Stale keys simply age out.
+
+Entries carry a soft expiry. After it passes, one request recomputes the
+entry while the others keep serving the stale copy until the hard TTL.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PRODUCTS = "products"
+CATEGORIES = "categories"
+PRODUCT_DETAILS = "product-details"
+RELATED = "related"
+
+# Descendant id sets change rarely; old generations expire after a day.
+SUBTREE_TIMEOUT = 60 * 60 * 24
+
+# Past this many products, bump every detail entry instead of one key each.
+PER_PRODUCT_INVALIDATION_LIMIT = 100
+
+STATS = ("hit", "stale", "miss")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _generation_key(namespace):
+    return f"catalog:gen:{namespace}"
+
+
+def _product_version_key(pk):
+    return f"catalog:product:{pk}:version"
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Seed evicted counters from the clock so old keys can't be reused.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def _record(stat):
+    key = f"catalog:stats:{stat}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def _normalized_query(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ""
+    )
+    raw = f"{request.get_host()}?{params!r}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def list_key(namespace, request):
+    versions = cache.get_many([_generation_key(PRODUCTS), _generation_key(CATEGORIES)])
+    return "catalog:{}:list:p{}:c{}:{}".format(
+        namespace,
+        versions.get(_generation_key(PRODUCTS), 0),
+        versions.get(_generation_key(CATEGORIES), 0),
+        _normalized_query(request),
+    )
+
+
+def detail_key(namespace, pk, request):
+    keys = [_generation_key(CATEGORIES)]
+    if namespace == PRODUCTS:
+        keys += [_generation_key(PRODUCT_DETAILS), _product_version_key(pk)]
+    else:
+        keys += [_generation_key(PRODUCTS)]
+    versions = cache.get_many(keys)
+    return "catalog:{}:{}:{}:{}".format(
+        namespace,
+        pk,
+        ":".join(str(versions.get(key, 0)) for key in keys),
+        _normalized_query(request),
+    )
+
+
+def related_key(pk, request):
+    """
+    Key of a product's "bought together" list: it shows other products'
+    cards, so any product change, or a co-purchase run, moves it.
+    """
+    keys = [_generation_key(name) for name in (CATEGORIES, PRODUCTS, RELATED)]
+    versions = cache.get_many(keys)
+    return "catalog:{}:{}:{}:{}".format(
+        RELATED,
+        pk,
+        ":".join(str(versions.get(key, 0)) for key in keys),
+        _normalized_query(request),
+    )
+
+
+def subtree_key(slug):
+    """Key of the descendant id set of a category, dropped by any category change."""
+    generation = cache.get(_generation_key(CATEGORIES), 0)
+    return f"catalog:category-subtree:{generation}:{slug}"
+
+
+def get_or_build(key, build):
+    """
+    Returns the cached data for ``key``, calling ``build()`` on a miss.
+    Only one caller rebuilds an expired entry at a time (single flight).
+    """
+    ttl = _setting("CATALOG_CACHE_TTL", 300)
+    grace = _setting("CATALOG_CACHE_GRACE", 60)
+    lock_key = f"{key}:lock"
+    lock_timeout = _setting("CATALOG_CACHE_LOCK_TIMEOUT", 10)
+
+    entry = cache.get(key)
+    if entry is not None:
+        soft_expires_at, data = entry
+        if time.time() < soft_expires_at:
+            _record("hit")
+            return data
+        if not cache.add(lock_key, 1, lock_timeout):
+            _record("stale")
+            return data
+        owns_lock = True
+    else:
+        owns_lock = cache.add(lock_key, 1, lock_timeout)
+        if not owns_lock:
+            # Someone else is building this entry; give them a moment.
+            deadline = time.time() + _setting("CATALOG_CACHE_WAIT", 0.5)
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if entry is not None:
+                    _record("hit")
+                    return entry[1]
+
+    _record("miss")
+    try:
+        data = build()
+        cache.set(key, (time.time() + ttl, data), timeout=ttl + grace)
+    finally:
+        if owns_lock:
+            cache.delete(lock_key)
+    return data
+
+
+def cache_stats():
+    values = cache.get_many([f"catalog:stats:{stat}" for stat in STATS])
+    stats = {stat: values.get(f"catalog:stats:{stat}", 0) for stat in STATS}
+    lookups = sum(stats.values())
+    stats["hit_ratio"] = round((stats["hit"] + stats["stale"]) / lookups, 4) if lookups else None
+    return stats
+
+
+def invalidate_products(product_ids=None):
+    """
+    Invalidates product lists and the detail entries of ``product_ids``
+    (all details when None or a large batch). Runs once the transaction commits.
+    """
+    product_ids = None if product_ids is None else set(product_ids)
+
+    def bump():
+        _bump(_generation_key(PRODUCTS))
+        if product_ids is None or len(product_ids) > PER_PRODUCT_INVALIDATION_LIMIT:
+            _bump(_generation_key(PRODUCT_DETAILS))
+        else:
+            for pk in product_ids:
+                _bump(_product_version_key(pk))
+
+    transaction.on_commit(bump)
+
+
+def invalidate_categories():
+    """Invalidates every catalog entry (products embed their category tree)."""
+    transaction.on_commit(lambda: _bump(_generation_key(CATEGORIES)))
+
+
+def invalidate_related():
+    """Invalidates every "bought together" list after a co-purchase run."""
+    transaction.on_commit(lambda: _bump(_generation_key(RELATED)))
@@ -0,0 +1,255 @@
+# products/documents.py
+"""
+Product detail read model.
+
+ProductDocument holds the rendered detail payload of each product (category
+tree, images and variants, inventory rows, rating), so a detail read is one
+primary-key lookup plus the live stock totals, which change too often to be
+stored.
+
+Writers call mark_stale() for every product whose payload they change. That
+sets ``dirty_since`` and schedules one rebuild task a few seconds later;
+every change in the meantime rides on the same task. Dirty documents are
+never served: the view renders those products live until the rebuild
+lands, so readers can't see a payload older than their own write.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Product, ProductDocument
+from products.services import with_stock_totals
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+# Stock totals are read live with the document.
+VOLATILE_FIELDS = {"total_stock", "available_stock"}
+SCHEDULED_KEY = "product-documents:scheduled"
+
+
+def _coalesce_seconds():
+    return getattr(settings, "PRODUCT_DOCUMENT_COALESCE_SECONDS", 5)
+
+
+def document_fields():
+    from products.serializers import ProductSerializer
+
+    readable = ProductSerializer.resolve_fields(fields=[], expand=[], lean=False)
+    return readable - VOLATILE_FIELDS
+
+
+def mark_stale(product_ids=None, category_ids=None):
+    """
+    Flags the documents of ``product_ids`` and of the products in
+    ``category_ids`` for a rebuild, scheduled once the transaction commits.
+    """
+    condition = Q(pk__in=[])
+    if product_ids is not None:
+        condition |= Q(product_id__in=list(product_ids))
+    if category_ids is not None:
+        condition |= Q(product__category_id__in=list(category_ids))
+    if ProductDocument.objects.filter(condition).update(dirty_since=timezone.now()):
+        transaction.on_commit(schedule_rebuild)
+
+
+def mark_all_stale():
+    if ProductDocument.objects.update(dirty_since=timezone.now()):
+        transaction.on_commit(schedule_rebuild)
+
+
+def create_documents(product_ids):
+    """Adds (dirty) document rows for new products."""
+    now = timezone.now()
+    ProductDocument.objects.bulk_create(
+        [ProductDocument(product_id=pk, dirty_since=now) for pk in product_ids],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(schedule_rebuild)
+
+
+def schedule_rebuild():
+    # One task per coalescing window: later changes find the key and skip.
+    if not cache.add(SCHEDULED_KEY, 1, timeout=_coalesce_seconds() * 12):
+        return
+    from products.tasks import rebuild_product_documents
+
+    try:
+        rebuild_product_documents.apply_async(countdown=_coalesce_seconds())
+    except Exception:
+        # The broker is down; the periodic rebuild picks the rows up.
+        cache.delete(SCHEDULED_KEY)
+        logger.warning("Couldn't queue the product document rebuild", exc_info=True)
+
+
+def render_documents(products):
+    """``{pk: payload}`` for ``products``, as the detail endpoint renders them."""
+    from products.serializers import ProductSerializer
+
+    products = list(
+        products.select_related("category", "rating_stats").prefetch_related(
+            "images__variants", "inventory_items"
+        )
+    )
+    serializer = ProductSerializer(
+        products, many=True, context={"requested_fields": document_fields()}
+    )
+    # Round-trip through the renderer so the stored JSON is what the API
+    # would have sent (dates, decimals, key order).
+    rows = json.loads(JSONRenderer().render(serializer.data))
+    return {row["id"]: row for row in rows}
+
+
+def rebuild_stale(batch_size=BATCH_SIZE):
+    """
+    Rebuilds the documents that were dirty when the call started and returns
+    how many were written. Rows dirtied again meanwhile keep their flag.
+    """
+    started = timezone.now()
+    built = 0
+    while True:
+        dirty = dict(
+            ProductDocument.objects.filter(dirty_since__lte=started)
+            .order_by("dirty_since")
+            .values_list("product_id", "dirty_since")[:batch_size]
+        )
+        if not dirty:
+            break
+        built += _write(dirty)
+        if len(dirty) < batch_size:
+            break
+    return built
+
+
+def _write(dirty):
+    documents = render_documents(Product.objects.filter(pk__in=dirty))
+    ids = list(documents)
+    if not ids:
+        return 0
+    table = connection.ops.quote_name(ProductDocument._meta.db_table)
+    with connection.cursor() as cursor:
+        # Compare-and-set on dirty_since: a row changed after we read it
+        # stays dirty for the next task.
+        cursor.execute(
+            f"UPDATE {table} SET data = v.data, dirty_since = NULL, built_at = %s "
+            f"FROM unnest(%s::bigint[], %s::text[], %s::timestamptz[]) "
+            f"AS v(product_id, data, dirty_since) "
+            f"WHERE {table}.product_id = v.product_id "
+            f"AND {table}.dirty_since = v.dirty_since",
+            [
+                timezone.now(),
+                ids,
+                [json.dumps(documents[pk]) for pk in ids],
+                [dirty[pk] for pk in ids],
+            ],
+        )
+        return cursor.rowcount
+
+
+def rebuild_all(batch_size=BATCH_SIZE):
+    """Creates missing rows, flags every document and rebuilds them all."""
+    product_table = connection.ops.quote_name(Product._meta.db_table)
+    document_table = connection.ops.quote_name(ProductDocument._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {document_table} (product_id, dirty_since) "
+            f"SELECT id, %s FROM {product_table} "
+            f"ON CONFLICT (product_id) DO UPDATE SET dirty_since = EXCLUDED.dirty_since",
+            [timezone.now()],
+        )
+    return rebuild_stale(batch_size)
+
+
+def check_documents(batch_size=BATCH_SIZE):
+    """
+    Compares every clean document with a fresh rendering. Returns
+    ``(checked, missing_ids, mismatched_ids)``.
+    """
+    checked, missing, mismatched = 0, [], []
+    last_pk = 0
+    while True:
+        ids = list(
+            Product.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_pk = ids[-1]
+        stored = {
+            pk: json.loads(data) if data else None
+            for pk, data in ProductDocument.objects.filter(
+                product_id__in=ids
+            ).values_list("product_id", "data")
+        }
+        missing += [pk for pk in ids if pk not in stored]
+        clean = list(
+            ProductDocument.objects.filter(
+                product_id__in=ids, dirty_since__isnull=True
+            ).values_list("product_id", flat=True)
+        )
+        fresh = render_documents(Product.objects.filter(pk__in=clean))
+        checked += len(clean)
+        mismatched += [pk for pk in clean if stored.get(pk) != fresh.get(pk)]
+    return checked, missing, mismatched
+
+
+def read_document(pk):
+    """
+    ``(payload, stock_total, stock_reserved)`` from one primary-key lookup,
+    or None when the product has no clean document (or doesn't exist).
+    """
+    try:
+        return (
+            with_stock_totals(
+                Product.objects.filter(
+                    pk=pk,
+                    is_active=True,
+                    document__data__isnull=False,
+                    document__dirty_since__isnull=True,
+                )
+            )
+            .values_list("document__data", "stock_total", "stock_reserved")
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def document_payload(document, requested, request=None):
+    """The detail response for ``requested`` fields from read_document()."""
+    from products.serializers import ProductSerializer
+
+    data, stock_total, stock_reserved = document
+    values = dict(
+        json.loads(data), total_stock=stock_total, available_stock=stock_total - stock_reserved
+    )
+    payload = {
+        name: values[name]
+        for name in ProductSerializer.Meta.fields
+        if name in requested and name in values
+    }
+    if request is not None:
+        for image in payload.get("images", []):
+            _absolute_image_urls(image, request)
+    return payload
+
+
+def _absolute_image_urls(image, request):
+    # Variant URLs are stored relative; ProductImageSerializer serves them absolute.
+    widths = {}
+    for formats in image.get("variants", {}).values():
+        for fmt, variant in formats.items():
+            variant["url"] = request.build_absolute_uri(variant["url"])
+            widths.setdefault(fmt, []).append((variant["width"], variant["url"]))
+    if "srcset" in image:
+        image["srcset"] = {
+            fmt: ", ".join(f"{url} {width}w" for width, url in sorted(entries))
+            for fmt, entries in widths.items()
+        }
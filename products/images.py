@@ -0,0 +1,223 @@
+# products/images.py
+"""
+Resized WebP/JPEG derivatives of product images.
+
+Each variant (settings.PRODUCT_IMAGE_VARIANTS) is encoded in every format
+of settings.PRODUCT_IMAGE_FORMATS and saved as
+``products/variants/<product>/<image>-<variant>-<hash>.<ext>``. The name
+carries a hash of the bytes, so the files can be cached forever and
+re-running on an unchanged original writes nothing new.
+"""
+import hashlib
+import ipaddress
+import logging
+import socket
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from products import cache as catalog_cache
+from products.documents import mark_stale
+from products.models import Product, ProductImage, ProductImageVariant
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+MAX_REDIRECTS = 3
+
+
+class ImageSourceError(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def read_original(image):
+    """The original's bytes: the uploaded file, a media path, or an http(s) URL."""
+    if image.image:
+        with image.image.open("rb") as original:
+            return original.read()
+
+    url = image.image_url
+    media_url = "/" + settings.MEDIA_URL.lstrip("/")
+    if url.startswith(media_url):
+        with default_storage.open(url[len(media_url) :], "rb") as original:
+            return original.read()
+    if not url.startswith(("http://", "https://")):
+        raise ImageSourceError(f"Can't fetch '{url}'.")
+
+    return _download(url)
+
+
+def _download(url):
+    """
+    Fetches ``url`` with redirects followed by hand, so every hop goes
+    through _check_source().
+    """
+    max_bytes = _setting("PRODUCT_IMAGE_MAX_BYTES", 20 * 1024 * 1024)
+    for _ in range(MAX_REDIRECTS + 1):
+        _check_source(url)
+        try:
+            with requests.get(url, stream=True, timeout=10, allow_redirects=False) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                response.raise_for_status()
+                data = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    data += chunk
+                    if len(data) > max_bytes:
+                        raise ImageSourceError(f"'{url}' is larger than {max_bytes} bytes.")
+                return bytes(data)
+        except requests.RequestException as exc:
+            raise ImageSourceError(f"Can't fetch '{url}': {exc}")
+    raise ImageSourceError(f"Too many redirects fetching '{url}'.")
+
+
+def _check_source(url):
+    """
+    Rejects URLs the server shouldn't fetch: other schemes, hosts outside
+    settings.PRODUCT_IMAGE_ALLOWED_HOSTS (when set) and hosts resolving to
+    loopback, private, link-local or otherwise non-public addresses.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageSourceError(f"Can't fetch '{url}'.")
+    host = parts.hostname
+    allowed = _setting("PRODUCT_IMAGE_ALLOWED_HOSTS", [])
+    if allowed and not any(
+        host == pattern or (pattern.startswith(".") and host.endswith(pattern))
+        for pattern in allowed
+    ):
+        raise ImageSourceError(f"'{host}' isn't an allowed image host.")
+
+    try:
+        addresses = socket.getaddrinfo(host, parts.port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as exc:
+        raise ImageSourceError(f"Can't resolve '{host}': {exc}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global:
+            raise ImageSourceError(f"'{host}' resolves to a non-public address ({address}).")
+
+
+def render_variants(data):
+    """Yields ``(name, format, width, height, bytes)`` for every variant."""
+    try:
+        original = Image.open(BytesIO(data))
+        original.load()
+        original = ImageOps.exif_transpose(original)
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ImageSourceError(f"Not a usable image: {exc}")
+
+    has_alpha = original.mode in ("RGBA", "LA") or "transparency" in original.info
+    quality = _setting("PRODUCT_IMAGE_QUALITY", 82)
+    for name, edge in _setting("PRODUCT_IMAGE_VARIANTS", {}).items():
+        resized = original.copy()
+        resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)  # never upscales
+        for fmt in _setting("PRODUCT_IMAGE_FORMATS", ["webp", "jpeg"]):
+            frame = resized
+            if fmt == "jpeg" or not has_alpha:
+                frame = _flatten(resized) if has_alpha else resized.convert("RGB")
+            elif frame.mode != "RGBA":
+                frame = frame.convert("RGBA")
+            buffer = BytesIO()
+            frame.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
+            yield name, fmt, frame.width, frame.height, buffer.getvalue()
+
+
+def _flatten(image):
+    # JPEG has no alpha channel: composite onto white.
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+    return background
+
+
+def process_image(image):
+    """
+    Generates and records the variants of ``image``, replacing the previous
+    set. Returns the number of variants written.
+    """
+    data = read_original(image)
+    rows = []
+    for name, fmt, width, height, content in render_variants(data):
+        digest = hashlib.sha256(content).hexdigest()
+        path = (
+            f"products/variants/{image.product_id}/"
+            f"{image.pk}-{name}-{digest[:16]}.{EXTENSIONS[fmt]}"
+        )
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        rows.append(
+            ProductImageVariant(
+                image=image,
+                name=name,
+                format=fmt,
+                file=path,
+                width=width,
+                height=height,
+                size=len(content),
+                content_hash=digest,
+            )
+        )
+
+    current = [row.file for row in rows]
+    with transaction.atomic():
+        stale = list(image.variants.exclude(file__in=current).values_list("file", flat=True))
+        ProductImageVariant.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["image", "name", "format"],
+            update_fields=["file", "width", "height", "size", "content_hash"],
+        )
+        # Older renditions and variants no longer in the settings.
+        image.variants.exclude(file__in=current).delete()
+        now = timezone.now()
+        ProductImage.objects.filter(pk=image.pk).update(processed_at=now)
+        # The variant map is part of the product payload (cache and ETag).
+        Product.objects.filter(pk=image.product_id).update(updated_at=now)
+        catalog_cache.invalidate_products([image.product_id])
+        mark_stale(product_ids=[image.product_id])
+        transaction.on_commit(lambda: delete_files(stale))
+    return len(rows)
+
+
+def delete_files(paths):
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.warning("Couldn't delete stale image variant %s", path)
+
+
+def process_pending(limit=100):
+    """
+    Processes up to ``limit`` images without variants (oldest first).
+    Returns ``(processed, failed)``. Failures of any kind are logged and
+    marked processed so one broken image can't stall the backfill; re-save
+    the image to retry.
+    """
+    processed = failed = 0
+    pending = ProductImage.objects.filter(processed_at__isnull=True).order_by("id")
+    for image in pending[:limit]:
+        try:
+            process_image(image)
+        except ImageSourceError as exc:
+            logger.warning("Image %s skipped: %s", image.pk, exc)
+        except Exception:
+            logger.exception("Image %s failed", image.pk)
+        else:
+            processed += 1
+            continue
+        ProductImage.objects.filter(pk=image.pk).update(processed_at=timezone.now())
+        failed += 1
+    return processed, failed
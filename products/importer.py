@@ -0,0 +1,387 @@
+# products/importer.py
+"""
+Bulk catalog import from CSV or JSON Lines.
+
+Rows are streamed and written in chunks: one upsert on SKU per chunk for
+products, plus bulk writes for their stock and images. Slugs and categories
+are resolved per chunk with a single query each. Model signals don't fire for
+bulk writes, so the search vectors, facet counts, cache, detail documents
+and autocomplete entries are refreshed here once per chunk.
+
+Columns: sku, name, category (slug or name), price, and optionally
+description, discount_price, currency, specifications (JSON), is_featured,
+is_active, stock, images ("|"-separated URLs in CSV, a list in JSONL).
+"""
+import csv
+import json
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from inventory.models import InventoryItem
+from products import cache as catalog_cache
+from products.documents import create_documents, mark_stale
+from products.models import Category, Product, ProductImage
+from products.services import apply_facet_deltas, facet_deltas, refresh_search_vectors
+from products.slugs import allocate_slugs
+from products.suggest import get_suggest_index
+from reviews.models import ProductRating
+
+FORMATS = ("csv", "jsonl")
+DEFAULT_CHUNK_SIZE = 1000
+CHUNK_ATTEMPTS = 2
+
+# Written on insert and overwritten when the SKU already exists.
+UPSERT_FIELDS = [
+    "category",
+    "name",
+    "description",
+    "price",
+    "discount_price",
+    "currency",
+    "specifications",
+    "is_featured",
+    "is_active",
+    "updated_at",
+]
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yields ``(line_number, row_dict)`` from a text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = exc
+        yield line_number, row
+
+
+def import_catalog(stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Imports every row of ``stream`` and returns a summary dict with the
+    created/updated/failed counts and the per-row errors. ``progress`` is
+    called with the running summary after each chunk.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {FORMATS}.")
+    summary = {"rows": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+    categories = CategoryResolver()
+    rows = read_rows(stream, fmt)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        summary["rows"] += len(chunk)
+        _import_chunk(chunk, categories, summary)
+        if progress is not None:
+            progress(summary)
+    return summary
+
+
+def _import_chunk(chunk, categories, summary):
+    parsed = {}
+    for line_number, row in chunk:
+        try:
+            if isinstance(row, Exception):
+                raise RowError(f"Invalid JSON: {row}")
+            item = _parse_row(row)
+        except RowError as exc:
+            _fail(summary, line_number, row, str(exc))
+            continue
+        # A SKU repeated within the chunk: the last row wins.
+        parsed[item["sku"]] = (line_number, item)
+
+    resolved = categories.resolve(item["category"] for _, item in parsed.values())
+    valid = {}
+    for sku, (line_number, item) in parsed.items():
+        category = resolved.get(item["category"])
+        if category is None:
+            _fail(summary, line_number, item, f"Unknown category '{item['category']}'.")
+            continue
+        item["category"] = category
+        valid[sku] = (line_number, item)
+
+    if not valid:
+        return
+    for attempt in range(CHUNK_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                created, updated = _write_chunk(valid)
+            break
+        except IntegrityError as exc:
+            # Most likely a concurrent writer took one of the new slugs;
+            # the retry allocates them again.
+            if attempt < CHUNK_ATTEMPTS - 1:
+                continue
+            error = exc
+        except DatabaseError as exc:
+            error = exc
+        for line_number, item in valid.values():
+            _fail(summary, line_number, item, f"Chunk rolled back: {error}")
+        return
+    summary["created"] += created
+    summary["updated"] += updated
+
+
+def _write_chunk(valid):
+    items = [item for _, item in valid.values()]
+    existing = {
+        sku: (pk, slug, category_id, specifications, is_active)
+        for sku, pk, slug, category_id, specifications, is_active in Product.objects.filter(
+            sku__in=[item["sku"] for item in items]
+        ).values_list("sku", "pk", "slug", "category_id", "specifications", "is_active")
+    }
+
+    new_items = [item for item in items if item["sku"] not in existing]
+    slugs = iter(allocate_slugs(Product, [item["name"] for item in new_items]))
+    products = []
+    for item in items:
+        fields = {name: item[name] for name in UPSERT_FIELDS if name in item}
+        slug = existing[item["sku"]][1] if item["sku"] in existing else next(slugs)
+        products.append(Product(sku=item["sku"], slug=slug, **fields))
+
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=["sku"],
+        update_fields=UPSERT_FIELDS,
+        batch_size=500,
+    )
+    product_ids = {product.sku: product.pk for product in products}
+
+    ProductRating.objects.bulk_create(
+        [ProductRating(product_id=product_ids[item["sku"]]) for item in new_items],
+        ignore_conflicts=True,
+    )
+    create_documents([product_ids[item["sku"]] for item in new_items])
+    _write_stock(items, existing, product_ids)
+    _write_images(items, product_ids)
+
+    # What the post_save receivers would have done, once for the whole chunk.
+    by_category = {}
+    deltas = Counter()
+    for item in items:
+        category = item["category"]
+        by_category.setdefault(category.pk, (category, []))[1].append(
+            product_ids[item["sku"]]
+        )
+        deltas.update(
+            facet_deltas(category.pk, item["specifications"], item["is_active"])
+        )
+        if item["sku"] in existing:
+            deltas.update(facet_deltas(*existing[item["sku"]][2:], sign=-1))
+    for category, ids in by_category.values():
+        refresh_search_vectors(category, product_ids=ids)
+    apply_facet_deltas(deltas)
+    catalog_cache.invalidate_products(product_ids.values())
+    mark_stale(product_ids=[existing[sku][0] for sku in existing])
+    ids = list(product_ids.values())
+    transaction.on_commit(lambda: get_suggest_index().index_products(ids), robust=True)
+
+    return len(new_items), len(items) - len(new_items)
+
+
+def _write_stock(items, existing, product_ids):
+    """
+    New products get their inventory row (with ``stock`` or 0, like
+    create_product_inventory). For existing ones ``stock`` overwrites the
+    quantity of their location-less row.
+    """
+    new_rows = [
+        InventoryItem(product_id=product_ids[item["sku"]], quantity=item.get("stock", 0))
+        for item in items
+        if item["sku"] not in existing
+    ]
+    restock = {
+        product_ids[item["sku"]]: item["stock"]
+        for item in items
+        if item["sku"] in existing and "stock" in item
+    }
+    if restock:
+        rows = {}
+        for pk, product_id in (
+            InventoryItem.objects.filter(product_id__in=restock, location__isnull=True)
+            .order_by("id")
+            .values_list("pk", "product_id")
+        ):
+            rows.setdefault(product_id, pk)
+        for product_id, quantity in restock.items():
+            if product_id not in rows:
+                new_rows.append(InventoryItem(product_id=product_id, quantity=quantity))
+        _set_quantities({pk: restock[product_id] for product_id, pk in rows.items()})
+    InventoryItem.objects.bulk_create(new_rows, batch_size=500)
+
+
+def _set_quantities(quantities):
+    # One UPDATE ... FROM unnest() instead of bulk_update()'s CASE per row,
+    # which is slow to build for thousands of rows.
+    if not quantities:
+        return
+    table = connection.ops.quote_name(InventoryItem._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET quantity = v.quantity, last_updated = %s "
+            f"FROM unnest(%s::bigint[], %s::integer[]) AS v(id, quantity) "
+            f"WHERE {table}.id = v.id",
+            [timezone.now(), list(quantities), list(quantities.values())],
+        )
+
+
+def _write_images(items, product_ids):
+    # Rows that list images replace the product's images; others keep theirs.
+    replaced = {product_ids[item["sku"]]: item["images"] for item in items if "images" in item}
+    if not replaced:
+        return
+    # Raw delete: the per-image post_delete receivers would each touch the
+    # product again, and the chunk already invalidates them all at once.
+    table = connection.ops.quote_name(ProductImage._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE product_id = ANY(%s)", [list(replaced)]
+        )
+    ProductImage.objects.bulk_create(
+        (
+            ProductImage(
+                product_id=product_id,
+                image_url=url,
+                is_main=position == 0,
+                position=position,
+            )
+            for product_id, urls in replaced.items()
+            for position, url in enumerate(urls)
+        ),
+        batch_size=500,
+    )
+
+
+class CategoryResolver:
+    """Maps the category column (slug or name) to categories, memoized per import."""
+
+    def __init__(self):
+        self.known = {}
+
+    def resolve(self, references):
+        missing = {ref for ref in references if ref not in self.known}
+        if missing:
+            found = Category.objects.filter(Q(slug__in=missing) | Q(name__in=missing))
+            by_name = {}
+            for category in found:
+                by_name.setdefault(category.name, category)
+                self.known[category.slug] = category
+            for ref in missing:
+                self.known.setdefault(ref, by_name.get(ref))
+        return self.known
+
+
+def _parse_row(row):
+    if not isinstance(row, dict):
+        raise RowError("Expected an object per line.")
+
+    def text(name, max_length=None, required=False):
+        value = row.get(name)
+        value = "" if value is None else str(value).strip()
+        if required and not value:
+            raise RowError(f"'{name}' is required.")
+        if max_length and len(value) > max_length:
+            raise RowError(f"'{name}' is longer than {max_length} characters.")
+        return value
+
+    item = {
+        "sku": text("sku", 50, required=True),
+        "name": text("name", 255, required=True),
+        "category": text("category", required=True),
+        "description": text("description"),
+        "price": _decimal(row, "price", required=True),
+        "discount_price": _decimal(row, "discount_price"),
+        "currency": text("currency", 3) or "ETB",
+        "specifications": _json(row, "specifications", dict, {}),
+        "is_featured": _bool(row, "is_featured", False),
+        "is_active": _bool(row, "is_active", True),
+        "updated_at": timezone.now(),
+    }
+    if item["price"] < 0 or (item["discount_price"] or 0) < 0:
+        raise RowError("Prices can't be negative.")
+    if item["discount_price"] is not None and item["discount_price"] > item["price"]:
+        raise RowError("Discount price cannot be higher than the original price.")
+
+    if row.get("stock") not in (None, ""):
+        try:
+            item["stock"] = int(row["stock"])
+        except (TypeError, ValueError):
+            raise RowError("'stock' must be an integer.")
+        if item["stock"] < 0:
+            raise RowError("'stock' can't be negative.")
+
+    images = row.get("images")
+    if isinstance(images, str):
+        images = [url.strip() for url in images.split("|") if url.strip()]
+    if images:
+        if not isinstance(images, list) or any(
+            not isinstance(url, str) or len(url) > 255 for url in images
+        ):
+            raise RowError("'images' must be a list of URLs.")
+        item["images"] = images
+    return item
+
+
+def _decimal(row, name, required=False):
+    value = row.get(name)
+    if value in (None, ""):
+        if required:
+            raise RowError(f"'{name}' is required.")
+        return None
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f"'{name}' must be a number.")
+    if not value.is_finite() or value.as_tuple().exponent < -2 or value >= 10**8:
+        raise RowError(f"'{name}' must have at most 8 digits and 2 decimal places.")
+    return value
+
+
+def _json(row, name, kind, default):
+    value = row.get(name)
+    if value in (None, ""):
+        return default
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise RowError(f"'{name}' must be valid JSON.")
+    if not isinstance(value, kind):
+        raise RowError(f"'{name}' must be a JSON {kind.__name__}.")
+    return value
+
+
+def _bool(row, name, default):
+    value = row.get(name)
+    if value in (None, ""):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _fail(summary, line_number, row, message):
+    summary["failed"] += 1
+    sku = row.get("sku") if isinstance(row, dict) else None
+    summary["errors"].append({"line": line_number, "sku": sku, "error": message})
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from products.images import process_pending
+from products.tasks import backfill_image_variants
+
+
+class Command(BaseCommand):
+    help = "Generates the resized variants of product images that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Process in this process instead of queuing Celery tasks.",
+        )
+
+    def handle(self, *args, batch_size, sync, **options):
+        if not sync:
+            backfill_image_variants.delay(batch_size)
+            self.stdout.write(self.style.SUCCESS("Queued the image variant backfill."))
+            return
+
+        total_processed = total_failed = 0
+        while True:
+            processed, failed = process_pending(batch_size)
+            total_processed += processed
+            total_failed += failed
+            if processed + failed:
+                self.stdout.write(f"{total_processed} processed, {total_failed} skipped")
+            if processed + failed < batch_size:
+                break
+        self.stdout.write(self.style.SUCCESS("Image variant backfill done."))
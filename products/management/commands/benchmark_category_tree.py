@@ -0,0 +1,94 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from products.models import Category
+from products.views import CategoryViewSet
+
+# Responses must be built, not served from the catalog cache.
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def _recursive_walk(category):
+    # What the old recursive serializer did: one query per node.
+    for child in category.subcategories.all():
+        _recursive_walk(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the queries and time of the category list and detail "
+        "endpoints with a per-node recursive walk, for trees of several "
+        "depths. Everything it writes is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--depths", type=int, nargs="+", default=list(range(2, 9)), help="Tree depths."
+        )
+        parser.add_argument(
+            "--branching", type=int, default=2, help="Children per category."
+        )
+        parser.add_argument("--runs", type=int, default=10, help="Runs per measurement.")
+
+    def handle(self, *args, depths, branching, runs, **options):
+        factory = APIRequestFactory(HTTP_HOST="localhost")
+        list_view = CategoryViewSet.as_view({"get": "list"})
+        detail_view = CategoryViewSet.as_view({"get": "retrieve"})
+        self.stdout.write(
+            f"{'depth':>5} {'nodes':>6}  {'recursive ms':>12} {'queries':>7}  "
+            f"{'list ms':>7} {'queries':>7}  {'detail ms':>9} {'queries':>7}"
+        )
+        with override_settings(CACHES=NO_CACHE):
+            for depth in depths:
+                with transaction.atomic():
+                    root, nodes = self._tree(depth, branching)
+                    recursive = self._measure(runs, lambda: _recursive_walk(root))
+                    listed = self._measure(
+                        runs, lambda: list_view(factory.get("/api/categories/"))
+                    )
+                    detail = self._measure(
+                        runs,
+                        lambda: detail_view(
+                            factory.get(f"/api/categories/{root.pk}/"), pk=root.pk
+                        ),
+                    )
+                    self.stdout.write(
+                        f"{depth:>5} {nodes:>6}  {recursive[0]:>12.2f} {recursive[1]:>7}  "
+                        f"{listed[0]:>7.2f} {listed[1]:>7}  {detail[0]:>9.2f} {detail[1]:>7}"
+                    )
+                    transaction.set_rollback(True)
+
+    def _tree(self, depth, branching):
+        tag = uuid.uuid4().hex[:8]
+        root = Category.objects.create(name=f"Tree benchmark {tag}")
+        level, nodes = [root], 1
+        for _ in range(depth - 1):
+            children = []
+            for parent in level:
+                for i in range(branching):
+                    children.append(
+                        Category.objects.create(
+                            name=f"Tree benchmark {tag} {parent.pk}-{i}",
+                            parent_category=parent,
+                        )
+                    )
+            level = children
+            nodes += len(children)
+        return root, nodes
+
+    def _measure(self, runs, fn):
+        """Median milliseconds and query count of ``fn``."""
+        timings, queries = [], 0
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                fn()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(captured)
+        return statistics.median(timings), queries
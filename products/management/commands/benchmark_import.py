@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.importer import DEFAULT_CHUNK_SIZE, FORMATS, import_catalog
+from products.models import Category
+
+COLUMNS = ["sku", "name", "category", "price", "description", "specifications", "stock", "images"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times import_catalog on a generated feed: a first pass that creates "
+        "every product and a second that updates them. Everything it writes "
+        "is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000, help="Rows in the feed.")
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, rows, format, chunk_size, **options):
+        tag = uuid.uuid4().hex[:8]
+        with transaction.atomic():
+            categories = [
+                Category.objects.create(name=f"Import benchmark {tag} {i}").slug
+                for i in range(10)
+            ]
+            self.stdout.write(f"{'pass':<8} {'rows':>8} {'seconds':>8} {'rows/s':>8}")
+            for label, price in (("create", 10), ("update", 12)):
+                feed = self._feed(rows, format, tag, categories, price)
+                started = time.monotonic()
+                summary = import_catalog(feed, format, chunk_size)
+                elapsed = time.monotonic() - started
+                if summary["failed"]:
+                    self.stderr.write(f"{summary['failed']} rows failed: {summary['errors'][:3]}")
+                self.stdout.write(
+                    f"{label:<8} {summary['rows']:>8} {elapsed:>8.1f} {rows / elapsed:>8.0f}"
+                )
+            transaction.set_rollback(True)
+
+    def _feed(self, rows, fmt, tag, categories, price):
+        records = (
+            {
+                "sku": f"IB{tag}{i}",
+                "name": f"Import benchmark {tag} {i}",
+                "category": categories[i % len(categories)],
+                "price": price + i % 100,
+                "description": "Generated by benchmark_import.",
+                "specifications": {"color": ["black", "white"][i % 2], "size": i % 5},
+                "stock": i % 50,
+                "images": [f"https://cdn.example.com/{tag}/{i}.jpg"],
+            }
+            for i in range(rows)
+        )
+        stream = io.StringIO()
+        if fmt == "jsonl":
+            for record in records:
+                stream.write(json.dumps(record) + "\n")
+        else:
+            writer = csv.DictWriter(stream, COLUMNS)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(
+                    dict(
+                        record,
+                        specifications=json.dumps(record["specifications"]),
+                        images="|".join(record["images"]),
+                    )
+                )
+        stream.seek(0)
+        return stream
@@ -0,0 +1,81 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from inventory.models import InventoryItem
+from products.models import Category, Product, ProductImage
+from products.views import ProductViewSet
+
+# Responses must be built, not served from the catalog cache.
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+VARIANTS = {
+    "full": {"expand": "category,images,inventory_items,specifications"},
+    "card (default)": {},
+    "id,name,price": {"fields": "id,name,price"},
+    "card + images": {"expand": "images"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the payload size, latency and queries of a product list page "
+        "for several ?fields= / ?expand= combinations. Everything it writes "
+        "is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100, help="Products per page.")
+        parser.add_argument("--runs", type=int, default=20, help="Requests per variant.")
+        parser.add_argument("--depth", type=int, default=6, help="Category tree depth.")
+
+    def handle(self, *args, page_size, runs, depth, **options):
+        factory = APIRequestFactory(HTTP_HOST="localhost")
+        view = ProductViewSet.as_view({"get": "list"})
+        with transaction.atomic(), override_settings(CACHES=NO_CACHE):
+            self._seed(page_size, depth)
+            self.stdout.write(
+                f"{'variant':<16} {'bytes':>9} {'p50 ms':>8} {'queries':>7}"
+            )
+            for label, params in VARIANTS.items():
+                timings, size, queries = [], 0, 0
+                for _ in range(runs):
+                    request = factory.get("/api/products/", {"page_size": page_size, **params})
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = view(request).render()
+                        timings.append((time.perf_counter() - started) * 1000)
+                    size, queries = len(response.content), len(captured)
+                self.stdout.write(
+                    f"{label:<16} {size:>9} {statistics.median(timings):>8.2f} {queries:>7}"
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, count, depth):
+        tag = uuid.uuid4().hex[:8]
+        category = None
+        for level in range(depth):
+            category = Category.objects.create(
+                name=f"Payload benchmark {tag} {level}", parent_category=category
+            )
+        for i in range(count):
+            product = Product.objects.create(
+                category=category,
+                name=f"Payload benchmark {tag} {i}",
+                price=10 + i,
+                description="A product description long enough to matter. " * 5,
+                specifications={"color": "black", "ram": 16, "bands": ["4g", "5g"]},
+            )
+            InventoryItem.objects.create(product=product, quantity=10, location="Warehouse B")
+            for position in range(3):
+                ProductImage.objects.create(
+                    product=product,
+                    image_url=f"/media/products/{tag}-{i}-{position}.jpg",
+                    is_main=position == 0,
+                    position=position,
+                )
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from products.models import Category, Product
+from products.services import refresh_search_vectors
+from products.views import ProductViewSet
+
+# Responses must be built, not served from the catalog cache.
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+BRANDS = ["Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay"]
+ADJECTIVES = ["wireless", "compact", "premium", "rugged", "smart", "portable", "ultra", "classic"]
+NOUNS = ["headphones", "keyboard", "monitor", "speaker", "charger", "camera", "router", "blender"]
+COLORS = ["black", "white", "silver", "red", "blue", "green"]
+CATEGORIES = ["Audio", "Computers", "Cameras", "Kitchen", "Networking", "Accessories"]
+
+QUERIES = {
+    "one word": "headphones",
+    "two words": "wireless speaker",
+    "brand and noun": "acme router",
+    "rare phrase": '"ultra blender" silver',
+    "typo (fallback)": "hedphones",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic catalog and times ?search= through the product "
+        "list endpoint. Everything it writes is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products", type=int, default=1_000_000, help="Products to seed."
+        )
+        parser.add_argument("--runs", type=int, default=20, help="Requests per query.")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, products, runs, batch_size, **options):
+        with transaction.atomic():
+            started = time.monotonic()
+            self._seed(products, batch_size)
+            self.stdout.write(f"Seeded {products} products in {time.monotonic() - started:.0f}s.")
+
+            factory = APIRequestFactory(HTTP_HOST="localhost")
+            view = ProductViewSet.as_view({"get": "list"})
+            self.stdout.write(
+                f"{'query':<16} {'results':>8} {'p50 ms':>8} {'p95 ms':>8} {'queries':>7}"
+            )
+            with override_settings(CACHES=NO_CACHE):
+                for label, term in QUERIES.items():
+                    timings, queries, count = [], 0, 0
+                    for _ in range(runs):
+                        request = factory.get("/api/products/", {"search": term})
+                        with CaptureQueriesContext(connection) as captured:
+                            started = time.perf_counter()
+                            response = view(request)
+                            timings.append((time.perf_counter() - started) * 1000)
+                        queries, count = len(captured), response.data["count"]
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(
+                        f"{label:<16} {count:>8} {statistics.median(timings):>8.2f} "
+                        f"{p95:>8.2f} {queries:>7}"
+                    )
+            transaction.set_rollback(True)
+
+    def _seed(self, count, batch_size):
+        tag = uuid.uuid4().hex[:8]
+        categories = [
+            Category.objects.create(name=f"{name} {tag}") for name in CATEGORIES
+        ]
+        rng = random.Random(0)
+        for start in range(0, count, batch_size):
+            Product.objects.bulk_create(
+                self._product(rng, categories, tag, i)
+                for i in range(start, min(start + batch_size, count))
+            )
+        # bulk_create skips the signals that maintain the search document.
+        for category in categories:
+            refresh_search_vectors(category)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Product._meta.db_table)}")
+
+    def _product(self, rng, categories, tag, i):
+        brand, adjective, noun = rng.choice(BRANDS), rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        color = rng.choice(COLORS)
+        return Product(
+            category=rng.choice(categories),
+            name=f"{brand} {adjective} {noun} {i}",
+            slug=f"search-benchmark-{tag}-{i}",
+            sku=f"SB{tag}{i}",
+            description=f"A {color} {adjective} {noun} by {brand}.",
+            specifications={"color": color, "brand": brand},
+            price=rng.randint(5, 500),
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from products.documents import check_documents, create_documents, mark_stale, rebuild_stale
+
+
+class Command(BaseCommand):
+    help = "Compares the product detail documents with a fresh rendering."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the missing and mismatched documents.",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, fix, batch_size, **options):
+        checked, missing, mismatched = check_documents(batch_size)
+        self.stdout.write(
+            f"{checked} checked, {len(missing)} missing, {len(mismatched)} out of date"
+        )
+        for pk in mismatched[:20]:
+            self.stdout.write(f"  product {pk}: document differs")
+        if not fix or not (missing or mismatched):
+            return
+        create_documents(missing)
+        mark_stale(product_ids=mismatched)
+        built = rebuild_stale(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {built} product documents."))
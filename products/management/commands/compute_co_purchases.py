@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.recommendations import rebuild_co_purchases, update_co_purchases
+
+
+class Command(BaseCommand):
+    help = 'Updates the "frequently bought together" lists from completed orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the accumulated counts and recompute from every order.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, rebuild, batch_size, **options):
+        run = rebuild_co_purchases if rebuild else update_co_purchases
+        orders, products = run(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(f"{orders} orders processed, {products} products updated.")
+        )
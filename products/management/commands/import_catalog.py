@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import DEFAULT_CHUNK_SIZE, FORMATS, import_catalog
+
+
+class Command(BaseCommand):
+    help = "Bulk imports products from a CSV or JSON Lines file, upserting on SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Defaults to the file extension (.csv / .jsonl).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, path, format, chunk_size, **options):
+        fmt = format or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        started = time.monotonic()
+
+        def progress(summary):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{summary['rows']} rows ({summary['rows'] / elapsed:.0f}/s): "
+                f"{summary['created']} created, {summary['updated']} updated, "
+                f"{summary['failed']} failed"
+            )
+
+        try:
+            if path == "-":
+                summary = import_catalog(sys.stdin, fmt, chunk_size, progress)
+            else:
+                with open(path, newline="", encoding="utf-8-sig") as stream:
+                    summary = import_catalog(stream, fmt, chunk_size, progress)
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(exc)
+
+        for error in summary["errors"]:
+            self.stderr.write(f"line {error['line']} ({error['sku']}): {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {summary['created'] + summary['updated']} of "
+                f"{summary['rows']} rows in {time.monotonic() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.services import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = "Recomputes the specification facet counts from the product table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--category",
+            type=int,
+            action="append",
+            dest="category_ids",
+            help="Only rebuild this category id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_facet_counts(options["category_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} facet rows."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.documents import rebuild_all, rebuild_stale
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the precomputed product detail documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild every product, not only the stale documents.",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, batch_size, **options):
+        rebuild = rebuild_all if options["all"] else rebuild_stale
+        built = rebuild(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {built} product documents."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from products.suggest import get_suggest_index
+
+
+class Command(BaseCommand):
+    help = "Re-indexes product and category names for the autocomplete endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Empty the index first (suggestions are incomplete until done).",
+        )
+
+    def handle(self, *args, clear, **options):
+        get_suggest_index().rebuild(clear=clear)
+        self.stdout.write(self.style.SUCCESS("Suggest index rebuilt."))
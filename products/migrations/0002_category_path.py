@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    parents = dict(Category.objects.values_list("id", "parent_category_id"))
+    paths = {}
+
+    def path_for(pk):
+        if pk not in paths:
+            parent = parents.get(pk)
+            paths[pk] = (path_for(parent) if parent else "") + f"{pk}/"
+        return paths[pk]
+
+    categories = list(Category.objects.only("id"))
+    for category in categories:
+        category.path = path_for(category.pk)
+    Category.objects.bulk_update(categories, ["path"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:47
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import TextField, Value
+from django.db.models.functions import Cast
+
+
+def build_search_vectors(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    Product = apps.get_model("products", "Product")
+    for category_id, name in Category.objects.values_list("id", "name"):
+        Product.objects.filter(category_id=category_id).update(
+            search_vector=(
+                SearchVector("name", weight="A", config="english")
+                + SearchVector("sku", weight="A", config="simple")
+                + SearchVector(Value(name), weight="B", config="english")
+                + SearchVector("description", weight="C", config="english")
+                + SearchVector(
+                    Cast("specifications", TextField()), weight="D", config="english"
+                )
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_category_path'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(build_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:50
+
+import json
+from collections import Counter
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_facets(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    SpecificationFacet = apps.get_model("products", "SpecificationFacet")
+    counts = Counter()
+    rows = (
+        Product.objects.filter(is_active=True)
+        .values_list("category_id", "specifications")
+        .iterator(chunk_size=2000)
+    )
+    for category_id, specifications in rows:
+        if not isinstance(specifications, dict):
+            continue
+        pairs = set()
+        for key, value in specifications.items():
+            for item in value if isinstance(value, list) else [value]:
+                if item is None or isinstance(item, (dict, list)):
+                    continue
+                text = item if isinstance(item, str) else json.dumps(item)
+                if len(key) <= 100 and len(text) <= 255:
+                    pairs.add((key, text))
+        counts.update((category_id, key, text) for key, text in pairs)
+
+    SpecificationFacet.objects.bulk_create(
+        (
+            SpecificationFacet(
+                category_id=category_id, key=key, value=value, product_count=count
+            )
+            for (category_id, key, value), count in counts.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpecificationFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('product_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['specifications'], name='product_specs_gin_idx', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddField(
+            model_name='specificationfacet',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='specification_facets', to='products.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='specificationfacet',
+            constraint=models.UniqueConstraint(fields=('category', 'key', 'value'), name='unique_category_facet_value'),
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_version_stamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('format', models.CharField(max_length=10)),
+                ('file', models.CharField(max_length=255)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(blank=True, upload_to='products/originals/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='productimage_unprocessed_idx'),
+        ),
+        migrations.AddField(
+            model_name='productimagevariant',
+            name='image',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='products.productimage'),
+        ),
+        migrations.AddConstraint(
+            model_name='productimagevariant',
+            constraint=models.UniqueConstraint(fields=('image', 'name', 'format'), name='unique_image_variant'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(discount_price__isnull=False, discount_price__lt=models.F('price'), then=models.F('discount_price')), default=models.F('price')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_price_id_idx'),
+        ),
+    ]
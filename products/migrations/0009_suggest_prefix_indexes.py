@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:10
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='product_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('sku'), name='text_pattern_ops'), name='product_sku_prefix_idx'),
+        ),
+    ]
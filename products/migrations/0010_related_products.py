@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:12
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_watermark(apps, schema_editor):
+    apps.get_model("products", "CoPurchaseWatermark").objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_suggest_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchaseWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('order_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RelatedProducts',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='related', serialize=False, to='products.product')),
+                ('product_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('scores', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), default=list, size=None)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Related products',
+            },
+        ),
+        migrations.CreateModel(
+            name='CoPurchaseCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'other'), name='unique_copurchase_pair')],
+            },
+        ),
+        migrations.RunPython(create_watermark, migrations.RunPython.noop),
+    ]
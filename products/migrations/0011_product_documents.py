@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_dirty_documents(apps, schema_editor):
+    # Every product starts stale; rebuild_product_documents (or the periodic
+    # task) fills them in. Until then details are rendered live.
+    Product = apps.get_model("products", "Product")
+    ProductDocument = apps.get_model("products", "ProductDocument")
+    ProductDocument.objects.bulk_create(
+        (
+            ProductDocument(product_id=pk, dirty_since=django.utils.timezone.now())
+            for pk in Product.objects.values_list("pk", flat=True).iterator()
+        ),
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_related_products'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='productimage',
+            options={'ordering': ['position', 'is_main', 'id']},
+        ),
+        migrations.CreateModel(
+            name='ProductDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='products.product')),
+                ('data', models.TextField(blank=True, null=True)),
+                ('dirty_since', models.DateTimeField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('dirty_since__isnull', False)), fields=['dirty_since'], name='productdocument_dirty_idx')],
+            },
+        ),
+        migrations.RunPython(create_dirty_documents, migrations.RunPython.noop),
+    ]
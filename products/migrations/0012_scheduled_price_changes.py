@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledPriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('filters', models.JSONField(default=dict)),
+                ('field', models.CharField(choices=[('price', 'Price'), ('discount_price', 'Discount price')], max_length=20)),
+                ('operation', models.CharField(choices=[('set', 'Set'), ('adjust', 'Adjust by percent'), ('clear', 'Clear (discount_price only)')], max_length=10)),
+                ('value', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('ended', 'Ended'), ('cancelled', 'Cancelled')], default='scheduled', max_length=10)),
+                ('applied_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('reverted_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('products_changed', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'starts_at'], name='pricechange_status_start_idx'), models.Index(fields=['status', 'ends_at'], name='pricechange_status_end_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduledPriceChangeItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('previous_discount_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('applied_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('applied_discount_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('change', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='products.scheduledpricechange')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('change', 'product'), name='unique_price_change_product')],
+            },
+        ),
+    ]
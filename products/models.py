@@ -1,9 +1,14 @@
 from django.db import models
-from django.core.exceptions import ValidationError
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.conf import settings
-from django.db.models import Sum
+from django.core.files.storage import default_storage
+from django.db.models.functions import Upper
+from .slugs import UniqueSlugMixin
 
-class Category(models.Model):
+class Category(UniqueSlugMixin, models.Model):
     parent_category = models.ForeignKey(
         "self",
         on_delete=models.SET_NULL,
@@ -16,15 +21,39 @@ class Category(models.Model):
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Materialized path of ids from the root down to this node ("1/4/9/").
+    # Maintained by products.signals, so a whole subtree is one prefix query.
+    path = models.CharField(max_length=255, blank=True, default="", editable=False)
 
     class Meta:
         verbose_name_plural = "Categories"
+        indexes = [
+            models.Index(
+                fields=["path"],
+                name="category_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            # Keyset pagination key for the root listing.
+            models.Index(fields=["name", "id"], name="category_name_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_category_id:
+            parent_path = self.parent_category.path
+            if self.parent_category_id == self.pk or (
+                self.path and parent_path.startswith(self.path)
+            ):
+                raise ValidationError(
+                    "A category can't be moved under itself or one of its subcategories."
+                )
+
 
-class Product(models.Model):
+class Product(UniqueSlugMixin, models.Model):
     category = models.ForeignKey(
         Category, on_delete=models.PROTECT, related_name="products"
     )  
@@ -37,18 +66,67 @@ class Product(models.Model):
     discount_price = models.DecimalField(
         max_digits=10, decimal_places=2, null=True, blank=True
     )
+    # What the customer pays (the discount when it is lower than the price),
+    # stored by Postgres so price filters and ?ordering=price use an index.
+    effective_price = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                discount_price__isnull=False,
+                discount_price__lt=models.F("price"),
+                then=models.F("discount_price"),
+            ),
+            default=models.F("price"),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     currency = models.CharField(max_length=3, default="ETB")
     specifications = models.JSONField(default=dict)
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed: MAX(updated_at) is the version stamp of product lists.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Weighted search document (name/SKU, category, description, specs).
+    # Maintained by products.signals, never written by the API.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination key ("-created_at", "-id").
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            # Price range filters and ?ordering=price / -price.
+            models.Index(fields=["effective_price", "id"], name="product_price_id_idx"),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            # Backs the typo-tolerant fallback (name % 'term').
+            GinIndex(
+                fields=["name"],
+                name="product_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            # Prefix scans of the database suggest backend (istartswith).
+            models.Index(
+                OpClass(Upper("name"), name="text_pattern_ops"),
+                name="product_name_prefix_idx",
+            ),
+            models.Index(
+                OpClass(Upper("sku"), name="text_pattern_ops"),
+                name="product_sku_prefix_idx",
+            ),
+            # Backs ?spec= filters (specifications @> '{"key": "value"}').
+            GinIndex(
+                fields=["specifications"],
+                name="product_specs_gin_idx",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
     @property
     def final_price(self):
+        # Same rule as effective_price, for instances not yet saved.
         if self.discount_price is not None and self.discount_price < self.price:
             return self.discount_price
         return self.price
@@ -66,7 +144,15 @@ class Product(models.Model):
 
     @property
     def total_quantity(self):
-        return self.inventory_items.aggregate(total=Sum("quantity"))["total"] or 0
+        # Use the annotation from products.services.with_stock_totals when present.
+        stock_total = getattr(self, "stock_total", None)
+        if stock_total is not None:
+            return stock_total
+        # inventory.ProductStock, kept current by database triggers.
+        try:
+            return self.stock_summary.on_hand
+        except ObjectDoesNotExist:
+            return 0
 
 
 class ProductImage(models.Model):
@@ -74,10 +160,237 @@ class ProductImage(models.Model):
         Product, on_delete=models.CASCADE, related_name="images"
     )
     image_url = models.CharField(max_length=255)
+    # Optional uploaded original; image_url then points at it.
+    image = models.ImageField(upload_to="products/originals/%Y/%m/", blank=True)
     alt_text = models.CharField(max_length=255, blank=True)
     is_main = models.BooleanField(default=False)
     position = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set once products.images has generated the variants of the current
+    # original; NULL rows are picked up by the backfill.
+    processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ["position", "is_main", "id"]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="productimage_unprocessed_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.image and self.image_url != self.image.url:
+            self.image_url = self.image.url
+            type(self).objects.filter(pk=self.pk).update(image_url=self.image_url)
+
+
+class ProductImageVariant(models.Model):
+    """A resized copy of a ProductImage, stored under a content-hashed name."""
+
+    image = models.ForeignKey(
+        ProductImage, on_delete=models.CASCADE, related_name="variants"
+    )
+    name = models.CharField(max_length=20)  # thumb / card / zoom
+    format = models.CharField(max_length=10)  # webp / jpeg
+    file = models.CharField(max_length=255)  # storage name
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["position", "is_main"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["image", "name", "format"], name="unique_image_variant"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.image_id} {self.name}.{self.format} ({self.width}x{self.height})"
+
+    @property
+    def url(self):
+        return default_storage.url(self.file)
+
+
+class SpecificationFacet(models.Model):
+    """
+    Precomputed count of active products per (category, spec key, spec value).
+    Maintained incrementally by products.signals; rebuild_facet_counts repairs it.
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="specification_facets"
+    )
+    key = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+    product_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "key", "value"], name="unique_category_facet_value"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.category} / {self.key}={self.value} ({self.product_count})"
+
+
+class ProductDocument(models.Model):
+    """
+    Precomputed detail payload of one product (products.documents). Stock
+    totals are added at read time; rows with ``dirty_since`` set are waiting
+    for a rebuild and aren't served.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="document"
+    )
+    # JSON text rather than jsonb, which would reorder the keys.
+    data = models.TextField(null=True, blank=True)
+    dirty_since = models.DateTimeField(null=True, blank=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["dirty_since"],
+                name="productdocument_dirty_idx",
+                condition=models.Q(dirty_since__isnull=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ({'dirty' if self.dirty_since else 'clean'})"
+
+
+class CoPurchaseCount(models.Model):
+    """
+    Number of completed orders containing both ``product`` and ``other``.
+    Stored in both directions; accumulated by products.recommendations.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "other"], name="unique_copurchase_pair"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.count}"
+
+
+class RelatedProducts(models.Model):
+    """
+    Top co-purchased products of one product, best first: one row per
+    product, read with a primary key lookup.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="related"
+    )
+    product_ids = ArrayField(models.BigIntegerField(), default=list)
+    scores = ArrayField(models.PositiveIntegerField(), default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Related products"
+
+    def __str__(self):
+        return f"{self.product_id}: {self.product_ids}"
+
+
+class CoPurchaseWatermark(models.Model):
+    """
+    Single row: the (completed_at, id) of the last order folded into the
+    co-purchase counts, so each run only reads orders completed since.
+    """
+
+    completed_at = models.DateTimeField(null=True, blank=True)
+    order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.completed_at} / {self.order_id}"
+
+
+class PriceOperation(models.TextChoices):
+    SET = "set", "Set"
+    ADJUST = "adjust", "Adjust by percent"
+    CLEAR = "clear", "Clear (discount_price only)"
+
+
+class ScheduledPriceChange(models.Model):
+    """
+    A bulk price change (products.pricing) applied at ``starts_at`` and
+    reverted at ``ends_at`` by a beat task. ``filters`` selects the products
+    like the bulk pricing endpoint does.
+    """
+
+    class Status(models.TextChoices):
+        SCHEDULED = "scheduled", "Scheduled"
+        ACTIVE = "active", "Active"
+        ENDED = "ended", "Ended"
+        CANCELLED = "cancelled", "Cancelled"
+
+    name = models.CharField(max_length=255)
+    filters = models.JSONField(default=dict)
+    field = models.CharField(
+        max_length=20,
+        choices=[("price", "Price"), ("discount_price", "Discount price")],
+    )
+    operation = models.CharField(max_length=10, choices=PriceOperation.choices)
+    # The new price for SET, a percentage (-20 = 20% off) for ADJUST.
+    value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.SCHEDULED
+    )
+    applied_at = models.DateTimeField(null=True, blank=True, editable=False)
+    reverted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    products_changed = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "starts_at"], name="pricechange_status_start_idx"),
+            models.Index(fields=["status", "ends_at"], name="pricechange_status_end_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class ScheduledPriceChangeItem(models.Model):
+    """The prices a scheduled change replaced on one product, and what it wrote."""
+
+    change = models.ForeignKey(
+        ScheduledPriceChange, on_delete=models.CASCADE, related_name="items"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2)
+    previous_discount_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True
+    )
+    applied_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    applied_discount_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["change", "product"], name="unique_price_change_product"
+            )
+        ]
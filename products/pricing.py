@@ -0,0 +1,313 @@
+# products/pricing.py
+"""
+Bulk price changes as set-based UPDATEs.
+
+Products are picked by filters (category subtree, SKUs, specifications)
+and repriced one chunk of ids at a time: the chunk's eligible rows are
+locked and read with one SELECT and changed with one UPDATE. No model
+signals fire. The cache and the detail documents are invalidated once per
+chunk.
+
+A row is skipped, never clamped, when the new value would break the price
+rules (negative, too large, or a discount above the price).
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from products import cache as catalog_cache
+from products.documents import mark_stale
+from products.models import (
+    PriceOperation,
+    Product,
+    ScheduledPriceChange,
+    ScheduledPriceChangeItem,
+)
+from products.services import category_descendant_ids, filter_by_specifications
+
+PRICE_FIELDS = ("price", "discount_price")
+CHUNK_SIZE = 1000
+# Largest value of a DecimalField(max_digits=10, decimal_places=2).
+MAX_PRICE = Decimal("99999999.99")
+
+
+def validate_operation(field, operation, value):
+    """Raises ValueError for combinations the pricing rules don't allow."""
+    if field not in PRICE_FIELDS:
+        raise ValueError(f"'field' must be one of: {', '.join(PRICE_FIELDS)}.")
+    if operation == PriceOperation.CLEAR:
+        if field != "discount_price":
+            raise ValueError("Only discount_price can be cleared.")
+        return
+    if value is None:
+        raise ValueError(f"'value' is required for '{operation}'.")
+    if operation == PriceOperation.SET and value < 0:
+        raise ValueError("Prices can't be negative.")
+    if operation == PriceOperation.ADJUST and value <= -100:
+        raise ValueError("A percentage adjustment must be above -100.")
+
+
+def select_products(filters):
+    """
+    Products matching ``filters``: ``category`` (slug, with its subtree
+    unless ``include_descendants`` is false), ``skus`` and ``spec``
+    ("key:value" strings, as in ?spec=). All given filters must match.
+    """
+    queryset = Product.objects.all()
+    category = filters.get("category")
+    if category:
+        if filters.get("include_descendants", True):
+            queryset = queryset.filter(category_id__in=category_descendant_ids(category))
+        else:
+            queryset = queryset.filter(category__slug=category)
+    if filters.get("skus"):
+        queryset = queryset.filter(sku__in=filters["skus"])
+    if filters.get("spec"):
+        wanted = {}
+        for spec in filters["spec"]:
+            key, _, value = spec.partition(":")
+            wanted.setdefault(key, []).append(value)
+        queryset = filter_by_specifications(queryset, wanted)
+    return queryset
+
+
+def _new_value(field, operation, value):
+    money = DecimalField(max_digits=10, decimal_places=2)
+    if operation == PriceOperation.CLEAR:
+        return Value(None, output_field=money)
+    if operation == PriceOperation.SET:
+        return Value(value, output_field=money)
+    # ADJUST: a discount without one yet starts from the price, so
+    # "discount_price -20%" puts everything 20% off.
+    base = F("price") if field == "price" else Coalesce(F("discount_price"), F("price"))
+    factor = Value(1 + Decimal(value) / 100, output_field=money)
+    return Round(ExpressionWrapper(base * factor, output_field=money), 2)
+
+
+def _allowed(field, operation):
+    if operation == PriceOperation.CLEAR:
+        return Q()
+    if field == "price":
+        return (
+            Q(new_value__gte=0, new_value__lte=MAX_PRICE)
+            & (Q(discount_price__isnull=True) | Q(discount_price__lte=F("new_value")))
+        )
+    return Q(new_value__gte=0, new_value__lte=F("price"))
+
+
+def _change_chunk(ids, field, operation, value, now):
+    """
+    Reprices the eligible products among ``ids``. Returns their
+    ``(pk, price, discount_price)`` from before the change.
+    """
+    new_value = _new_value(field, operation, value)
+    rows = list(
+        Product.objects.filter(pk__in=ids)
+        .alias(new_value=new_value)
+        .filter(_allowed(field, operation))
+        .order_by("pk")
+        .select_for_update()
+        .values_list("pk", "price", "discount_price")
+    )
+    if rows:
+        Product.objects.filter(pk__in=[row[0] for row in rows]).update(
+            **{field: new_value, "updated_at": now}
+        )
+    return rows
+
+
+def _chunks(queryset, chunk_size):
+    last_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        last_pk = ids[-1]
+        yield ids
+
+
+def _invalidate(product_ids):
+    catalog_cache.invalidate_products(product_ids)
+    mark_stale(product_ids=product_ids)
+
+
+def bulk_update_prices(filters, field, operation, value=None, chunk_size=CHUNK_SIZE):
+    """
+    Applies the change to every product matching ``filters``, one
+    transaction per chunk. Returns ``{"matched", "updated", "skipped"}``.
+    """
+    validate_operation(field, operation, value)
+    matched = updated = 0
+    now = timezone.now()
+    for ids in _chunks(select_products(filters), chunk_size):
+        with transaction.atomic():
+            rows = _change_chunk(ids, field, operation, value, now)
+            if rows:
+                _invalidate([row[0] for row in rows])
+        matched += len(ids)
+        updated += len(rows)
+    return {"matched": matched, "updated": updated, "skipped": matched - updated}
+
+
+def apply_scheduled_change(change_id, chunk_size=CHUNK_SIZE):
+    """
+    Applies a SCHEDULED change in a single transaction, recording each
+    product's previous and new prices so the change can be reverted.
+    """
+    with transaction.atomic():
+        change = (
+            ScheduledPriceChange.objects.select_for_update()
+            .filter(pk=change_id, status=ScheduledPriceChange.Status.SCHEDULED)
+            .first()
+        )
+        if change is None:
+            return None
+        now = timezone.now()
+        if change.ends_at is not None and change.ends_at <= now:
+            # Its window passed before the task got to it.
+            change.status = ScheduledPriceChange.Status.ENDED
+            change.save(update_fields=["status"])
+            return change
+
+        changed = []
+        for ids in _chunks(select_products(change.filters), chunk_size):
+            rows = _change_chunk(ids, change.field, change.operation, change.value, now)
+            ScheduledPriceChangeItem.objects.bulk_create(
+                ScheduledPriceChangeItem(
+                    change=change,
+                    product_id=pk,
+                    previous_price=price,
+                    previous_discount_price=discount_price,
+                )
+                for pk, price, discount_price in rows
+            )
+            changed += [row[0] for row in rows]
+        _record_applied_prices(change.pk)
+
+        change.status = (
+            ScheduledPriceChange.Status.ACTIVE
+            if change.ends_at
+            else ScheduledPriceChange.Status.ENDED
+        )
+        change.applied_at = now
+        change.products_changed = len(changed)
+        change.save(update_fields=["status", "applied_at", "products_changed"])
+        if changed:
+            _invalidate(changed)
+    return change
+
+
+def _record_applied_prices(change_id):
+    items = connection.ops.quote_name(ScheduledPriceChangeItem._meta.db_table)
+    products = connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {items} i SET applied_price = p.price, "
+            f"applied_discount_price = p.discount_price "
+            f"FROM {products} p WHERE i.change_id = %s AND p.id = i.product_id",
+            [change_id],
+        )
+
+
+def revert_scheduled_change(change_id, status=ScheduledPriceChange.Status.ENDED):
+    """
+    Restores the prices an ACTIVE change replaced, in one UPDATE. Products
+    whose prices were edited since the change was applied keep the edit.
+
+    Changes can overlap. Where another active change was applied on top of
+    this one, the product keeps that change's price for now and the prices
+    this one replaced are handed to it, so reverting it later restores them
+    (A: 100 -> 80, B: 80 -> 70; A ends at 70, B ends at 100).
+    """
+    items = connection.ops.quote_name(ScheduledPriceChangeItem._meta.db_table)
+    products = connection.ops.quote_name(Product._meta.db_table)
+    changes = connection.ops.quote_name(ScheduledPriceChange._meta.db_table)
+    with transaction.atomic():
+        change = (
+            ScheduledPriceChange.objects.select_for_update()
+            .filter(pk=change_id, status=ScheduledPriceChange.Status.ACTIVE)
+            .first()
+        )
+        if change is None:
+            return None
+        now = timezone.now()
+        # Reverts of overlapping changes touch the same rows; take them in
+        # one order so they queue instead of deadlocking.
+        list(
+            Product.objects.filter(
+                pk__in=ScheduledPriceChangeItem.objects.filter(change=change).values(
+                    "product_id"
+                )
+            )
+            .order_by("pk")
+            .select_for_update()
+            .values_list("pk", flat=True)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {items} n SET previous_price = i.previous_price, "
+                f"previous_discount_price = i.previous_discount_price "
+                f"FROM {items} i, {products} p, {changes} c "
+                f"WHERE i.change_id = %s AND p.id = i.product_id "
+                f"AND (p.price <> i.applied_price "
+                f"OR p.discount_price IS DISTINCT FROM i.applied_discount_price) "
+                f"AND n.product_id = i.product_id AND n.change_id = c.id "
+                f"AND c.id <> i.change_id AND c.status = %s AND c.applied_at >= %s "
+                f"AND n.previous_price = i.applied_price "
+                f"AND n.previous_discount_price IS NOT DISTINCT FROM i.applied_discount_price",
+                [change.pk, ScheduledPriceChange.Status.ACTIVE, change.applied_at],
+            )
+            cursor.execute(
+                f"UPDATE {products} p SET price = i.previous_price, "
+                f"discount_price = i.previous_discount_price, updated_at = %s "
+                f"FROM {items} i WHERE i.change_id = %s AND p.id = i.product_id "
+                f"AND p.price = i.applied_price "
+                f"AND p.discount_price IS NOT DISTINCT FROM i.applied_discount_price "
+                f"RETURNING p.id",
+                [now, change.pk],
+            )
+            reverted = [row[0] for row in cursor.fetchall()]
+        change.status = status
+        change.reverted_at = now
+        change.save(update_fields=["status", "reverted_at"])
+        if reverted:
+            _invalidate(reverted)
+    return change
+
+
+def cancel_scheduled_change(change_id):
+    """Cancels a change that hasn't started, or reverts one that's running."""
+    cancelled = ScheduledPriceChange.objects.filter(
+        pk=change_id, status=ScheduledPriceChange.Status.SCHEDULED
+    ).update(status=ScheduledPriceChange.Status.CANCELLED)
+    if not cancelled:
+        revert_scheduled_change(change_id, status=ScheduledPriceChange.Status.CANCELLED)
+    return ScheduledPriceChange.objects.get(pk=change_id)
+
+
+def run_due_price_changes():
+    """
+    Reverts the changes whose end has passed, then applies those whose
+    start has. Returns ``(applied, reverted)``.
+    """
+    now = timezone.now()
+    ending = ScheduledPriceChange.objects.filter(
+        status=ScheduledPriceChange.Status.ACTIVE, ends_at__lte=now
+    ).order_by("ends_at", "id")
+    reverted = sum(
+        1 for pk in ending.values_list("pk", flat=True) if revert_scheduled_change(pk)
+    )
+    starting = ScheduledPriceChange.objects.filter(
+        status=ScheduledPriceChange.Status.SCHEDULED, starts_at__lte=now
+    ).order_by("starts_at", "id")
+    applied = sum(
+        1 for pk in starting.values_list("pk", flat=True) if apply_scheduled_change(pk)
+    )
+    return applied, reverted
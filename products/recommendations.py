@@ -0,0 +1,142 @@
+# products/recommendations.py
+"""
+"Frequently bought together", computed in batch from completed orders.
+
+Each run folds the orders completed since the watermark into
+CoPurchaseCount, one set-based statement per batch of orders (the order
+items are self-joined and grouped into pair counts inside Postgres), then
+rewrites the top-K row of RelatedProducts for the products those orders
+touched. The pair table is sparse: only pairs that were actually bought
+together have a row.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, OrderStatus
+from products import cache as catalog_cache
+from products.models import CoPurchaseCount, CoPurchaseWatermark, RelatedProducts
+
+TOP_K = 20
+BATCH_SIZE = 1000
+# Orders completed this recently are left for the next run, so a
+# transaction that commits late can't slip in behind the watermark.
+SAFETY_LAG = timedelta(minutes=5)
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def update_co_purchases(batch_size=BATCH_SIZE):
+    """
+    Processes every order completed since the last run (up to SAFETY_LAG
+    ago) and returns ``(orders, products)``: how many orders were folded
+    in and how many products got new recommendations.
+    """
+    orders = touched = 0
+    while True:
+        with transaction.atomic():
+            # Locks the watermark row: concurrent runs wait instead of
+            # counting the same orders twice.
+            watermark, _ = CoPurchaseWatermark.objects.select_for_update().get_or_create(pk=1)
+            batch = _next_batch(watermark, batch_size)
+            if not batch:
+                break
+            order_ids = [pk for pk, _ in batch]
+            product_ids = _add_pairs(order_ids)
+            _write_top_k(product_ids)
+            watermark.order_id, watermark.completed_at = batch[-1]
+            watermark.save()
+        orders += len(order_ids)
+        touched += len(product_ids)
+        if len(batch) < batch_size:
+            break
+
+    if touched:
+        catalog_cache.invalidate_related()
+    return orders, touched
+
+
+def _next_batch(watermark, batch_size):
+    completed = Order.objects.filter(
+        status=OrderStatus.COMPLETED,
+        completed_at__isnull=False,
+        completed_at__lte=timezone.now() - SAFETY_LAG,
+    )
+    if watermark.completed_at is not None:
+        completed = completed.filter(completed_at__gte=watermark.completed_at).exclude(
+            completed_at=watermark.completed_at, id__lte=watermark.order_id
+        )
+    return list(
+        completed.order_by("completed_at", "id").values_list("id", "completed_at")[
+            :batch_size
+        ]
+    )
+
+
+def _add_pairs(order_ids):
+    """Adds one to every (a, b) pair bought together; returns the products seen."""
+    items, pairs = _table(OrderItem), _table(CoPurchaseCount)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {pairs} (product_id, other_id, count)
+            SELECT a.product_id, b.product_id, COUNT(*)
+            FROM {items} a
+            JOIN {items} b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+            WHERE a.order_id = ANY(%s)
+            GROUP BY a.product_id, b.product_id
+            ON CONFLICT (product_id, other_id)
+            DO UPDATE SET count = {pairs}.count + EXCLUDED.count
+            """,
+            [order_ids],
+        )
+        cursor.execute(
+            f"SELECT DISTINCT product_id FROM {items} WHERE order_id = ANY(%s)",
+            [order_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _write_top_k(product_ids, top_k=TOP_K):
+    if not product_ids:
+        return
+    pairs, related = _table(CoPurchaseCount), _table(RelatedProducts)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {related} (product_id, product_ids, scores, updated_at)
+            SELECT product_id,
+                   (array_agg(other_id ORDER BY count DESC, other_id))[1:%s],
+                   (array_agg(count ORDER BY count DESC, other_id))[1:%s],
+                   %s
+            FROM {pairs}
+            WHERE product_id = ANY(%s)
+            GROUP BY product_id
+            ON CONFLICT (product_id) DO UPDATE
+            SET product_ids = EXCLUDED.product_ids,
+                scores = EXCLUDED.scores,
+                updated_at = EXCLUDED.updated_at
+            """,
+            [top_k, top_k, timezone.now(), list(product_ids)],
+        )
+
+
+def rebuild_co_purchases(batch_size=BATCH_SIZE):
+    """Drops all counts and recommendations and recomputes them from scratch."""
+    with transaction.atomic():
+        CoPurchaseWatermark.objects.select_for_update().get_or_create(pk=1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"TRUNCATE {_table(CoPurchaseCount)}, {_table(RelatedProducts)}"
+            )
+        CoPurchaseWatermark.objects.filter(pk=1).update(completed_at=None, order_id=0)
+    return update_co_purchases(batch_size)
+
+
+def related_product_ids(product_id, limit=TOP_K):
+    row = RelatedProducts.objects.filter(pk=product_id).values_list("product_ids", flat=True)
+    ids = row.first() or []
+    return ids[:limit]
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from .models import Category, Product, ProductImage
+from .models import Category, PriceOperation, Product, ProductImage, ScheduledPriceChange
+from .pricing import PRICE_FIELDS, validate_operation
+from .services import load_category_subtrees
 from inventory.serializers import InventoryItemSerializer
-from django.db.models import Sum
+from django.core.exceptions import ObjectDoesNotExist
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -26,28 +28,111 @@ class CategorySerializer(serializers.ModelSerializer):
         return self.context.get("depth", 0)
 
     def get_subcategories(self, obj):
-        if hasattr(obj, "subcategories"):
-            current_depth = self.context.get("depth", 0)
-            context = self.context.copy()
-            context["depth"] = current_depth + 1
+        # Prefer the children assembled in memory by products.services;
+        # falling back to the relation costs one query per node.
+        children = getattr(obj, "tree_children", None)
+        if children is None and hasattr(obj, "subcategories"):
+            children = obj.subcategories.all()
+        if children is None:
+            return []
 
-            return CategorySerializer(
-                obj.subcategories.all(), many=True, context=context
-            ).data
-        return []
+        current_depth = self.context.get("depth", 0)
+        context = self.context.copy()
+        context["depth"] = current_depth + 1
+
+        return type(self)(children, many=True, context=context).data
+
+    def validate_parent_category(self, value):
+        if value is not None and self.instance is not None:
+            if value.pk == self.instance.pk or (
+                self.instance.path and value.path.startswith(self.instance.path)
+            ):
+                raise serializers.ValidationError(
+                    "A category can't be moved under itself or one of its subcategories."
+                )
+        return value
+
+
+class CategoryTreeSerializer(CategorySerializer):
+    """
+    CategorySerializer plus product counts, used by the category endpoints.
+    The counts are set by products.services.attach_product_counts.
+    """
+
+    product_count = serializers.IntegerField(read_only=True)
+    total_product_count = serializers.IntegerField(read_only=True)
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + [
+            "product_count",
+            "total_product_count",
+        ]
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    image_url = serializers.CharField(max_length=255, required=False)
+    image = serializers.ImageField(write_only=True, required=False)
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
         fields = [
             "id",
+            "product",
             "image_url",
+            "image",
             "alt_text",
             "is_main",
             "position",
             "created_at",
+            "variants",
+            "srcset",
         ]
+        extra_kwargs = {"product": {"write_only": True}}
+
+    def validate(self, data):
+        creating = self.instance is None
+        if creating and not data.get("image") and not data.get("image_url"):
+            raise serializers.ValidationError("Upload an image or give its image_url.")
+        return data
+
+    def get_variants(self, obj):
+        """``{"thumb": {"webp": {"url", "width", "height"}, ...}, ...}``"""
+        variants = {}
+        for variant in self._variants(obj):
+            variants.setdefault(variant.name, {})[variant.format] = {
+                "url": self._absolute(variant.url),
+                "width": variant.width,
+                "height": variant.height,
+            }
+        return variants
+
+    def get_srcset(self, obj):
+        """One ready-made srcset string per format, smallest first."""
+        candidates = {}
+        for variant in sorted(self._variants(obj), key=lambda variant: variant.width):
+            candidates.setdefault(variant.format, []).append(
+                f"{self._absolute(variant.url)} {variant.width}w"
+            )
+        return {fmt: ", ".join(entries) for fmt, entries in candidates.items()}
+
+    def _variants(self, obj):
+        # Prefetched by ProductViewSet ("images__variants").
+        return obj.variants.all()
+
+    def _absolute(self, url):
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Load every nested category subtree for the page in one query.
+        products = list(data.all() if hasattr(data, "all") else data)
+        if "category" in self.child.fields:
+            load_category_subtrees([product.category for product in products])
+        return super().to_representation(products)
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -66,9 +151,13 @@ class ProductSerializer(serializers.ModelSerializer):
 
     inventory_items = InventoryItemSerializer(many=True, read_only=True)
     total_stock = serializers.SerializerMethodField()
+    available_stock = serializers.SerializerMethodField()
+    main_image = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
+        list_serializer_class = ProductListSerializer
         fields = [
             "id",
             "category",  # shows the rich object
@@ -87,10 +176,72 @@ class ProductSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
             "total_stock",
+            "available_stock",
             "initial_stock",
             "final_price",
             "images",
+            "main_image",
+            "rating",
+        ]
+        # The product card returned by list pages unless ?fields= says otherwise.
+        list_fields = [
+            "id",
+            "name",
+            "slug",
+            "sku",
+            "price",
+            "discount_price",
+            "final_price",
+            "currency",
+            "is_featured",
+            "total_stock",
+            "available_stock",
+            "main_image",
+            "rating",
         ]
+        # Heavy relations that ?expand= can add to either representation.
+        expandable_fields = ["category", "images", "inventory_items", "specifications"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldsets: ProductViewSet puts the requested names in the
+        # context; everything else is dropped before it's ever serialized.
+        requested = self.context.get("requested_fields")
+        if requested is not None:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    @classmethod
+    def resolve_fields(cls, fields, expand, lean):
+        """
+        The readable field names for a read: ``fields`` replaces the default
+        set (the card when ``lean``, everything otherwise), ``expand`` adds
+        relations to it. Raises ValidationError on unknown names.
+        """
+        readable = [
+            name for name, field in cls().fields.items() if not field.write_only
+        ]
+        unknown = set(fields) - set(readable)
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": f"Unknown field(s): {', '.join(sorted(unknown))}."}
+            )
+        unknown = set(expand) - set(cls.Meta.expandable_fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {"expand": f"Can't expand: {', '.join(sorted(unknown))}."}
+            )
+
+        if fields:
+            requested = set(fields)
+        else:
+            requested = set(cls.Meta.list_fields if lean else readable)
+        return requested | set(expand)
+
+    def to_representation(self, instance):
+        if "category" in self.fields and not hasattr(instance.category, "tree_children"):
+            load_category_subtrees([instance.category])
+        return super().to_representation(instance)
 
     def validate(self, data):
         price = data.get("price")
@@ -136,5 +287,131 @@ class ProductSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
     def get_total_stock(self, obj):
-        result = obj.inventory_items.aggregate(total=Sum("quantity"))
-        return result["total"] or 0
+        return obj.total_quantity
+
+    def get_available_stock(self, obj):
+        # ProductViewSet annotates this; other callers read inventory.ProductStock.
+        reserved = getattr(obj, "stock_reserved", None)
+        if reserved is None:
+            try:
+                reserved = obj.stock_summary.reserved
+            except ObjectDoesNotExist:
+                reserved = 0
+        return obj.total_quantity - reserved
+
+    def get_rating(self, obj):
+        # reviews.ProductRating, select_related by ProductViewSet.
+        try:
+            stats = obj.rating_stats
+        except ObjectDoesNotExist:
+            return {"average": None, "count": 0, "histogram": {}}
+        return {
+            "average": stats.average if stats.count else None,
+            "count": stats.count,
+            "histogram": stats.histogram,
+        }
+
+    def get_main_image(self, obj):
+        # Annotated by ProductViewSet; otherwise pick it from the images.
+        if hasattr(obj, "main_image_url"):
+            return obj.main_image_url
+        images = sorted(
+            obj.images.all(), key=lambda image: (not image.is_main, image.position)
+        )
+        return images[0].image_url if images else None
+
+
+class PriceFilterSerializer(serializers.Serializer):
+    """Which products a bulk or scheduled price change applies to."""
+
+    category = serializers.SlugField(required=False)
+    include_descendants = serializers.BooleanField(default=True)
+    skus = serializers.ListField(child=serializers.CharField(), required=False)
+    spec = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def validate_spec(self, value):
+        for spec in value:
+            key, separator, _ = spec.partition(":")
+            if not separator or not key:
+                raise serializers.ValidationError(f"Expected key:value, got '{spec}'.")
+        return value
+
+    def validate(self, attrs):
+        if not any(attrs.get(name) for name in ("category", "skus", "spec")):
+            # A change to the whole catalog has to be asked for explicitly.
+            raise serializers.ValidationError(
+                "Give at least one of category, skus or spec."
+            )
+        return attrs
+
+
+def _validate_price_operation(attrs):
+    try:
+        validate_operation(attrs["field"], attrs["operation"], attrs.get("value"))
+    except ValueError as exc:
+        raise serializers.ValidationError(str(exc))
+
+
+class BulkPriceSerializer(serializers.Serializer):
+    filters = PriceFilterSerializer()
+    field = serializers.ChoiceField(choices=PRICE_FIELDS)
+    operation = serializers.ChoiceField(choices=PriceOperation.choices)
+    # An amount for "set", a percentage for "adjust".
+    value = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, allow_null=True
+    )
+
+    def validate(self, attrs):
+        _validate_price_operation(attrs)
+        return attrs
+
+
+class ScheduledPriceChangeSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ScheduledPriceChange
+        fields = [
+            "id",
+            "name",
+            "filters",
+            "field",
+            "operation",
+            "value",
+            "starts_at",
+            "ends_at",
+            "status",
+            "applied_at",
+            "reverted_at",
+            "products_changed",
+            "created_at",
+        ]
+        read_only_fields = [
+            "status",
+            "applied_at",
+            "reverted_at",
+            "products_changed",
+            "created_at",
+        ]
+
+    def validate_filters(self, value):
+        filters = PriceFilterSerializer(data=value)
+        filters.is_valid(raise_exception=True)
+        return filters.validated_data
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            if self.instance.status != ScheduledPriceChange.Status.SCHEDULED:
+                raise serializers.ValidationError(
+                    "Only changes that haven't started can be edited."
+                )
+            attrs = {
+                **{
+                    name: getattr(self.instance, name)
+                    for name in ("filters", "field", "operation", "value", "starts_at", "ends_at")
+                },
+                **attrs,
+            }
+        _validate_price_operation(attrs)
+        if attrs.get("ends_at") and attrs["ends_at"] <= attrs["starts_at"]:
+            raise serializers.ValidationError({"ends_at": "Must be after starts_at."})
+        return attrs
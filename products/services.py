@@ -0,0 +1,506 @@
+# products/services.py
+import json
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.core.exceptions import EmptyResultSet
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    TextField,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Now
+from django.core.cache import cache
+
+from products import cache as catalog_cache
+from products.models import Category, Product, ProductImage, SpecificationFacet
+from inventory.models import InventoryItem, InventoryReservation, ProductStock
+
+
+def build_category_tree(categories):
+    """
+    Wires up ``tree_children`` on every category in memory.
+    Returns the nodes whose parent isn't part of ``categories`` (the roots).
+    """
+    nodes = {category.pk: category for category in categories}
+    for category in nodes.values():
+        category.tree_children = []
+
+    roots = []
+    for category in categories:
+        parent = nodes.get(category.parent_category_id)
+        if parent is None:
+            roots.append(category)
+        else:
+            parent.tree_children.append(category)
+    return roots
+
+
+def load_category_subtrees(categories):
+    """
+    Loads every descendant of ``categories`` with one path-prefix query and
+    attaches them as ``tree_children``, so serializing is query free.
+    """
+    categories = [category for category in categories if category is not None]
+    prefixes = sorted({category.path for category in categories if category.path})
+    if not prefixes:
+        for category in categories:
+            category.tree_children = []
+        return categories
+
+    # Skip prefixes already covered by an ancestor's prefix.
+    covering = []
+    for prefix in prefixes:
+        if not covering or not prefix.startswith(covering[-1]):
+            covering.append(prefix)
+
+    condition = reduce(or_, (Q(path__startswith=prefix) for prefix in covering))
+    nodes = {node.pk: node for node in Category.objects.filter(condition).order_by("name")}
+    build_category_tree(list(nodes.values()))
+
+    for category in categories:
+        node = nodes.get(category.pk)
+        category.tree_children = node.tree_children if node else []
+    return categories
+
+
+def category_descendant_ids(slug):
+    """
+    Ids of the category with ``slug`` and of every category below it (empty
+    if there's no such category). Cached until the next category change.
+    """
+    key = catalog_cache.subtree_key(slug)
+    ids = cache.get(key)
+    if ids is None:
+        category = Category.objects.filter(slug=slug).values_list("pk", "path").first()
+        if category is None:
+            ids = []
+        elif not category[1]:
+            ids = [category[0]]
+        else:
+            ids = list(
+                Category.objects.filter(path__startswith=category[1]).values_list(
+                    "pk", flat=True
+                )
+            )
+        cache.set(key, ids, timeout=catalog_cache.SUBTREE_TIMEOUT)
+    return ids
+
+
+def attach_product_counts(categories):
+    """
+    Sets ``product_count`` (active products directly in the node) and
+    ``total_product_count`` (including descendants) on ``categories`` and
+    their loaded ``tree_children``, with one grouped query.
+    """
+    nodes = []
+    pending = list(categories)
+    while pending:
+        node = pending.pop()
+        nodes.append(node)
+        pending.extend(getattr(node, "tree_children", []))
+
+    products = Product.objects.filter(
+        is_active=True, category_id__in={node.pk for node in nodes}
+    )
+    counts = dict(
+        products.order_by()
+        .values("category_id")
+        .annotate(count=Count("id"))
+        .values_list("category_id", "count")
+    )
+
+    def total(node):
+        node.product_count = counts.get(node.pk, 0)
+        node.total_product_count = node.product_count + sum(
+            total(child) for child in getattr(node, "tree_children", [])
+        )
+        return node.total_product_count
+
+    for category in categories:
+        total(category)
+    return categories
+
+
+def _latest(*timestamps):
+    return max((ts for ts in timestamps if ts is not None), default=None)
+
+
+def category_version_stamp():
+    """(last_modified, category count) of the category tree."""
+    stamp = Category.objects.aggregate(changed=Max("updated_at"), count=Count("id"))
+    return stamp["changed"], stamp["count"]
+
+
+def category_tree_version_stamp():
+    """
+    Version stamp of category responses, which include product counts:
+    product changes (deletes touch the category row) move it too.
+    """
+    categories_changed, category_count = category_version_stamp()
+    products_changed = Product.objects.aggregate(changed=Max("updated_at"))["changed"]
+    return (
+        _latest(categories_changed, products_changed),
+        categories_changed,
+        products_changed,
+        category_count,
+    )
+
+
+def catalog_version_stamp():
+    """
+    Version stamp of product collections from index-backed MAX() lookups.
+    Any product, stock, reservation or category change moves it; deletes
+    touch a parent row. Holds that expire move it too, since lists show
+    available stock.
+    """
+    products_changed = Product.objects.aggregate(changed=Max("updated_at"))["changed"]
+    stock_changed = InventoryItem.objects.aggregate(changed=Max("last_updated"))["changed"]
+    # The ProductStock triggers stamp every inventory and reservation write.
+    totals_changed = ProductStock.objects.aggregate(changed=Max("updated_at"))["changed"]
+    last_expiry = InventoryReservation.objects.filter(expires_at__lte=Now()).aggregate(
+        expired=Max("expires_at")
+    )["expired"]
+    categories_changed, category_count = category_version_stamp()
+    return (
+        _latest(
+            products_changed, stock_changed, totals_changed, last_expiry, categories_changed
+        ),
+        products_changed,
+        stock_changed,
+        totals_changed,
+        last_expiry,
+        categories_changed,
+        category_count,
+    )
+
+
+def product_version_stamp(pk):
+    """
+    Version stamp of one product's payload: its row, stock and live
+    reservations, plus the category tree it embeds. None if it doesn't exist.
+    """
+    try:
+        row = (
+            with_stock_totals(Product.objects.filter(pk=pk, is_active=True))
+            .annotate(
+                stock_changed=Subquery(
+                    InventoryItem.objects.filter(product=OuterRef("pk"))
+                    .order_by("-last_updated")
+                    .values("last_updated")[:1]
+                )
+            )
+            .values_list("updated_at", "stock_changed", "stock_total", "stock_reserved")
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+    if row is None:
+        return None
+
+    updated_at, stock_changed, stock_total, stock_reserved = row
+    categories_changed, category_count = category_version_stamp()
+    return (
+        _latest(updated_at, stock_changed, categories_changed),
+        pk,
+        stock_total,
+        stock_reserved,
+        category_count,
+    )
+
+
+def with_stock_totals(queryset):
+    """
+    Annotates physical stock (``stock_total``) and the quantity held by
+    live reservations (``stock_reserved``) from the inventory.ProductStock
+    row, a join on its primary key.
+    """
+    return queryset.annotate(
+        stock_total=Coalesce(F("stock_summary__on_hand"), 0),
+        stock_reserved=live_reserved(),
+    )
+
+
+def live_reserved(product_ref="pk", reserved="stock_summary__reserved"):
+    """
+    Units held by the unexpired reservations of the product ``product_ref``
+    points at: the ProductStock ``reserved`` total, less holds that expired
+    but aren't deleted yet. That SUM walks the (expires_at, product) index
+    over the expired backlog only, and is skipped when nothing is reserved.
+    """
+    expired = Subquery(
+        InventoryReservation.objects.filter(
+            product_id=OuterRef(product_ref), expires_at__lte=Now()
+        )
+        .order_by()
+        .values("product_id")
+        .annotate(units=Sum("quantity"))
+        .values("units"),
+        output_field=BigIntegerField(),
+    )
+    return Case(
+        When(**{f"{reserved}__gt": 0}, then=F(reserved) - Coalesce(expired, 0)),
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
+
+
+def main_image_url():
+    """URL of the image a product card shows: the main one, else the first."""
+    return Subquery(
+        ProductImage.objects.filter(product=OuterRef("pk"))
+        .order_by("-is_main", "position", "id")
+        .values("image_url")[:1]
+    )
+
+
+SEARCH_CONFIG = "english"
+
+
+def product_search_vector(category_name):
+    """
+    The weighted search document for a product. The category name is passed
+    in as a value because UPDATE statements can't reference joined columns.
+    """
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("sku", weight="A", config="simple")
+        + SearchVector(Value(category_name or ""), weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+        + SearchVector(
+            Cast("specifications", TextField()), weight="D", config=SEARCH_CONFIG
+        )
+    )
+
+
+def refresh_search_vectors(category, product_ids=None):
+    """
+    Rebuilds the search document of the products in ``category`` (optionally
+    only ``product_ids``) with a single UPDATE. Doesn't touch ``updated_at``.
+    """
+    products = Product.objects.filter(category=category)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products.update(search_vector=product_search_vector(category.name))
+
+
+def search_products(queryset, term):
+    """
+    Full-text search ranked by relevance. Callers fall back to
+    similar_products() when it matches nothing.
+    """
+    query = SearchQuery(term, search_type="websearch", config=SEARCH_CONFIG)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(search_rank=SearchRank(F("search_vector"), query))
+        .order_by("-search_rank", "-id")
+    )
+
+
+def similar_products(queryset, term):
+    """Trigram similarity on the name, so typos still find something."""
+    return (
+        queryset.filter(name__trigram_similar=term)
+        .annotate(search_rank=TrigramSimilarity("name", term))
+        .order_by("-search_rank", "-id")
+    )
+
+
+FACET_VALUE_LIMIT = 50
+
+
+def specification_facet_pairs(specifications):
+    """
+    The (key, value) pairs of a specifications dict that can be faceted on.
+    Scalars count once, lists count once per element, nested objects are skipped.
+    Non-string values are stored as their JSON text ("16", "true").
+    """
+    if not isinstance(specifications, dict):
+        return set()
+
+    pairs = set()
+    for key, value in specifications.items():
+        for item in value if isinstance(value, list) else [value]:
+            if item is None or isinstance(item, (dict, list)):
+                continue
+            text = item if isinstance(item, str) else json.dumps(item)
+            if len(key) <= 100 and len(text) <= 255:
+                pairs.add((key, text))
+    return pairs
+
+
+def facet_deltas(category_id, specifications, is_active, sign=1):
+    if not is_active or category_id is None:
+        return Counter()
+    return Counter(
+        {
+            (category_id, key, value): sign
+            for key, value in specification_facet_pairs(specifications)
+        }
+    )
+
+
+def apply_facet_deltas(deltas):
+    """
+    Applies ``{(category_id, key, value): delta}`` to the facet table with
+    F() updates, in a fixed order so concurrent writers don't deadlock.
+    """
+    for (category_id, key, value), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        facets = SpecificationFacet.objects.filter(
+            category_id=category_id, key=key, value=value
+        )
+        if facets.update(product_count=F("product_count") + delta) or delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                SpecificationFacet.objects.create(
+                    category_id=category_id, key=key, value=value, product_count=delta
+                )
+        except IntegrityError:
+            # Another writer created the row first.
+            facets.update(product_count=F("product_count") + delta)
+
+
+def rebuild_facet_counts(category_ids=None):
+    """
+    Recomputes the facet table from scratch (or for ``category_ids`` only).
+    Streams products so memory stays flat on large catalogs.
+    """
+    products = Product.objects.filter(is_active=True)
+    facets = SpecificationFacet.objects.all()
+    if category_ids is not None:
+        products = products.filter(category_id__in=category_ids)
+        facets = facets.filter(category_id__in=category_ids)
+
+    counts = Counter()
+    rows = products.values_list("category_id", "specifications").iterator(chunk_size=2000)
+    for category_id, specifications in rows:
+        counts.update(facet_deltas(category_id, specifications, True))
+
+    with transaction.atomic():
+        facets.delete()
+        SpecificationFacet.objects.bulk_create(
+            (
+                SpecificationFacet(
+                    category_id=category_id, key=key, value=value, product_count=count
+                )
+                for (category_id, key, value), count in counts.items()
+            ),
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+def facet_counts(category_ids=None):
+    """
+    Per-key value counts read from the facet table, most common first:
+    ``{"color": [{"value": "red", "count": 12}, ...]}``. The table counts
+    whole categories; see filtered_facet_counts() for narrower results.
+    """
+    facets = SpecificationFacet.objects.filter(product_count__gt=0)
+    if category_ids is not None:
+        facets = facets.filter(category_id__in=category_ids)
+
+    rows = (
+        facets.values("key", "value")
+        .annotate(count=Sum("product_count"))
+        .order_by("key", "-count", "value")
+        .values_list("key", "value", "count")
+    )
+    return _group_facet_rows(rows)
+
+
+def _group_facet_rows(rows):
+    result = {}
+    for key, value, count in rows:
+        values = result.setdefault(key, [])
+        if len(values) < FACET_VALUE_LIMIT:
+            values.append({"value": value, "count": count})
+    return result
+
+
+def filtered_facet_counts(queryset):
+    """
+    facet_counts() over the products of ``queryset``, counted in one
+    grouped query, for when filters (specs, price, search) narrow the
+    results below what the per-category facet table describes. Values are
+    paired as specification_facet_pairs() pairs them.
+    """
+    try:
+        products, params = queryset.order_by().values("pk").query.sql_with_params()
+    except EmptyResultSet:
+        # Filters that can't match anything (e.g. an unknown category).
+        return {}
+    table = connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT spec.key, item.value, COUNT(DISTINCT p.id) AS count
+            FROM {table} p
+            CROSS JOIN LATERAL jsonb_each(
+                CASE WHEN jsonb_typeof(p.specifications) = 'object'
+                     THEN p.specifications ELSE '{{}}'::jsonb END
+            ) AS spec
+            CROSS JOIN LATERAL (
+                SELECT CASE WHEN jsonb_typeof(element) = 'string'
+                            THEN element #>> '{{}}' ELSE element::text END AS value
+                FROM jsonb_array_elements(
+                    CASE WHEN jsonb_typeof(spec.value) = 'array'
+                         THEN spec.value ELSE jsonb_build_array(spec.value) END
+                ) AS element
+                WHERE jsonb_typeof(element) NOT IN ('object', 'array', 'null')
+            ) AS item
+            WHERE p.id IN ({products})
+              AND length(spec.key) <= 100 AND length(item.value) <= 255
+            GROUP BY spec.key, item.value
+            ORDER BY spec.key, count DESC, item.value
+            """,
+            params,
+        )
+        return _group_facet_rows(cursor.fetchall())
+
+
+def _spec_candidates(raw):
+    # "16" should match both {"ram": "16"} and {"ram": 16}.
+    candidates = [raw]
+    try:
+        parsed = json.loads(raw)
+    except ValueError:
+        return candidates
+    if parsed is not None and not isinstance(parsed, (dict, list, str)):
+        candidates.append(parsed)
+    return candidates
+
+
+def filter_by_specifications(queryset, wanted):
+    """
+    ``wanted`` maps a spec key to accepted values. Values of one key are OR'ed,
+    keys are AND'ed. Every term is a GIN-indexable containment lookup.
+    """
+    for key, values in wanted.items():
+        condition = Q()
+        for value in values:
+            for candidate in _spec_candidates(value):
+                condition |= Q(specifications__contains={key: candidate})
+                condition |= Q(specifications__contains={key: [candidate]})
+        queryset = queryset.filter(condition)
+    return queryset
@@ -1,35 +1,263 @@
-from django.db.models.signals import pre_save, post_save
+import logging
+
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from django.utils.text import slugify
-from .models import Category, Product
+from django.utils import timezone
+from .models import Category, Product, ProductImage
+from . import cache as catalog_cache
+from .documents import create_documents, mark_stale
+from .images import delete_files
+from .slugs import allocate_slug
+from .suggest import get_suggest_index
+from .services import apply_facet_deltas, facet_deltas, refresh_search_vectors
+from .tasks import process_product_image
 from inventory.models import InventoryItem
 
-def create_unique_slug(instance, new_slug=None):
-    """
-    Recursive function to check for slug uniqueness.
-    If 'gaming-laptops' exists, it tries 'gaming-laptops-1', then 'gaming-laptops-2', etc.
-    """
-    slug = new_slug or slugify(instance.name)
-    model_class = instance.__class__
-    
-    qs = model_class.objects.filter(slug=slug).exclude(id=instance.id)
-    
-    if qs.exists():
-        # Conflict found: append a random string or increment number
-        new_slug = f"{slug}-{qs.count() + 1}"
-        return create_unique_slug(instance, new_slug=new_slug)
-    
-    return slug
+logger = logging.getLogger(__name__)
+
+SEARCHABLE_PRODUCT_FIELDS = {"name", "sku", "description", "specifications", "category"}
 
 @receiver(pre_save, sender=Category)
 @receiver(pre_save, sender=Product)
 def generate_slug_on_save(sender, instance, *args, **kwargs):
     if not instance.slug:
-        instance.slug = create_unique_slug(instance)
+        instance.slug = allocate_slug(instance, instance.name)
+
+
+@receiver(post_save, sender=Category)
+def sync_category_path(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keeps the materialized path of the category and its whole subtree in sync.
+    A move rewrites every descendant's path prefix with a single UPDATE.
+    """
+    if update_fields is not None and "parent_category" not in update_fields:
+        return
+
+    old_path = (
+        Category.objects.filter(pk=instance.pk).values_list("path", flat=True).first()
+        or ""
+    )
+    parent_path = ""
+    if instance.parent_category_id:
+        parent_path = (
+            Category.objects.filter(pk=instance.parent_category_id)
+            .values_list("path", flat=True)
+            .first()
+            or ""
+        )
+    new_path = f"{parent_path}{instance.pk}/"
+
+    if new_path == old_path:
+        return
+
+    if old_path:
+        Category.objects.filter(path__startswith=old_path).update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1))
+        )
+    else:
+        Category.objects.filter(pk=instance.pk).update(path=new_path)
+    instance.path = new_path
+
+
+@receiver(post_delete, sender=Category)
+def detach_category_subtree(sender, instance, **kwargs):
+    # The FK is SET_NULL, so the children become roots; strip the deleted prefix.
+    if instance.path:
+        Category.objects.filter(path__startswith=instance.path).update(
+            path=Substr("path", len(instance.path) + 1)
+        )
 
 
 @receiver(post_save, sender=Product)
 def create_product_inventory(sender, instance, created, **kwargs):
     if created:
         stock_value = getattr(instance, "_initial_stock", 0)
-        InventoryItem.objects.create(product=instance, quantity=stock_value)
\ No newline at end of file
+        InventoryItem.objects.create(product=instance, quantity=stock_value)
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHABLE_PRODUCT_FIELDS & set(update_fields):
+        return
+    refresh_search_vectors(instance.category, product_ids=[instance.pk])
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, **kwargs):
+    instance._previous_name = (
+        Category.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, created, **kwargs):
+    # Only a rename changes the documents of the products in this category.
+    if not created and getattr(instance, "_previous_name", None) != instance.name:
+        refresh_search_vectors(instance)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_facets(sender, instance, **kwargs):
+    instance._previous_facet_state = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "specifications", "is_active")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_specification_facets(sender, instance, **kwargs):
+    deltas = facet_deltas(
+        instance.category_id, instance.specifications, instance.is_active
+    )
+    previous = getattr(instance, "_previous_facet_state", None)
+    if previous:
+        deltas.update(facet_deltas(*previous, sign=-1))
+    apply_facet_deltas(deltas)
+
+
+@receiver(post_delete, sender=Product)
+def release_specification_facets(sender, instance, **kwargs):
+    apply_facet_deltas(
+        facet_deltas(
+            instance.category_id, instance.specifications, instance.is_active, sign=-1
+        )
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    catalog_cache.invalidate_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_image_cache(sender, instance, **kwargs):
+    catalog_cache.invalidate_products([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    catalog_cache.invalidate_categories()
+
+
+@receiver(pre_save, sender=ProductImage)
+def reset_image_variants(sender, instance, **kwargs):
+    # A new original needs new variants; NULL also queues it for the backfill.
+    previous = (
+        ProductImage.objects.filter(pk=instance.pk)
+        .values_list("image", "image_url")
+        .first()
+        if instance.pk
+        else None
+    )
+    instance._source_changed = previous != (instance.image.name or "", instance.image_url)
+    if instance._source_changed:
+        instance.processed_at = None
+
+
+@receiver(pre_delete, sender=ProductImage)
+def delete_image_variant_files(sender, instance, **kwargs):
+    paths = list(instance.variants.values_list("file", flat=True))
+    if paths:
+        transaction.on_commit(lambda: delete_files(paths))
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_variants(sender, instance, **kwargs):
+    if getattr(instance, "_source_changed", False):
+        transaction.on_commit(lambda: _queue_image_processing(instance.pk))
+
+
+def _queue_image_processing(image_id):
+    try:
+        process_product_image.delay(image_id)
+    except Exception:
+        # The broker is down; backfill_image_variants picks it up later.
+        logger.warning("Couldn't queue variants for image %s", image_id, exc_info=True)
+
+
+# Autocomplete entries, written after commit so the index never shows rows
+# that were rolled back.
+@receiver(post_save, sender=Product)
+def index_product_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _update_suggestions("index_products", [instance.pk]))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _update_suggestions("remove_products", [instance.pk]))
+
+
+@receiver(post_save, sender=Category)
+def index_category_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _update_suggestions("index_categories", [instance.pk]))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _update_suggestions("remove_categories", [instance.pk]))
+
+
+def _update_suggestions(method, ids):
+    try:
+        getattr(get_suggest_index(), method)(ids)
+    except Exception:
+        # Redis is down; the nightly rebuild_suggest_index catches up.
+        logger.warning("Couldn't update suggestions (%s %s)", method, ids, exc_info=True)
+
+
+# Detail read model (products.documents): flag every product whose payload
+# embeds the changed row.
+@receiver(post_save, sender=Product)
+def mark_product_document_stale(sender, instance, created, **kwargs):
+    if created:
+        create_documents([instance.pk])
+    else:
+        mark_stale(product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def mark_image_product_document_stale(sender, instance, **kwargs):
+    mark_stale(product_ids=[instance.product_id])
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_path(sender, instance, **kwargs):
+    instance._previous_path = (
+        Category.objects.filter(pk=instance.pk).values_list("path", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def mark_category_product_documents_stale(sender, instance, **kwargs):
+    # Products embed their category with its whole subtree, so the products
+    # of every ancestor (before and after a move) see the change.
+    paths = (instance.path, getattr(instance, "_previous_path", None) or "")
+    ancestors = {int(pk) for path in paths for pk in path.split("/") if pk}
+    mark_stale(category_ids=ancestors | {instance.pk})
+
+
+# Version stamps (ETag / Last-Modified) read updated_at columns; touch the
+# parent row when a child changes or disappears so the stamp moves.
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Product)
+def touch_category_on_product_delete(sender, instance, **kwargs):
+    Category.objects.filter(pk=instance.category_id).update(updated_at=timezone.now())
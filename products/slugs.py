@@ -0,0 +1,115 @@
+# products/slugs.py
+"""
+Unique slug allocation: "name", "name-2", "name-3", ...
+
+Taken slugs are read with one prefix query per batch (backed by the
+varchar_pattern_ops index Postgres gets for unique slug columns), and the
+first free suffix is picked in memory. Two writers can still pick the same
+slug; UniqueSlugMixin retries the save when the unique constraint says so.
+"""
+import random
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+SAVE_ATTEMPTS = 8
+# Characters a suffix may take from a base that fills the column ("-1234567").
+SUFFIX_ROOM = 8
+
+
+def slug_base(model, text):
+    max_length = model._meta.get_field("slug").max_length
+    return slugify(text)[:max_length].strip("-") or model._meta.model_name
+
+
+def _with_suffix(model, base, counter):
+    max_length = model._meta.get_field("slug").max_length
+    suffix = f"-{counter}"
+    return f"{base[: max_length - len(suffix)].rstrip('-')}{suffix}"
+
+
+def _taken_condition(model, base):
+    """
+    The slugs allocate_slugs() could derive from ``base``: the base itself
+    and "<base>-<n>", with the base cut short when the suffix doesn't fit.
+    Other slugs that merely start with the base ("iphone-15-pro" for
+    "iphone") aren't loaded.
+    """
+    max_length = model._meta.get_field("slug").max_length
+    digits_by_stem = {}
+    for digits in range(1, SUFFIX_ROOM):
+        stem = base[: max_length - digits - 1].rstrip("-")
+        digits_by_stem.setdefault(stem, []).append(digits)
+    pattern = "|".join(
+        f"{re.escape(stem)}-[0-9]{{{min(digits)},{max(digits)}}}"
+        for stem, digits in digits_by_stem.items()
+    )
+    # The prefix keeps it an index range scan; the regex filters within it.
+    shortest = min(digits_by_stem, key=len)
+    return Q(slug=base) | Q(slug__startswith=f"{shortest}-", slug__regex=f"^(?:{pattern})$")
+
+
+def allocate_slugs(model, texts, exclude_pk=None, spread=1):
+    """
+    Unique slugs for ``texts``, in order, with a single query. With
+    ``spread`` > 1 each slug is picked at random among that many free ones,
+    so writers retrying after a collision stop chasing the same suffix.
+    """
+    bases = [slug_base(model, text) for text in texts]
+    if not bases:
+        return []
+
+    taken_slugs = model.objects.filter(
+        reduce(or_, (_taken_condition(model, base) for base in set(bases)))
+    )
+    if exclude_pk is not None:
+        taken_slugs = taken_slugs.exclude(pk=exclude_pk)
+    taken = set(taken_slugs.values_list("slug", flat=True))
+
+    slugs = []
+    next_counter = {}
+    for base in bases:
+        counter = next_counter.get(base, 1)
+        free = []
+        while len(free) < spread:
+            slug = base if counter == 1 else _with_suffix(model, base, counter)
+            if slug not in taken:
+                free.append(slug)
+            counter += 1
+        slug = random.choice(free)
+        next_counter[base] = counter if spread == 1 else next_counter.get(base, 1)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(instance, text, spread=1):
+    slugs = allocate_slugs(type(instance), [text], exclude_pk=instance.pk, spread=spread)
+    return slugs[0]
+
+
+class UniqueSlugMixin:
+    """
+    Retries the save with a fresh slug when another writer took the one
+    allocated by products.signals.generate_slug_on_save in the meantime.
+    Models using it slug their ``name``.
+    """
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(SAVE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                others = type(self).objects.exclude(pk=self.pk)
+                lost_race = self.slug and others.filter(slug=self.slug).exists()
+                if not lost_race or attempt == SAVE_ATTEMPTS - 1:
+                    raise
+                self.slug = allocate_slug(self, self.name, spread=2 ** (attempt + 1))
@@ -0,0 +1,333 @@
+# products/suggest.py
+"""
+Prefix autocomplete over product names, SKUs and category names.
+
+RedisSuggestIndex keeps one sorted set per (kind, prefix) holding the most
+popular entries that start with it, so a keystroke is a single ZREVRANGE
+(one round trip, O(log n + limit)) whatever the catalog size. Prefixes are
+taken from every word onwards ("iphone 15 pro", "15 pro", "pro"), so "pro"
+finds "iPhone 15 Pro". Entries are updated from products.signals and the
+importer; rebuild_suggest_index (nightly from beat) refreshes the
+popularity scores and drops entries the signals missed.
+
+DatabaseSuggestIndex answers the same queries from the products table, for
+setups without Redis. It needs no maintenance.
+
+settings.PRODUCT_SUGGEST_BACKEND picks the class.
+"""
+import json
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Case, Count, Q, Value, When
+from django.db.models.functions import Coalesce, Lower
+from django.utils.module_loading import import_string
+
+from products.models import Category, Product
+
+PRODUCT = "product"
+CATEGORY = "category"
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Longer queries are looked up by their first MAX_PREFIX characters and the
+# candidates filtered in Python.
+MAX_PREFIX = 20
+# Entries kept per prefix; deeper ones are unreachable for that prefix.
+PREFIX_CAPACITY = 100
+# Featured products rank as if they had this many more reviews.
+FEATURED_BOOST = 25
+
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def _phrases(*texts):
+    """Every word-start suffix of each text: "a b c" -> "a b c", "b c", "c"."""
+    phrases = set()
+    for text in texts:
+        words = normalize(text).split()
+        phrases.update(" ".join(words[start:]) for start in range(len(words)))
+    return phrases
+
+
+def _prefixes(phrases):
+    return {
+        phrase[:length]
+        for phrase in phrases
+        for length in range(1, min(len(phrase), MAX_PREFIX) + 1)
+    }
+
+
+def product_weight(is_featured, review_count):
+    return (review_count or 0) + (FEATURED_BOOST if is_featured else 0)
+
+
+class SuggestIndex(ABC):
+    """Interface of the suggest backends; writes are no-ops by default."""
+
+    @abstractmethod
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """``{"products": [...], "categories": [...]}`` matching ``query``."""
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def index_categories(self, category_ids):
+        pass
+
+    def remove_categories(self, category_ids):
+        pass
+
+    def rebuild(self, clear=False):
+        pass
+
+
+class DatabaseSuggestIndex(SuggestIndex):
+    """
+    Matches names the way RedisSuggestIndex does: the query is the start of
+    a word ("15 pr" finds "iPhone 15 Pro"). That's a regex the pg_trgm index
+    on Product.name can serve; queries shorter than a trigram only match the
+    start of the name instead, a range scan of the UPPER(name)
+    text_pattern_ops index. SKUs match from their start. Ranked by
+    popularity in SQL.
+    """
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        query = " ".join((query or "").split())
+        if not normalize(query):
+            return {"products": [], "categories": []}
+
+        products = list(
+            Product.objects.filter(is_active=True)
+            .filter(_name_matches(query) | Q(sku__istartswith=query))
+            .annotate(
+                weight=Coalesce("rating_stats__count", 0)
+                + Case(When(is_featured=True, then=Value(FEATURED_BOOST)), default=Value(0))
+            )
+            .order_by("-weight", Lower("name"), "id")
+            .values("id", "name", "slug")[:limit]
+        )
+        categories = list(
+            Category.objects.filter(_name_matches(query), is_active=True)
+            .annotate(product_count=Count("products", filter=Q(products__is_active=True)))
+            .order_by("-product_count", "name")
+            .values("id", "name", "slug")[:limit]
+        )
+        return {"products": products, "categories": categories}
+
+
+def _name_matches(query):
+    words = normalize(query)
+    if len(words) < 3:
+        return Q(name__istartswith=query)
+    # \m is a word start; words are \w+ runs, so they need no escaping.
+    return Q(name__iregex=r"\m" + r"\W+".join(words.split()))
+
+
+class RedisSuggestIndex(SuggestIndex):
+    """
+    Keys (under settings.PRODUCT_SUGGEST_KEY_PREFIX, "suggest:" by default):
+
+    - ``<kind>:<prefix>``: sorted set of entry JSON ({"id", "name", "slug"})
+      scored by popularity, trimmed to PREFIX_CAPACITY;
+    - ``entries``: hash of ``<kind>:<id>`` -> the stored entry and the
+      prefixes it was added under, so updates can remove the old ones.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, url=None, key_prefix=None):
+        import redis
+
+        self.client = redis.Redis.from_url(
+            url or settings.PRODUCT_SUGGEST_REDIS_URL, decode_responses=True
+        )
+        self.key_prefix = key_prefix or getattr(
+            settings, "PRODUCT_SUGGEST_KEY_PREFIX", "suggest:"
+        )
+
+    def _key(self, kind, prefix):
+        return f"{self.key_prefix}{kind}:{prefix}"
+
+    @property
+    def _entries_key(self):
+        return f"{self.key_prefix}entries"
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        query = normalize(query)
+        if not query:
+            return {"products": [], "categories": []}
+
+        prefix = query[:MAX_PREFIX]
+        # Longer queries need room to filter the prefix's candidates.
+        fetch = limit if len(query) <= MAX_PREFIX else PREFIX_CAPACITY
+        pipe = self.client.pipeline(transaction=False)
+        for kind in (PRODUCT, CATEGORY):
+            pipe.zrevrange(self._key(kind, prefix), 0, fetch - 1)
+        product_rows, category_rows = pipe.execute()
+
+        results = {}
+        for group, rows in (("products", product_rows), ("categories", category_rows)):
+            entries = [json.loads(row) for row in rows]
+            if len(query) > MAX_PREFIX:
+                entries = [
+                    entry
+                    for entry in entries
+                    if any(
+                        phrase.startswith(query)
+                        for phrase in _phrases(entry["name"], entry.get("sku"))
+                    )
+                ]
+            for entry in entries:
+                entry.pop("sku", None)
+            results[group] = entries[:limit]
+        return results
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        rows = Product.objects.filter(pk__in=product_ids).values(
+            "id", "name", "slug", "sku", "is_active", "is_featured", "rating_stats__count"
+        )
+        self._write_products(rows, known_ids=product_ids)
+
+    def _write_products(self, rows, known_ids=()):
+        entries, removed = [], set(known_ids)
+        for row in rows:
+            removed.discard(row["id"])
+            if not row["is_active"]:
+                removed.add(row["id"])
+                continue
+            entry = {"id": row["id"], "name": row["name"], "slug": row["slug"]}
+            if row["sku"]:
+                entry["sku"] = row["sku"]
+            weight = product_weight(row["is_featured"], row["rating_stats__count"])
+            entries.append((entry, _phrases(row["name"], row["sku"]), weight))
+        self._store(PRODUCT, entries, removed)
+
+    def remove_products(self, product_ids):
+        self._store(PRODUCT, [], product_ids)
+
+    def index_categories(self, category_ids):
+        category_ids = list(category_ids)
+        rows = (
+            Category.objects.filter(pk__in=category_ids)
+            .annotate(product_count=Count("products", filter=Q(products__is_active=True)))
+            .values("id", "name", "slug", "is_active", "product_count")
+        )
+        entries, removed = [], set(category_ids)
+        for row in rows:
+            removed.discard(row["id"])
+            if not row["is_active"]:
+                removed.add(row["id"])
+                continue
+            entry = {"id": row["id"], "name": row["name"], "slug": row["slug"]}
+            entries.append((entry, _phrases(row["name"]), row["product_count"]))
+        self._store(CATEGORY, entries, removed)
+
+    def remove_categories(self, category_ids):
+        self._store(CATEGORY, [], category_ids)
+
+    def _store(self, kind, entries, removed_ids):
+        """Adds ``(entry, phrases, weight)`` entries and drops ``removed_ids``."""
+        ids = [entry["id"] for entry, _, _ in entries] + list(removed_ids)
+        if not ids:
+            return
+        names = [f"{kind}:{pk}" for pk in ids]
+        previous = dict(zip(names, self.client.hmget(self._entries_key, names)))
+
+        pipe = self.client.pipeline(transaction=False)
+        for name in names:
+            if previous[name]:
+                old = json.loads(previous[name])
+                for prefix in old["prefixes"]:
+                    pipe.zrem(self._key(kind, prefix), old["member"])
+        for pk in removed_ids:
+            pipe.hdel(self._entries_key, f"{kind}:{pk}")
+        for entry, phrases, weight in entries:
+            member = json.dumps(entry, separators=(",", ":"), sort_keys=True)
+            prefixes = sorted(_prefixes(phrases))
+            for prefix in prefixes:
+                key = self._key(kind, prefix)
+                pipe.zadd(key, {member: weight})
+                pipe.zremrangebyrank(key, 0, -PREFIX_CAPACITY - 1)
+            pipe.hset(
+                self._entries_key,
+                f"{kind}:{entry['id']}",
+                json.dumps({"member": member, "prefixes": prefixes}),
+            )
+        pipe.execute()
+
+    def rebuild(self, clear=False):
+        """
+        Re-indexes every active product and category (refreshing popularity)
+        and drops entries whose rows are gone. ``clear`` empties the index
+        first; suggestions are incomplete until it finishes.
+        """
+        if clear:
+            self._delete_matching(f"{self.key_prefix}*")
+
+        self.index_categories(
+            list(Category.objects.filter(is_active=True).values_list("id", flat=True))
+        )
+        rows = (
+            Product.objects.filter(is_active=True)
+            .order_by("id")
+            .values(
+                "id", "name", "slug", "sku", "is_active", "is_featured", "rating_stats__count"
+            )
+            .iterator(chunk_size=self.batch_size)
+        )
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.batch_size:
+                self._write_products(chunk)
+                chunk = []
+        self._write_products(chunk)
+        self._drop_orphans()
+
+    def _delete_matching(self, pattern):
+        batch = []
+        for key in self.client.scan_iter(match=pattern, count=self.batch_size):
+            batch.append(key)
+            if len(batch) >= self.batch_size:
+                self.client.unlink(*batch)
+                batch = []
+        if batch:
+            self.client.unlink(*batch)
+
+    def _drop_orphans(self):
+        # Rows deleted or deactivated without signals (queryset updates).
+        models = {PRODUCT: Product, CATEGORY: Category}
+        batch = []
+        for name, _ in self.client.hscan_iter(self._entries_key, count=self.batch_size):
+            batch.append(name)
+            if len(batch) >= self.batch_size:
+                self._drop_missing(models, batch)
+                batch = []
+        self._drop_missing(models, batch)
+
+    def _drop_missing(self, models, names):
+        wanted = {}
+        for name in names:
+            kind, _, pk = name.partition(":")
+            wanted.setdefault(kind, set()).add(int(pk))
+        for kind, ids in wanted.items():
+            live = set(
+                models[kind].objects.filter(pk__in=ids, is_active=True).values_list(
+                    "id", flat=True
+                )
+            )
+            self._store(kind, [], ids - live)
+
+
+@lru_cache(maxsize=None)
+def get_suggest_index():
+    return import_string(settings.PRODUCT_SUGGEST_BACKEND)()
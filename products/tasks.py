@@ -0,0 +1,80 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+from django.utils import timezone
+
+from .documents import SCHEDULED_KEY, rebuild_stale
+from .images import ImageSourceError, process_image, process_pending
+from .models import ProductImage
+from .pricing import run_due_price_changes
+from .recommendations import update_co_purchases
+from .suggest import get_suggest_index
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_product_image(image_id):
+    """Generates the resized variants of one ProductImage."""
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None:
+        return "Image deleted"
+    try:
+        count = process_image(image)
+    except ImageSourceError as exc:
+        logger.warning("Image %s skipped: %s", image_id, exc)
+        ProductImage.objects.filter(pk=image_id).update(processed_at=timezone.now())
+        return f"Skipped image {image_id}"
+    return f"Wrote {count} variants for image {image_id}"
+
+
+@shared_task
+def backfill_image_variants(batch_size=100):
+    """
+    Processes images without variants in batches, re-queuing itself until
+    none are left. Also catches uploads whose task was never queued.
+    """
+    processed, failed = process_pending(batch_size)
+    if processed + failed >= batch_size:
+        backfill_image_variants.delay(batch_size)
+    if processed or failed:
+        logger.info(f"Image backfill: {processed} processed, {failed} skipped.")
+    return f"Processed {processed} images, skipped {failed}"
+
+
+@shared_task
+def rebuild_suggest_index():
+    """Refreshes autocomplete popularity and drops entries signals missed."""
+    get_suggest_index().rebuild()
+    return "Rebuilt the suggest index"
+
+
+@shared_task
+def compute_co_purchases():
+    """Folds newly completed orders into the "bought together" lists."""
+    orders, products = update_co_purchases()
+    if orders:
+        logger.info(f"Co-purchases: {orders} orders, {products} products updated.")
+    return f"Processed {orders} orders"
+
+
+@shared_task
+def rebuild_product_documents():
+    """
+    Rebuilds every stale product document. Queued (once per coalescing
+    window) by products.documents.mark_stale, and periodically from beat.
+    """
+    # Changes from here on schedule a new run.
+    cache.delete(SCHEDULED_KEY)
+    built = rebuild_stale()
+    return f"Rebuilt {built} product documents"
+
+
+@shared_task
+def apply_scheduled_price_changes():
+    """Applies the scheduled price changes that are due and reverts ended ones."""
+    applied, reverted = run_due_price_changes()
+    if applied or reverted:
+        logger.info(f"Price changes: {applied} applied, {reverted} reverted.")
+    return f"Applied {applied} price changes, reverted {reverted}"
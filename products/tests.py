@@ -1,3 +1,991 @@
-from django.test import TestCase
+import json
+import socket
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User
+from core.pagination import KeysetPagination
+from inventory.models import InventoryItem
+from orders.models import Order, OrderItem, OrderStatus
+from products import cache as catalog_cache
+from products.documents import (
+    check_documents,
+    mark_stale,
+    read_document,
+    rebuild_stale,
+    render_documents,
+)
+from products.images import ImageSourceError, process_pending, read_original
+from products.models import (
+    Category,
+    CoPurchaseCount,
+    CoPurchaseWatermark,
+    PriceOperation,
+    Product,
+    ProductImage,
+    ProductDocument,
+    ProductImageVariant,
+    ScheduledPriceChange,
+)
+from products.recommendations import (
+    SAFETY_LAG,
+    rebuild_co_purchases,
+    related_product_ids,
+    update_co_purchases,
+)
+from products.pricing import (
+    apply_scheduled_change,
+    cancel_scheduled_change,
+    revert_scheduled_change,
+)
+from products.serializers import ProductSerializer
+from products.services import facet_counts, filtered_facet_counts
+from products.slugs import _taken_condition, allocate_slugs
+from products.suggest import DatabaseSuggestIndex, RedisSuggestIndex, SuggestIndex
+from products.views import ProductViewSet
+
+
+def make_products(category, count, prefix="Product", **fields):
+    return [
+        Product.objects.create(
+            category=category, name=f"{prefix} {i}", price=10 + i, **fields
+        )
+        for i in range(count)
+    ]
+
+
+class CategoryPathTests(TestCase):
+    def setUp(self):
+        self.electronics = Category.objects.create(name="Electronics")
+        self.home = Category.objects.create(name="Home")
+        self.phones = Category.objects.create(
+            name="Phones", parent_category=self.electronics
+        )
+        self.android = Category.objects.create(name="Android", parent_category=self.phones)
+
+    def path(self, category):
+        return Category.objects.get(pk=category.pk).path
+
+    def test_paths_follow_the_parents(self):
+        self.assertEqual(self.path(self.electronics), f"{self.electronics.pk}/")
+        self.assertEqual(
+            self.path(self.android),
+            f"{self.electronics.pk}/{self.phones.pk}/{self.android.pk}/",
+        )
+
+    def test_moving_a_subtree_rewrites_the_descendants(self):
+        self.phones.parent_category = self.home
+        self.phones.save()
+
+        self.assertEqual(self.path(self.phones), f"{self.home.pk}/{self.phones.pk}/")
+        self.assertEqual(
+            self.path(self.android), f"{self.home.pk}/{self.phones.pk}/{self.android.pk}/"
+        )
+        self.assertEqual(self.path(self.electronics), f"{self.electronics.pk}/")
+
+    def test_moving_a_subtree_to_the_root(self):
+        self.phones.parent_category = None
+        self.phones.save()
+
+        self.assertEqual(self.path(self.android), f"{self.phones.pk}/{self.android.pk}/")
+
+    def test_deleting_a_category_re_roots_its_children(self):
+        self.phones.delete()
+
+        self.assertEqual(self.path(self.android), f"{self.android.pk}/")
+
+
+class CategorySubtreeTests(TestCase):
+    def setUp(self):
+        # Commit callbacks run here; don't queue document rebuilds to a broker.
+        patcher = mock.patch("products.documents.schedule_rebuild")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.electronics = Category.objects.create(name="Electronics")
+        self.home = Category.objects.create(name="Home")
+        self.phones = Category.objects.create(
+            name="Phones", parent_category=self.electronics
+        )
+        self.android = Category.objects.create(name="Android", parent_category=self.phones)
+        make_products(self.electronics, 1, prefix="Cable")
+        make_products(self.phones, 2, prefix="Phone")
+        make_products(self.android, 1, prefix="Pixel")
+        make_products(self.android, 1, prefix="Retired", is_active=False)
+        make_products(self.home, 1, prefix="Lamp")
+
+    def product_count(self, slug, descendants=True):
+        params = {"category": slug, "fields": "id"}
+        if descendants:
+            params["include_descendants"] = "1"
+        return len(self.client.get("/api/products/", params).json()["results"])
+
+    def counts(self, category):
+        node = self.client.get(f"/api/categories/{category.pk}/").json()
+        return node["product_count"], node["total_product_count"]
+
+    def test_subtree_filter_and_counts(self):
+        self.assertEqual(self.product_count("electronics"), 4)
+        self.assertEqual(self.product_count("electronics", descendants=False), 1)
+        self.assertEqual(self.product_count("phones"), 3)
+        self.assertEqual(self.counts(self.electronics), (1, 4))
+        self.assertEqual(self.counts(self.phones), (2, 3))
+        self.assertEqual(self.counts(self.android), (1, 1))
+
+    def test_moved_category_takes_its_products_along(self):
+        # Warm the cached subtrees and responses first.
+        self.assertEqual(self.product_count("electronics"), 4)
+        self.assertEqual(self.counts(self.home), (1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phones.parent_category = self.home
+            self.phones.save()
+
+        self.assertEqual(self.product_count("electronics"), 1)
+        self.assertEqual(self.product_count("home"), 4)
+        self.assertEqual(self.counts(self.electronics), (1, 1))
+        self.assertEqual(self.counts(self.home), (1, 4))
+        home = self.client.get(f"/api/categories/{self.home.pk}/").json()
+        (phones,) = home["subcategories"]
+        self.assertEqual((phones["name"], phones["total_product_count"]), ("Phones", 3))
+
+
+class ProductListQueryTests(TestCase):
+    """The list endpoint's query count doesn't depend on the page size."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Phones")
+        for product in make_products(category, 12):
+            InventoryItem.objects.create(product=product, quantity=5, location="B")
+            ProductImage.objects.create(product=product, image_url=f"/media/{product.pk}.jpg")
+
+    def list_queries(self, query):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f"/api/products/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return len(captured), response.json()["results"]
+
+    def assert_constant(self, query):
+        small, results = self.list_queries(f"page_size=2&{query}")
+        self.assertEqual(len(results), 2)
+        cache.clear()
+        with self.assertNumQueries(small):
+            response = self.client.get(f"/api/products/?page_size=12&{query}")
+        self.assertEqual(len(response.json()["results"]), 12)
+        return response.json()["results"]
+
+    def test_card(self):
+        results = self.assert_constant("")
+        self.assertEqual(results[0]["total_stock"], 5)
+        self.assertEqual(results[0]["available_stock"], 5)
+
+    def test_expanded(self):
+        results = self.assert_constant("expand=category,images,inventory_items")
+        self.assertEqual(len(results[0]["inventory_items"]), 2)
+        self.assertEqual(len(results[0]["images"]), 1)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        audio = Category.objects.create(name="Audio")
+        Product.objects.create(category=audio, name="Wireless headphones", price=50)
+        Product.objects.create(
+            category=audio, name="Bookshelf speaker", price=80,
+            description="Pairs with wireless headphones.",
+        )
+        Product.objects.create(category=audio, name="Turntable", price=200)
+
+    def search(self, term):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/products/", {"search": term})
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.json()["results"]], len(captured)
+
+    def test_ranked_by_relevance(self):
+        names, _ = self.search("wireless headphones")
+        # The name outweighs the description.
+        self.assertEqual(names, ["Wireless headphones", "Bookshelf speaker"])
+
+    def test_typos_fall_back_to_name_similarity(self):
+        names, fallback_queries = self.search("turntabel")
+        self.assertEqual(names, ["Turntable"])
+        _, ranked_queries = self.search("turntable")
+        # No existence probe: the fallback only adds the empty count.
+        self.assertEqual(fallback_queries, ranked_queries + 1)
+
+
+class ProductPaginationTests(TestCase):
+    def setUp(self):
+        make_products(Category.objects.create(name="Audio"), 3, prefix="Speaker")
+
+    def test_keyset_by_default_and_pages_for_search(self):
+        response = self.client.get("/api/products/", {"page_size": 2})
+        self.assertNotIn("count", response.json())
+        self.assertIn("cursor=", response.json()["next"])
+
+        response = self.client.get("/api/products/", {"page_size": 2, "search": "speaker"})
+        self.assertEqual(response.json()["count"], 3)
+        self.assertIn("page=2", response.json()["next"])
+
+        # The class attribute is left alone.
+        self.assertIs(ProductViewSet.pagination_class, KeysetPagination)
+
+
+class FacetCountTests(TestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones")
+        for color, ram, price in [("red", 8, 100), ("red", 16, 300), ("blue", 16, 500)]:
+            Product.objects.create(
+                category=self.phones,
+                name=f"{color} {ram}",
+                price=price,
+                specifications={"color": color, "ram": ram, "bands": ["4g", "5g"]},
+            )
+
+    def facets(self, **params):
+        cache.clear()
+        response = self.client.get(
+            "/api/products/", {"facets": 1, "category": "phones", **params}
+        )
+        return response.json()["facets"]
+
+    def test_filtered_counts_match_the_facet_table(self):
+        self.assertEqual(
+            filtered_facet_counts(Product.objects.filter(category=self.phones)),
+            facet_counts([self.phones.pk]),
+        )
+
+    def test_unfiltered_counts_cover_the_category(self):
+        self.assertEqual(
+            self.facets()["color"],
+            [{"value": "red", "count": 2}, {"value": "blue", "count": 1}],
+        )
+
+    def test_counts_follow_the_spec_and_price_filters(self):
+        facets = self.facets(spec="ram:16")
+        self.assertEqual(
+            facets["color"], [{"value": "blue", "count": 1}, {"value": "red", "count": 1}]
+        )
+        self.assertEqual(facets["ram"], [{"value": "16", "count": 2}])
+        self.assertEqual(facets["bands"][0], {"value": "4g", "count": 2})
+
+        facets = self.facets(max_price=200)
+        self.assertEqual(facets["color"], [{"value": "red", "count": 1}])
+
+    def test_filters_that_match_nothing(self):
+        response = self.client.get(
+            "/api/products/",
+            {"facets": 1, "category": "nope", "include_descendants": 1, "spec": "color:red"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["facets"], {})
+        self.assertEqual(filtered_facet_counts(Product.objects.filter(pk__in=[])), {})
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Audio")
+        (self.product,) = make_products(category, 1, specifications={"color": "red"})
+        ProductImage.objects.create(product=self.product, image_url="/media/a.jpg")
+
+    def get(self, url, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        return response, len(captured)
+
+    def test_list_returns_the_card(self):
+        response, _ = self.get("/api/products/")
+        self.assertEqual(
+            set(response.json()["results"][0]), set(ProductSerializer.Meta.list_fields)
+        )
+
+    def test_detail_returns_every_field(self):
+        response, _ = self.get(f"/api/products/{self.product.pk}/")
+        self.assertIn("inventory_items", response.json())
+        self.assertIn("category", response.json())
+
+    def test_fields_replace_the_default_set(self):
+        response, _ = self.get(f"/api/products/{self.product.pk}/", fields="id,name")
+        self.assertEqual(response.json(), {"id": self.product.pk, "name": "Product 0"})
+
+    def test_expand_adds_relations(self):
+        response, _ = self.get("/api/products/", fields="id", expand="category,specifications")
+        row = response.json()["results"][0]
+        self.assertEqual(set(row), {"id", "category", "specifications"})
+        self.assertEqual(row["category"]["slug"], "audio")
+
+    def test_unrequested_relations_are_not_fetched(self):
+        _, lean = self.get("/api/products/", fields="id,name")
+        _, expanded = self.get("/api/products/", fields="id,name", expand="images,inventory_items")
+        # images, their variants and inventory rows: one prefetch each.
+        self.assertEqual(expanded, lean + 3)
+
+    def test_unknown_names_are_rejected(self):
+        response, _ = self.get("/api/products/", fields="id,secret")
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.get("/api/products/", expand="name")
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogImportEndpointTests(TestCase):
+    def setUp(self):
+        Category.objects.create(name="Audio")
+        admin = User.objects.create_user(email="admin@example.com", is_staff=True)
+        self.client.force_login(admin)
+
+    def upload(self, content, name="feed.csv"):
+        return self.client.post(
+            "/api/products/import/", {"file": SimpleUploadedFile(name, content)}
+        )
+
+    def test_imports_a_csv_feed(self):
+        response = self.upload(
+            "\ufeffsku,name,category,price,stock\nA-1,Speaker,audio,25,3\n".encode()
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], 1)
+        product = Product.objects.get(sku="A-1")
+        self.assertEqual(product.total_quantity, 3)
+
+    def test_rejects_files_that_are_not_utf8(self):
+        response = self.upload("sku,name,category,price\nA-1,Café,audio,25\n".encode("latin-1"))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("UTF-8", response.json()["file"])
+        self.assertFalse(Product.objects.exists())
+
+
+class SlugAllocationTests(TestCase):
+    def test_thousands_of_same_name_products(self):
+        category = Category.objects.create(name="Phones")
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Product, ["Phone"] * 3000)
+        self.assertEqual(slugs[:3], ["phone", "phone-2", "phone-3"])
+        self.assertEqual(len(set(slugs)), 3000)
+        Product.objects.bulk_create(
+            Product(category=category, name="Phone", slug=slug, price=1) for slug in slugs
+        )
+
+        product = Product.objects.create(category=category, name="Phone", price=1)
+        self.assertEqual(product.slug, "phone-3001")
+
+    def test_long_names_keep_room_for_the_suffix(self):
+        name = "x" * 120
+        first = Category.objects.create(name=name)
+        second = Category.objects.create(name=name)
+        self.assertEqual(len(first.slug), 50)
+        self.assertEqual(second.slug, f"{'x' * 48}-2")
+
+    def test_only_suffixed_slugs_of_the_base_are_read(self):
+        for name in ["iPhone", "iPhone", "iPhone 15 Pro", "iPhone 15 Pro", "iPhoneX"]:
+            Category.objects.create(name=name)
+        taken = Category.objects.filter(_taken_condition(Category, "iphone"))
+        self.assertEqual(
+            sorted(taken.values_list("slug", flat=True)), ["iphone", "iphone-2"]
+        )
+
+    def test_save_retries_when_the_slug_was_taken_meanwhile(self):
+        Category.objects.create(name="Audio")
+        # Allocated before the other writer's row existed.
+        with mock.patch("products.signals.allocate_slug", return_value="audio"):
+            category = Category.objects.create(name="Audio")
+        self.assertRegex(category.slug, r"^audio-\d+$")
+
+
+@mock.patch("products.documents.schedule_rebuild")
+class ConcurrentSlugTests(TransactionTestCase):
+    def test_concurrent_inserts_of_the_same_name(self, schedule_rebuild):
+        errors, barrier = [], threading.Barrier(8)
+
+        def create():
+            try:
+                barrier.wait()
+                for _ in range(10):
+                    Category.objects.create(name="Flash Sale")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        slugs = list(Category.objects.values_list("slug", flat=True))
+        self.assertEqual(len(slugs), 80)
+        self.assertEqual(len(set(slugs)), 80)
+
+
+def resolves_to(address):
+    """Points every name at ``address``; IP literals still resolve to themselves."""
+    real_getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(host, *args, **kwargs):
+        if host.replace(".", "").isdigit() or ":" in host:
+            return real_getaddrinfo(host, *args, **kwargs)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 80))]
+
+    return mock.patch("products.images.socket.getaddrinfo", side_effect=getaddrinfo)
+
+
+class ProductImageSourceTests(TestCase):
+    def setUp(self):
+        self.product = make_products(Category.objects.create(name="Audio"), 1)[0]
+
+    def image(self, url):
+        return ProductImage.objects.create(product=self.product, image_url=url)
+
+    @mock.patch("products.images.requests.get")
+    def test_internal_addresses_are_refused(self, get):
+        for url in [
+            "http://127.0.0.1/a.jpg",
+            "http://[::1]/a.jpg",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://10.0.0.8:8080/a.jpg",
+        ]:
+            with self.subTest(url=url), self.assertRaises(ImageSourceError):
+                read_original(self.image(url))
+        with resolves_to("192.168.1.20"), self.assertRaises(ImageSourceError):
+            read_original(self.image("https://cdn.example.com/a.jpg"))
+        get.assert_not_called()
+
+    @mock.patch("products.images.requests.get")
+    def test_redirects_are_checked_too(self, get):
+        redirect = mock.MagicMock(is_redirect=True, headers={"location": "http://127.0.0.1/"})
+        redirect.__enter__.return_value = redirect
+        get.return_value = redirect
+        with resolves_to("93.184.216.34"), self.assertRaisesMessage(
+            ImageSourceError, "non-public"
+        ):
+            read_original(self.image("https://cdn.example.com/a.jpg"))
+        self.assertEqual(get.call_count, 1)
+        self.assertFalse(get.call_args.kwargs["allow_redirects"])
+
+    @override_settings(PRODUCT_IMAGE_ALLOWED_HOSTS=[".example.com"])
+    @mock.patch("products.images.requests.get")
+    def test_allowed_hosts(self, get):
+        with resolves_to("93.184.216.34"), self.assertRaisesMessage(
+            ImageSourceError, "isn't an allowed image host"
+        ):
+            read_original(self.image("https://images.example.net/a.jpg"))
+        get.assert_not_called()
+
+    def test_unexpected_errors_mark_the_image_failed(self):
+        self.image("/media/a.jpg")
+        with mock.patch("products.images.process_image", side_effect=RuntimeError("boom")):
+            self.assertEqual(process_pending(), (0, 1))
+        self.assertFalse(ProductImage.objects.filter(processed_at__isnull=True).exists())
+
+    def test_deleting_an_image_deletes_its_variant_files(self):
+        image = self.image("/media/a.jpg")
+        ProductImageVariant.objects.create(
+            image=image, name="thumb", format="webp", file="products/variants/a.webp",
+            width=160, height=160, size=10, content_hash="0" * 64,
+        )
+        with mock.patch("products.signals.delete_files") as delete_files:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.delete()
+        delete_files.assert_called_once_with(["products/variants/a.webp"])
+
+
+class PriceIndexPlanTests(TestCase):
+    """?ordering=price and the price filters use the (effective_price, id) index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Audio")
+        Product.objects.bulk_create(
+            Product(
+                category=category, name=f"Speaker {i}", slug=f"speaker-{i}", price=5 + i % 1000
+            )
+            for i in range(3000)
+        )
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Product._meta.db_table)}")
+
+    def plan(self, url):
+        """EXPLAIN of the page query behind ``url``, and the response."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        (sql,) = [
+            query["sql"]
+            for query in captured
+            if "effective_price" in query["sql"] and "LIMIT" in query["sql"]
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}")
+            return "\n".join(row[0] for row in cursor.fetchall()), response.json()
+
+    def test_ordering_walks_the_index(self):
+        plan, page = self.plan("/api/products/?ordering=price")
+        self.assertIn("Index Scan using product_price_id_idx", plan)
+        self.assertNotIn("Sort Key: products_product.effective_price", plan)
+
+        plan, _ = self.plan(page["next"])
+        self.assertIn("Index Scan using product_price_id_idx", plan)
+
+        plan, _ = self.plan("/api/products/?ordering=-price")
+        self.assertIn("Index Scan Backward using product_price_id_idx", plan)
+
+    def test_price_range_uses_the_index(self):
+        for query in ["min_price=100&max_price=105", "min_price=990", "max_price=8"]:
+            with self.subTest(query=query):
+                plan, _ = self.plan(f"/api/products/?ordering=price&{query}")
+                self.assertIn("product_price_id_idx", plan)
+                self.assertIn("Index Cond: ", plan)
+
+
+class SuggestBackendTests:
+    """Shared by both backends: they must answer alike."""
+
+    def setUp(self):
+        phones = Category.objects.create(name="Phones")
+        Category.objects.create(name="Smart Home")
+        Product.objects.create(
+            category=phones, name="iPhone 15 Pro", price=999, is_featured=True
+        )
+        Product.objects.create(category=phones, name="Pixel 8 Pro", price=699)
+        Product.objects.create(category=phones, name="Phone case", sku="CASE-1", price=9)
+        Product.objects.create(category=phones, name="iPhone 14 Pro", price=599, is_active=False)
+
+    def suggest(self, query):
+        results = self.index.suggest(query)
+        return (
+            [row["name"] for row in results["products"]],
+            [row["name"] for row in results["categories"]],
+        )
+
+    def test_matches_word_prefixes(self):
+        self.assertEqual(self.suggest("pro"), (["iPhone 15 Pro", "Pixel 8 Pro"], []))
+        self.assertEqual(self.suggest("15 PR"), (["iPhone 15 Pro"], []))
+        self.assertEqual(self.suggest("hom"), ([], ["Smart Home"]))
+
+    def test_words_must_match_whole(self):
+        self.assertEqual(self.suggest("phone 15"), ([], []))
+
+    def test_short_queries_and_skus(self):
+        self.assertEqual(self.suggest("ph"), (["Phone case"], ["Phones"]))
+        self.assertEqual(self.suggest("case-1"), (["Phone case"], []))
+
+    def test_blank_query(self):
+        self.assertEqual(self.suggest("  "), ([], []))
+
+
+class DatabaseSuggestIndexTests(SuggestBackendTests, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = DatabaseSuggestIndex()
+
+    def test_the_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            SuggestIndex()
+
+
+class RedisSuggestIndexTests(SuggestBackendTests, TestCase):
+    def setUp(self):
+        super().setUp()
+        client = fakeredis.FakeRedis(decode_responses=True)
+        client.flushall()
+        with mock.patch("redis.Redis.from_url", return_value=client):
+            self.index = RedisSuggestIndex(url="redis://suggest")
+        self.index.rebuild()
+
+    def test_updates_replace_the_old_prefixes(self):
+        product = Product.objects.get(name="Pixel 8 Pro")
+        Product.objects.filter(pk=product.pk).update(name="Pixel 9")
+        self.index.index_products([product.pk])
+        self.assertEqual(self.suggest("pro"), (["iPhone 15 Pro"], []))
+        self.assertEqual(self.suggest("pixel 9"), (["Pixel 9"], []))
+
+        self.index.remove_products([product.pk])
+        self.assertEqual(self.suggest("pixel"), ([], []))
+
+
+class ScheduledPriceChangeTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Audio")
+        self.speaker = Product.objects.create(
+            category=category, name="Speaker", sku="SPK", price=100
+        )
+        self.turntable = Product.objects.create(
+            category=category, name="Turntable", sku="TT", price=300
+        )
+
+    def schedule(self, value, field="price", operation=PriceOperation.SET, skus=("SPK",)):
+        now = timezone.now()
+        return ScheduledPriceChange.objects.create(
+            name=f"{field} {operation} {value}",
+            filters={"skus": list(skus)},
+            field=field,
+            operation=operation,
+            value=value,
+            starts_at=now,
+            ends_at=now + timedelta(days=1),
+        )
+
+    def prices(self, product=None):
+        product = Product.objects.get(pk=(product or self.speaker).pk)
+        return product.price, product.discount_price
+
+    def test_apply_and_revert(self):
+        change = self.schedule(-10, operation=PriceOperation.ADJUST, skus=["SPK", "TT"])
+        change = apply_scheduled_change(change.pk)
+        self.assertEqual(change.status, ScheduledPriceChange.Status.ACTIVE)
+        self.assertEqual(change.products_changed, 2)
+        self.assertEqual(self.prices(self.turntable), (Decimal("270.00"), None))
+
+        change = revert_scheduled_change(change.pk)
+        self.assertEqual(change.status, ScheduledPriceChange.Status.ENDED)
+        self.assertEqual(self.prices(), (Decimal("100.00"), None))
+        self.assertEqual(self.prices(self.turntable), (Decimal("300.00"), None))
+        self.assertIsNone(revert_scheduled_change(change.pk))
+
+    def test_overlapping_changes_restore_the_original_price(self):
+        for order in ("first applied ends first", "last applied ends first"):
+            with self.subTest(order):
+                first = apply_scheduled_change(self.schedule(80).pk)
+                second = apply_scheduled_change(self.schedule(70).pk)
+                self.assertEqual(self.prices(), (Decimal("70.00"), None))
+
+                ending = [first, second] if order.startswith("first") else [second, first]
+                revert_scheduled_change(ending[0].pk)
+                self.assertEqual(
+                    self.prices()[0], Decimal("70.00") if ending[0] == first else Decimal("80.00")
+                )
+                revert_scheduled_change(ending[1].pk)
+                self.assertEqual(self.prices(), (Decimal("100.00"), None))
+
+    def test_overlapping_price_and_discount_changes(self):
+        sale = apply_scheduled_change(self.schedule(80).pk)
+        coupon = apply_scheduled_change(self.schedule(60, field="discount_price").pk)
+        self.assertEqual(self.prices(), (Decimal("80.00"), Decimal("60.00")))
+
+        revert_scheduled_change(sale.pk)
+        self.assertEqual(self.prices(), (Decimal("80.00"), Decimal("60.00")))
+        revert_scheduled_change(coupon.pk)
+        self.assertEqual(self.prices(), (Decimal("100.00"), None))
+
+    def test_edits_made_meanwhile_are_kept(self):
+        change = apply_scheduled_change(self.schedule(80).pk)
+        Product.objects.filter(pk=self.speaker.pk).update(price=90)
+        revert_scheduled_change(change.pk)
+        self.assertEqual(self.prices(), (Decimal("90.00"), None))
+
+    def test_cancel(self):
+        pending = self.schedule(80)
+        self.assertEqual(
+            cancel_scheduled_change(pending.pk).status, ScheduledPriceChange.Status.CANCELLED
+        )
+        self.assertIsNone(apply_scheduled_change(pending.pk))
+        self.assertEqual(self.prices(), (Decimal("100.00"), None))
+
+        first = apply_scheduled_change(self.schedule(80).pk)
+        second = apply_scheduled_change(self.schedule(70).pk)
+        cancelled = cancel_scheduled_change(first.pk)
+        self.assertEqual(cancelled.status, ScheduledPriceChange.Status.CANCELLED)
+        self.assertEqual(self.prices()[0], Decimal("70.00"))
+        revert_scheduled_change(second.pk)
+        self.assertEqual(self.prices(), (Decimal("100.00"), None))
+
+
+@mock.patch("products.documents.schedule_rebuild")
+class ProductDocumentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Kitchen")
+        self.product, self.other = make_products(self.category, 2)
+        InventoryItem.objects.filter(product=self.product).update(quantity=5)
+        rebuild_stale()
+
+    def document(self, product):
+        return ProductDocument.objects.get(product=product)
+
+    def detail(self, product):
+        return self.client.get(f"/api/products/{product.pk}/").json()
+
+    def test_rebuild_writes_clean_documents(self, schedule_rebuild):
+        document = self.document(self.product)
+        self.assertIsNone(document.dirty_since)
+        self.assertEqual(
+            json.loads(document.data),
+            render_documents(Product.objects.filter(pk=self.product.pk))[self.product.pk],
+        )
+        self.assertEqual(check_documents(), (2, [], []))
+
+    def test_mark_during_a_rebuild_keeps_the_flag(self, schedule_rebuild):
+        mark_stale(product_ids=[self.product.pk, self.other.pk])
+
+        def render_then_mark(products):
+            rendered = render_documents(products)
+            # Another writer flags the product after it was rendered.
+            mark_stale(product_ids=[self.product.pk])
+            return rendered
+
+        with mock.patch("products.documents.render_documents", render_then_mark):
+            self.assertEqual(rebuild_stale(), 1)
+        self.assertIsNotNone(self.document(self.product).dirty_since)
+        self.assertIsNone(self.document(self.other).dirty_since)
+
+        self.assertEqual(rebuild_stale(), 1)
+        self.assertIsNone(self.document(self.product).dirty_since)
+
+    def test_read_document_falls_back(self, schedule_rebuild):
+        self.assertIsNotNone(read_document(self.product.pk))
+        mark_stale(product_ids=[self.product.pk])
+        self.assertIsNone(read_document(self.product.pk))
+        self.assertIsNone(read_document(0))
+        self.assertIsNone(read_document("not-a-pk"))
+        # A dirty document is rendered live instead.
+        self.assertEqual(self.detail(self.product)["name"], self.product.name)
+        self.assertEqual(self.client.get("/api/products/0/").status_code, 404)
+
+    def test_check_documents(self, schedule_rebuild):
+        ProductDocument.objects.filter(product=self.product).update(data='{"id": 0}')
+        ProductDocument.objects.filter(product=self.other).delete()
+        self.assertEqual(check_documents(), (1, [self.other.pk], [self.product.pk]))
+        # Dirty documents aren't compared.
+        mark_stale(product_ids=[self.product.pk])
+        self.assertEqual(check_documents(), (0, [self.other.pk], []))
+
+    def test_detail_after_price_and_stock_changes(self, schedule_rebuild):
+        self.assertEqual(self.detail(self.product)["available_stock"], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal("42.00")
+            self.product.save()
+        self.assertEqual(self.detail(self.product)["price"], "42.00")
+        rebuild_stale()
+        self.assertIsNotNone(read_document(self.product.pk))
+        self.assertEqual(self.detail(self.product)["price"], "42.00")
+
+        # Stock totals are read live with the document.
+        with self.captureOnCommitCallbacks(execute=True):
+            InventoryItem.objects.create(product=self.product, quantity=3, location="B")
+        self.assertEqual(self.detail(self.product)["available_stock"], 8)
+        self.assertEqual(self.detail(self.product)["total_stock"], 8)
+
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        # Commit callbacks run here; don't queue tasks to a broker.
+        for target in (
+            "products.documents.schedule_rebuild",
+            "products.signals._queue_image_processing",
+        ):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+        self.category = Category.objects.create(name="Garden")
+        self.product, self.other = make_products(self.category, 2)
+        self.request = Request(APIRequestFactory().get("/api/products/"))
+
+    def keys(self):
+        return {
+            "list": catalog_cache.list_key(catalog_cache.PRODUCTS, self.request),
+            "product": catalog_cache.detail_key(
+                catalog_cache.PRODUCTS, self.product.pk, self.request
+            ),
+            "other": catalog_cache.detail_key(
+                catalog_cache.PRODUCTS, self.other.pk, self.request
+            ),
+            "category": catalog_cache.detail_key(
+                catalog_cache.CATEGORIES, self.category.pk, self.request
+            ),
+        }
+
+    def changed_by(self, write):
+        before = self.keys()
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+            # Nothing moves until the transaction commits.
+            self.assertEqual(self.keys(), before)
+        after = self.keys()
+        return {name for name in before if before[name] != after[name]}
+
+    def test_product_writes(self):
+        self.product.price = 99
+        self.assertEqual(
+            self.changed_by(self.product.save), {"list", "product", "category"}
+        )
+        self.assertEqual(
+            self.changed_by(
+                lambda: ProductImage.objects.create(product=self.product, image_url="/a.jpg")
+            ),
+            {"list", "product", "category"},
+        )
+
+    def test_stock_writes(self):
+        self.assertEqual(
+            self.changed_by(
+                lambda: InventoryItem.objects.create(product=self.other, quantity=3)
+            ),
+            {"list", "other", "category"},
+        )
+
+    def test_category_writes_move_every_key(self):
+        self.category.name = "Yard"
+        self.assertEqual(
+            self.changed_by(self.category.save), {"list", "product", "other", "category"}
+        )
+
+    def test_large_batches_move_every_detail(self):
+        ids = range(catalog_cache.PER_PRODUCT_INVALIDATION_LIMIT + 1)
+        self.assertEqual(
+            self.changed_by(lambda: catalog_cache.invalidate_products(ids)),
+            {"list", "product", "other", "category"},
+        )
+
+    def test_cached_until_invalidated(self):
+        build = mock.Mock(side_effect=[1, 2])
+        key = self.keys()["product"]
+        self.assertEqual(catalog_cache.get_or_build(key, build), 1)
+        self.assertEqual(catalog_cache.get_or_build(key, build), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog_cache.invalidate_products([self.product.pk])
+        self.assertEqual(catalog_cache.get_or_build(self.keys()["product"], build), 2)
+        self.assertEqual(build.call_count, 2)
+
+    def test_expired_entry_is_rebuilt_by_one_caller(self):
+        key = self.keys()["list"]
+        cache.set(key, (time.time() - 1, "stale"))
+        build = mock.Mock(return_value="fresh")
+        # Another caller holds the rebuild lock: serve the stale copy.
+        cache.add(f"{key}:lock", 1)
+        self.assertEqual(catalog_cache.get_or_build(key, build), "stale")
+        build.assert_not_called()
+        cache.delete(f"{key}:lock")
+        self.assertEqual(catalog_cache.get_or_build(key, build), "fresh")
+        self.assertEqual(catalog_cache.get_or_build(key, build), "fresh")
+        build.assert_called_once()
+
+    @override_settings(CATALOG_CACHE_WAIT=5)
+    def test_concurrent_misses_build_once(self):
+        key = self.keys()["list"]
+        calls, results = [], []
+        barrier = threading.Barrier(8)
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return "data"
+
+        def read():
+            barrier.wait()
+            results.append(catalog_cache.get_or_build(key, build))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["data"] * 8)
+
+
+class CoPurchaseTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("products.documents.schedule_rebuild")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.user = User.objects.create_user(email="buyer@example.com")
+        category = Category.objects.create(name="Bundles")
+        self.a, self.b, self.c = make_products(category, 3)
+        (self.d,) = make_products(category, 1, prefix="Retired", is_active=False)
+        self.completed_at = timezone.now() - SAFETY_LAG - timedelta(minutes=1)
+        for products in [
+            (self.a, self.b, self.c),
+            (self.a, self.b),
+            (self.a, self.b, self.d),
+            (self.c, self.d),
+        ]:
+            self.order(*products)
+
+    def order(self, *products, completed_at=None):
+        order = Order.objects.create(
+            user=self.user,
+            order_number=f"ORD-{Order.objects.count()}",
+            total_amount=10,
+            shipping_address_snapshot={},
+            status=OrderStatus.COMPLETED,
+        )
+        Order.objects.filter(pk=order.pk).update(
+            completed_at=completed_at or self.completed_at
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=product, product_name=product.name,
+                quantity=1, unit_price=10, total_price=10,
+            )
+            for product in products
+        )
+
+    def related(self, product):
+        return related_product_ids(product.pk)
+
+    def test_ranked_by_times_bought_together(self):
+        self.assertEqual(update_co_purchases(), (4, 4))
+        self.assertEqual(self.related(self.a), [self.b.pk, self.c.pk, self.d.pk])
+        self.assertEqual(self.related(self.c), [self.a.pk, self.b.pk, self.d.pk])
+        self.assertEqual(self.related(self.d), [self.a.pk, self.b.pk, self.c.pk])
+        self.assertEqual(related_product_ids(self.a.pk, limit=1), [self.b.pk])
+
+    def test_runs_fold_in_only_new_orders(self):
+        update_co_purchases(batch_size=3)
+        self.assertEqual(update_co_purchases(), (0, 0))
+        for _ in range(3):
+            self.order(self.a, self.c)
+        # Too recent: left for the next run.
+        self.order(self.a, self.d, completed_at=timezone.now())
+        self.assertEqual(update_co_purchases(), (3, 2))
+        self.assertEqual(self.related(self.a), [self.c.pk, self.b.pk, self.d.pk])
+        self.assertEqual(self.related(self.b), [self.a.pk, self.c.pk, self.d.pk])
+
+    def test_rebuild_counts_every_order_once(self):
+        # A watermark past every order: update_co_purchases() would skip them.
+        CoPurchaseWatermark.objects.update_or_create(
+            pk=1, defaults={"completed_at": self.completed_at, "order_id": 10**6}
+        )
+        self.assertEqual(update_co_purchases(), (0, 0))
+        self.assertEqual(rebuild_co_purchases(), (4, 4))
+        self.assertEqual(self.related(self.a), [self.b.pk, self.c.pk, self.d.pk])
+        self.assertEqual(CoPurchaseCount.objects.get(product=self.a, other=self.b).count, 3)
+
+    def test_endpoint(self):
+        url = f"/api/products/{self.a.pk}/related/"
+        self.assertEqual(self.client.get(url).json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            update_co_purchases()
+        # Inactive products drop out of the cards.
+        self.assertEqual(
+            [row["id"] for row in self.client.get(url).json()], [self.b.pk, self.c.pk]
+        )
+        self.assertEqual(
+            [row["id"] for row in self.client.get(url, {"limit": 1}).json()], [self.b.pk]
+        )
+        self.assertEqual(self.client.get(url, {"limit": "x"}).status_code, 400)
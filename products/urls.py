@@ -1,8 +1,15 @@
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, ProductImageViewSet
+from .views import (
+    CategoryViewSet,
+    ProductImageViewSet,
+    ProductViewSet,
+    ScheduledPriceChangeViewSet,
+)
 from django.urls import path, include
 
 router = DefaultRouter()
 router.register("categories", CategoryViewSet, basename="category")
 router.register("products", ProductViewSet, basename="product")
+router.register("product-images", ProductImageViewSet, basename="product-image")
+router.register("price-changes", ScheduledPriceChangeViewSet, basename="price-change")
 urlpatterns = router.urls
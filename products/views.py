@@ -1,46 +1,205 @@
-from rest_framework import viewsets, permissions
-from .models import Category, Product, ProductImage
+from rest_framework import permissions, status, viewsets
+from .models import Category, Product, ProductImage, ScheduledPriceChange
 from .serializers import (
-    CategorySerializer,
+    BulkPriceSerializer,
+    CategoryTreeSerializer,
     ProductSerializer,
     ProductImageSerializer,
-    
+    ScheduledPriceChangeSerializer,
 )
+from . import cache as catalog_cache
+from .documents import document_payload, read_document
+from .importer import FORMATS as IMPORT_FORMATS, import_catalog
+from .pricing import bulk_update_prices, cancel_scheduled_change
+from .suggest import DEFAULT_LIMIT as SUGGEST_LIMIT, MAX_LIMIT as SUGGEST_MAX_LIMIT
+from .suggest import get_suggest_index
+from .recommendations import TOP_K as RELATED_LIMIT, related_product_ids
+from .services import (
+    attach_product_counts,
+    build_category_tree,
+    catalog_version_stamp,
+    category_descendant_ids,
+    category_tree_version_stamp,
+    facet_counts,
+    filtered_facet_counts,
+    filter_by_specifications,
+    load_category_subtrees,
+    main_image_url,
+    product_version_stamp,
+    search_products,
+    similar_products,
+    with_stock_totals,
+)
+from core.conditional import ConditionalGetMixin
+from core.pagination import KeysetPagination, OffsetPagination
 from core.permissions import IsAdminOrReadOnly
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from decimal import Decimal, InvalidOperation
+import codecs
+import io
+
+# Per-row errors returned by the import endpoint; the command prints them all.
+IMPORT_ERROR_LIMIT = 100
+
 
+def _check_utf8(upload):
+    # Checked up front: a decoding error halfway through the import would
+    # leave the chunks before it committed.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for chunk in upload.chunks():
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError as exc:
+        raise ValidationError({"file": f"The file must be UTF-8 encoded: {exc}."})
+    upload.seek(0)
 
-class CategoryViewSet(viewsets.ModelViewSet):
-    serializer_class = CategorySerializer
+
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    serializer_class = CategoryTreeSerializer
     permission_classes = [IsAdminOrReadOnly]  # Adjust later if needed
+    pagination_class = KeysetPagination
+    cursor_ordering = ("name", "id")
 
     def get_queryset(self):
-        # Base query with optimization
-        qs = Category.objects.prefetch_related(
-            "subcategories", "subcategories__subcategories"
-        ).order_by("name")
+        # Subcategories are assembled in memory from the materialized path,
+        # so no prefetching is needed however deep the tree goes.
+        return Category.objects.order_by("name")
 
-        # ONLY filter for roots if we are viewing the main list.
-        # If we are looking at a detail page (retrieve), allow all categories.
-        if self.action == "list":
-            return qs.filter(parent_category__isnull=True)
+    def get_version_stamp(self):
+        if self.action in ("list", "retrieve"):
+            return (*category_tree_version_stamp(), self.kwargs.get("pk"))
+        return None
 
-        return qs
+    def list(self, request, *args, **kwargs):
+        not_modified = self.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        key = catalog_cache.list_key(catalog_cache.CATEGORIES, request)
+        return Response(
+            catalog_cache.get_or_build(key, lambda: self._build_list(request).data)
+        )
 
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        key = catalog_cache.detail_key(catalog_cache.CATEGORIES, kwargs["pk"], request)
+        return Response(
+            catalog_cache.get_or_build(key, self._build_detail)
+        )
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Product.objects.filter(is_active=True)
-        .select_related("category")
-        .prefetch_related("images")
-    )
+    def _build_list(self, request):
+        # Page over the roots, then load all of their subtrees in one query.
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            parent_category__isnull=True
+        )
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            roots = attach_product_counts(build_category_tree(list(self.get_queryset())))
+            return Response(self.get_serializer(roots, many=True).data)
+
+        attach_product_counts(load_category_subtrees(page))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def _build_detail(self):
+        instance = self.get_object()
+        attach_product_counts(load_category_subtrees([instance]))
+        return self.get_serializer(instance).data
+
+
+class ProductViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.filter(is_active=True).defer("search_vector")
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
+    # ?ordering= values and their keyset sort keys (the last column is unique).
+    cursor_orderings = {
+        "-created_at": ("-created_at", "-id"),
+        # Backed by reviews.ProductRating's (average, product) index.
+        "-rating": ("-rating_stats__average", "-id"),
+        # Backed by the (effective_price, id) index.
+        "price": ("effective_price", "id"),
+        "-price": ("-effective_price", "-id"),
+    }
+
+    @property
+    def paginator(self):
+        # Relevance-ranked search has no stable key to seek on; page by offset.
+        if (
+            not hasattr(self, "_paginator")
+            and self.pagination_class is not None
+            and self.request is not None
+            and self.request.query_params.get("search")
+        ):
+            self._paginator = OffsetPagination()
+        return super().paginator
+
+    def get_cursor_ordering(self):
+        ordering = self.request.query_params.get("ordering") or "-created_at"
+        if ordering not in self.cursor_orderings:
+            raise ValidationError(
+                {"ordering": f"Expected one of: {', '.join(self.cursor_orderings)}."}
+            )
+        return self.cursor_orderings[ordering]
+
+    def get_requested_fields(self):
+        """
+        Field names to serialize for list/retrieve (?fields= / ?expand=),
+        or None for writes, which always use the full serializer.
+        """
+        if self.action not in ("list", "retrieve", "related"):
+            return None
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = ProductSerializer.resolve_fields(
+                fields=self._parse_names("fields"),
+                expand=self._parse_names("expand"),
+                lean=self.action != "retrieve",
+            )
+        return self._requested_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["requested_fields"] = self.get_requested_fields()
+        return context
 
     def get_queryset(self):
         qs = super().get_queryset()
+        requested = self.get_requested_fields()
+        if requested is None:
+            requested = set(ProductSerializer.Meta.fields)
+
+        # Only fetch what the requested fields will read.
+        related = [name for name in ("category",) if name in requested]
+        if "rating_stats__average" in self._ordering_fields():
+            # Every product has a stats row; the inner join lets the planner
+            # walk the rating index instead of sorting.
+            qs = qs.filter(rating_stats__isnull=False)
+            related.append("rating_stats")
+        elif "rating" in requested:
+            related.append("rating_stats")
+        if related:
+            qs = qs.select_related(*related)
+        prefetch = [name for name in ("images", "inventory_items") if name in requested]
+        if "images" in requested:
+            prefetch.append("images__variants")
+        if prefetch:
+            qs = qs.prefetch_related(*prefetch)
+        deferred = [
+            name for name in ("description", "specifications") if name not in requested
+        ]
+        if deferred:
+            qs = qs.defer(*deferred)
+        if requested & {"total_stock", "available_stock"}:
+            # Annotated per request (reservations depend on "now").
+            qs = with_stock_totals(qs)
+        if "main_image" in requested and "images" not in requested:
+            qs = qs.annotate(main_image_url=main_image_url())
 
         # Optional filters
         category = self.request.query_params.get("category")
@@ -48,23 +207,276 @@ class ProductViewSet(viewsets.ModelViewSet):
         search = self.request.query_params.get("search")
 
         if category:
-            qs = qs.filter(category__slug=category)
+            if self._include_descendants():
+                qs = qs.filter(category_id__in=category_descendant_ids(category))
+            else:
+                qs = qs.filter(category__slug=category)
 
         if featured:
             qs = qs.filter(is_featured=True)
 
+        # ?spec=color:red&spec=color:blue&spec=ram:16GB
+        specs = self.request.query_params.getlist("spec")
+        if specs:
+            qs = filter_by_specifications(qs, self._parse_specs(specs))
+
+        min_price = self._parse_price("min_price")
+        max_price = self._parse_price("max_price")
+        if min_price is not None:
+            qs = qs.filter(effective_price__gte=min_price)
+        if max_price is not None:
+            qs = qs.filter(effective_price__lte=max_price)
+
         if search:
-            qs = qs.filter(name__icontains=search)
+            # paginate_queryset() falls back to this when nothing matches.
+            self._unsearched_queryset = qs
+            qs = search_products(qs, search)
 
         return qs
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page == [] and hasattr(self, "_unsearched_queryset"):
+            # No full-text match (an empty first page): try name similarity.
+            search = self.request.query_params.get("search")
+            queryset = similar_products(self._unsearched_queryset, search)
+            page = super().paginate_queryset(queryset)
+        self._paginated_queryset = queryset
+        return page
+
+    def get_version_stamp(self):
+        if self.action == "list":
+            return catalog_version_stamp()
+        if self.action == "retrieve":
+            return product_version_stamp(self.kwargs["pk"])
+        return None
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        key = self._stamped(catalog_cache.list_key(catalog_cache.PRODUCTS, request))
+        return Response(
+            catalog_cache.get_or_build(key, lambda: self._build_list(request).data)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        key = self._stamped(
+            catalog_cache.detail_key(catalog_cache.PRODUCTS, kwargs["pk"], request)
+        )
+        return Response(
+            catalog_cache.get_or_build(key, lambda: self._build_detail(request))
+        )
+
+    def _stamped(self, key):
+        # Reservations and expiring holds move the version stamp (the
+        # payloads show available stock) without bumping the cache
+        # generations; keying on the ETag keeps body and ETag in step.
+        return f"{key}:{getattr(self, '_etag', '')}"
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[permissions.IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        Upserts products from an uploaded CSV/JSONL ``file`` (see
+        products.importer). Large feeds should use the import_catalog command.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a CSV or JSONL file."})
+        fmt = request.data.get("format") or (
+            "jsonl" if upload.name.endswith((".jsonl", ".ndjson")) else "csv"
+        )
+        if fmt not in IMPORT_FORMATS:
+            raise ValidationError({"format": f"Expected one of {', '.join(IMPORT_FORMATS)}."})
+
+        _check_utf8(upload)
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        summary = import_catalog(stream, fmt)
+        errors = summary["errors"]
+        summary["errors"] = errors[:IMPORT_ERROR_LIMIT]
+        summary["errors_truncated"] = len(errors) > IMPORT_ERROR_LIMIT
+        return Response(summary)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-price",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def bulk_price(self, request):
+        """
+        Sets or adjusts (by a percentage) ``price`` or ``discount_price`` of
+        every product matching ``filters``, or clears the discount. Products
+        the change would leave with an invalid price are skipped.
+        """
+        serializer = BulkPriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(bulk_update_prices(**serializer.validated_data))
+
+    @action(detail=True, methods=["get"], pagination_class=None)
+    def related(self, request, pk=None):
+        """
+        "Frequently bought together": up to ?limit= product cards, most
+        co-purchased first, from the batch-computed RelatedProducts table.
+        """
+        try:
+            limit = int(request.query_params.get("limit", 8))
+        except ValueError:
+            raise ValidationError({"limit": "A valid integer is required."})
+        limit = max(1, min(limit, RELATED_LIMIT))
+        key = catalog_cache.related_key(pk, request)
+        return Response(
+            catalog_cache.get_or_build(key, lambda: self._build_related(pk, limit))
+        )
+
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def suggest(self, request):
+        """
+        Search-box autocomplete: products (by name or SKU) and categories
+        whose words start with ?q=, most popular first. ?limit= per group.
+        """
+        query = request.query_params.get("q", "")
+        try:
+            limit = int(request.query_params.get("limit", SUGGEST_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": "A valid integer is required."})
+        limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+        return Response({"query": query, **get_suggest_index().suggest(query, limit)})
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def cache_stats(self, request):
+        """Hit/miss counters of the catalog response cache."""
+        return Response(catalog_cache.cache_stats())
+
+    def _build_list(self, request):
+        response = super().list(request)
+        if request.query_params.get("facets") and self._narrowed():
+            # Counts over the products that actually matched.
+            response.data["facets"] = filtered_facet_counts(self._paginated_queryset)
+        elif request.query_params.get("facets"):
+            # Counts come from the precomputed facet table, scoped to the
+            # requested category, not from a scan of the products.
+            category_ids = None
+            category = request.query_params.get("category")
+            if category and self._include_descendants():
+                category_ids = category_descendant_ids(category)
+            elif category:
+                category_ids = list(
+                    Category.objects.filter(slug=category).values_list("id", flat=True)
+                )
+            response.data["facets"] = facet_counts(category_ids)
+        return response
+
+    def _build_detail(self, request):
+        # The precomputed document when it's current, a live render otherwise
+        # (pending rebuild, or a product that doesn't exist: 404).
+        document = read_document(self.kwargs["pk"])
+        if document is None:
+            return super().retrieve(request).data
+        return document_payload(document, self.get_requested_fields(), request)
+
+    def _build_related(self, pk, limit):
+        product = self.get_object()
+        ids = related_product_ids(product.pk)
+        # Inactive products drop out; fetch a few extra to fill the list.
+        products = self.get_queryset().filter(pk__in=ids[: limit * 2]).in_bulk()
+        ordered = [products[pk] for pk in ids if pk in products][:limit]
+        return self.get_serializer(ordered, many=True).data
+
+    def _ordering_fields(self):
+        if self.action != "list":
+            return set()
+        return {field.lstrip("-") for field in self.get_cursor_ordering()}
+
+    def _narrowed(self):
+        """Whether filters other than the category narrow the list."""
+        params = self.request.query_params
+        return any(
+            params.get(name) for name in ("spec", "min_price", "max_price", "search", "featured")
+        )
+
+    def _include_descendants(self):
+        value = self.request.query_params.get("include_descendants", "")
+        return value.lower() in ("1", "true", "yes")
+
+    def _parse_names(self, param):
+        return [
+            name.strip()
+            for value in self.request.query_params.getlist(param)
+            for name in value.split(",")
+            if name.strip()
+        ]
+
+    def _parse_specs(self, specs):
+        wanted = {}
+        for spec in specs:
+            key, separator, value = spec.partition(":")
+            if not separator or not key:
+                raise ValidationError({"spec": f"Expected key:value, got '{spec}'."})
+            wanted.setdefault(key, []).append(value)
+        return wanted
+
+    def _parse_price(self, param):
+        value = self.request.query_params.get(param)
+        if value in (None, ""):
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({param: "A valid number is required."})
+
 
 class ProductImageViewSet(viewsets.ModelViewSet):
-    queryset = ProductImage.objects.all().order_by("position")
+    queryset = ProductImage.objects.prefetch_related("variants")
     serializer_class = ProductImageSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("id",)
 
     def perform_create(self, serializer):
         serializer.save()
 
 
+class ScheduledPriceChangeViewSet(viewsets.ModelViewSet):
+    """
+    Price changes applied at ``starts_at`` and reverted at ``ends_at`` by the
+    apply_scheduled_price_changes task. Editable until they start.
+    """
+
+    queryset = ScheduledPriceChange.objects.all()
+    serializer_class = ScheduledPriceChangeSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-id",)
+
+    def perform_destroy(self, instance):
+        if instance.status == ScheduledPriceChange.Status.ACTIVE:
+            # Deleting would drop the prices needed to revert it.
+            raise ValidationError({"status": "Cancel the change before deleting it."})
+        instance.delete()
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        """Cancels a change that hasn't started, or reverts a running one."""
+        change = self.get_object()
+        if change.status not in (
+            ScheduledPriceChange.Status.SCHEDULED,
+            ScheduledPriceChange.Status.ACTIVE,
+        ):
+            raise ValidationError({"status": f"The change is already {change.status}."})
+        change = cancel_scheduled_change(change.pk)
+        return Response(self.get_serializer(change).data)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from reviews.services import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-product rating stats from the review table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--product",
+            type=int,
+            action="append",
+            dest="product_ids",
+            help="Only rebuild this product id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_rating_stats(options["product_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rating rows."))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_keyset_pagination_indexes'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at', 'id'], name='review_created_id_idx'),
+        ),
+    ]
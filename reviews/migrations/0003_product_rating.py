@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:03
+
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_rating_stats(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("reviews", "Review")
+    ProductRating = apps.get_model("reviews", "ProductRating")
+    aggregates = {
+        row.pop("product"): row
+        for row in Review.objects.order_by()
+        .values("product")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating"),
+            **{
+                f"star_{stars}": Count("id", filter=Q(rating=stars))
+                for stars in range(1, 6)
+            },
+        )
+    }
+    ProductRating.objects.bulk_create(
+        (
+            ProductRating(product_id=product_id, **aggregates.get(product_id, {}))
+            for product_id in Product.objects.values_list("pk", flat=True).iterator(
+                chunk_size=2000
+            )
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_version_stamps'),
+        ('reviews', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='products.product')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('star_1', models.PositiveIntegerField(default=0)),
+                ('star_2', models.PositiveIntegerField(default=0)),
+                ('star_3', models.PositiveIntegerField(default=0)),
+                ('star_4', models.PositiveIntegerField(default=0)),
+                ('star_5', models.PositiveIntegerField(default=0)),
+                ('average', models.GeneratedField(db_persist=True, expression=models.Case(models.When(count=0, then=models.Value(Decimal('0'))), default=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('total', models.DecimalField(decimal_places=4, max_digits=12)), '/', models.F('count')), 2)), output_field=models.DecimalField(decimal_places=2, max_digits=3))),
+            ],
+            options={
+                'indexes': [models.Index(fields=['average', 'product'], name='rating_average_product_idx')],
+            },
+        ),
+        migrations.RunPython(build_rating_stats, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models.functions import Cast, Round
 from accounts.models import User
 from products.models import Product
 
@@ -12,6 +14,51 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('user', 'product') # One review per user per product
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='review_created_id_idx'),
+        ]
         
     def __str__(self):
-        return f"Review for {self.product.name} by {self.user.id}"
\ No newline at end of file
+        return f"Review for {self.product.name} by {self.user.id}"
+
+class ProductRating(models.Model):
+    """
+    Denormalized review stats of one product (count, sum, 1-5 histogram).
+    Kept in step with Review by reviews.signals; rebuild_rating_stats repairs it.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats'
+    )
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    average = models.GeneratedField(
+        expression=models.Case(
+            models.When(count=0, then=models.Value(Decimal('0'))),
+            default=Round(
+                Cast('total', models.DecimalField(max_digits=12, decimal_places=4))
+                / models.F('count'),
+                2,
+            ),
+        ),
+        output_field=models.DecimalField(max_digits=3, decimal_places=2),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Backs ?ordering=-rating on products ("-average", "-product").
+            models.Index(fields=['average', 'product'], name='rating_average_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.average} ({self.count})"
+
+    @property
+    def histogram(self):
+        return {str(stars): getattr(self, f'star_{stars}') for stars in range(1, 6)}
@@ -0,0 +1,100 @@
+# reviews/services.py
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from products import cache as catalog_cache
+from products.documents import mark_all_stale, mark_stale
+from products.models import Product
+from .models import ProductRating, Review
+
+STAR_FIELDS = [f"star_{stars}" for stars in range(1, 6)]
+
+
+def rating_deltas(rating, sign=1):
+    """Column deltas of ProductRating for adding (or removing) one review."""
+    return {"count": sign, "total": sign * rating, f"star_{rating}": sign}
+
+
+def apply_rating_deltas(product_id, deltas):
+    """
+    Applies ``{column: delta}`` to a product's stats with one F() UPDATE,
+    creating the row first if it's missing. Call inside the review's
+    transaction so the stats commit (or roll back) with it.
+
+    A missing row is only created for additions. Removals without a row
+    have nothing to subtract from: deleting a product cascades to its stats
+    before its reviews, and any other gap is for rebuild_rating_stats().
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {column: F(column) + delta for column, delta in deltas.items()}
+    stats = ProductRating.objects.filter(product_id=product_id)
+    if not stats.update(**updates):
+        if any(delta < 0 for delta in deltas.values()):
+            return
+        try:
+            with transaction.atomic():
+                ProductRating.objects.create(product_id=product_id)
+        except IntegrityError:
+            pass  # Created concurrently.
+        stats.update(**updates)
+
+    # The stats are part of the product payload (cache and ETag).
+    Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+    catalog_cache.invalidate_products([product_id])
+    mark_stale(product_ids=[product_id])
+
+
+def rebuild_rating_stats(product_ids=None, batch_size=2000):
+    """
+    Recomputes the stats of every product (or ``product_ids``) from the
+    review table, creating missing rows. Returns the number of rows written.
+    """
+    reviews = Review.objects.all()
+    products = Product.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    aggregates = {
+        row.pop("product"): row
+        for row in reviews.order_by()
+        .values("product")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating"),
+            **{
+                f"star_{stars}": Count("id", filter=Q(rating=stars))
+                for stars in range(1, 6)
+            },
+        )
+    }
+
+    written = 0
+    batch = []
+    for product_id in products.order_by("pk").values_list("pk", flat=True).iterator(
+        chunk_size=batch_size
+    ):
+        batch.append(ProductRating(product_id=product_id, **aggregates.get(product_id, {})))
+        if len(batch) >= batch_size:
+            written += _upsert_stats(batch)
+            batch = []
+    written += _upsert_stats(batch)
+    catalog_cache.invalidate_products(product_ids)
+    if product_ids is None:
+        mark_all_stale()
+    else:
+        mark_stale(product_ids=product_ids)
+    return written
+
+
+def _upsert_stats(rows):
+    ProductRating.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["count", "total", *STAR_FIELDS],
+    )
+    return len(rows)
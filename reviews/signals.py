@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products.models import Product
+from .models import ProductRating, Review
+from .services import apply_rating_deltas, rating_deltas
+
+
+@receiver(post_save, sender=Product)
+def create_product_rating(sender, instance, created, **kwargs):
+    # Every product has a stats row, so ?ordering=-rating can join on it.
+    if created:
+        ProductRating.objects.create(product=instance)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._previous_rating = (
+        Review.objects.filter(pk=instance.pk).values_list("product_id", "rating").first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_stats(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if previous == (instance.product_id, instance.rating):
+        return
+    if previous and previous[0] != instance.product_id:
+        apply_rating_deltas(previous[0], rating_deltas(previous[1], sign=-1))
+        previous = None
+
+    deltas = Counter(rating_deltas(instance.rating))
+    if previous:
+        deltas.update(rating_deltas(previous[1], sign=-1))
+    apply_rating_deltas(instance.product_id, deltas)
+
+
+@receiver(post_delete, sender=Review)
+def release_rating_stats(sender, instance, **kwargs):
+    apply_rating_deltas(instance.product_id, rating_deltas(instance.rating, sign=-1))
@@ -1,3 +1,54 @@
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from products.models import Category, Product
+from .models import ProductRating, Review
+from .services import rebuild_rating_stats
+
+
+class RatingStatsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Audio")
+        self.product = Product.objects.create(category=category, name="Speaker", price=50)
+        self.users = [
+            User.objects.create_user(email=f"user{i}@example.com") for i in range(3)
+        ]
+
+    def review(self, user, rating):
+        return Review.objects.create(user=user, product=self.product, rating=rating)
+
+    def stats(self):
+        return ProductRating.objects.get(product=self.product)
+
+    def test_reviews_update_the_stats(self):
+        self.review(self.users[0], 5)
+        review = self.review(self.users[1], 3)
+        review.rating = 4
+        review.save()
+
+        stats = self.stats()
+        self.assertEqual((stats.count, stats.total), (2, 9))
+        self.assertEqual(stats.histogram, {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1})
+
+        review.delete()
+        stats = self.stats()
+        self.assertEqual((stats.count, stats.total, stats.star_4), (1, 5, 0))
+
+    def test_deleting_a_reviewed_product(self):
+        for user, rating in zip(self.users, [5, 4, 1]):
+            self.review(user, rating)
+
+        self.product.delete()
+
+        self.assertFalse(Review.objects.exists())
+        self.assertFalse(ProductRating.objects.exists())
+
+    def test_removals_without_a_stats_row_are_skipped(self):
+        review = self.review(self.users[0], 5)
+        ProductRating.objects.all().delete()
+
+        review.delete()
+        self.assertFalse(ProductRating.objects.exists())
+
+        rebuild_rating_stats([self.product.pk])
+        self.assertEqual(self.stats().count, 0)
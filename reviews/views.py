@@ -1,15 +1,22 @@
+from django.db import transaction
 from rest_framework import viewsets, permissions
 from .models import Review
 from .serializers import ReviewSerializer
 from core.permissions import IsEmailVerified
 from orders.models import OrderItem, OrderStatus
+from core.pagination import KeysetPagination
 
 
 class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related("user").order_by("-created_at", "-id")
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsEmailVerified]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-created_at", "-id")
 
+    # Rating stats are updated by reviews.signals; keep them in the same
+    # transaction as the review write.
+    @transaction.atomic
     def perform_create(self, serializer):
         user = self.request.user
         product = serializer.validated_data["product"]
@@ -24,3 +31,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
         ).exists()
 
         serializer.save(user=user, is_verified_purchase=is_verified)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()